@@ -0,0 +1,67 @@
+"""Compare per-test launch time of C++ programs under each link mode
+
+Usage: PYTHONPATH=src python benchmarks/bench_cpp_link.py [iterations]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from code_execution.languages.cpp import LINK_FLAGS, CppHandler
+from code_execution.page_cache import shared_libraries
+from code_execution.sandbox import Sandbox
+
+PROGRAM = """
+#include <bits/stdc++.h>
+int main() {
+    int a, b;
+    std::cin >> a >> b;
+    std::cout << a + b << std::endl;
+    return 0;
+}
+"""
+
+
+def time_runs(command, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run(command, input="1 2", capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name, times):
+    times = sorted(times)
+    print(
+        f"{name:>28}: mean {statistics.mean(times) * 1000:7.3f} ms  "
+        f"p50 {times[len(times) // 2] * 1000:7.3f} ms  "
+        f"p99 {times[int(len(times) * 0.99) - 1] * 1000:7.3f} ms"
+    )
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sandbox = Sandbox.build()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for link in LINK_FLAGS:
+            executable = os.path.join(temp_dir, link)
+            handler = CppHandler(binary_cache_dir=None, link=link)
+            if not handler.compile(PROGRAM, executable).passed:
+                print(f"{link:>28}: failed to link")
+                continue
+            libraries = len(shared_libraries(executable))
+            size = os.path.getsize(executable) // 1024
+            print(f"{link}: {size} KiB, {libraries} shared libraries")
+            report(f"{link} plain", time_runs([executable], iterations))
+            sandboxed = sandbox.wrap(
+                [executable], cpu_time_limit_seconds=10, visible_dirs=[temp_dir]
+            )
+            report(f"{link} sandboxed", time_runs(sandboxed, iterations))
+
+
+if __name__ == "__main__":
+    main()
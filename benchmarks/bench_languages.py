@@ -0,0 +1,123 @@
+"""Compare per-language compile and per-test execution overhead
+
+Compiles a small a+b program repeatedly with the binary cache disabled, then
+runs it on a trivial test, for every language whose toolchain is installed.
+For Java, compiling through the warm compile servers is compared with running
+javac for each compile.
+
+Usage: PYTHONPATH=src python benchmarks/bench_languages.py [iterations]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from code_execution.languages.cpp import CppHandler
+from code_execution.languages.go import GoHandler
+from code_execution.languages.java import JavaHandler
+from code_execution.languages.python import PythonHandler
+from code_execution.languages.rust import RustHandler
+from code_execution.types import StdinStdout
+
+PROGRAMS = {
+    "cpp": """
+#include <iostream>
+int main() {
+    long long a, b;
+    std::cin >> a >> b;
+    std::cout << a + b << std::endl;
+}
+""",
+    "python": """
+a, b = map(int, input().split())
+print(a + b)
+""",
+    "java": """
+import java.util.Scanner;
+
+public class Main {
+    public static void main(String[] args) {
+        Scanner scanner = new Scanner(System.in);
+        System.out.println(scanner.nextLong() + scanner.nextLong());
+    }
+}
+""",
+    "go": """
+package main
+
+import "fmt"
+
+func main() {
+	var a, b int64
+	fmt.Scan(&a, &b)
+	fmt.Println(a + b)
+}
+""",
+    "rust": """
+use std::io::Read;
+
+fn main() {
+    let mut input = String::new();
+    std::io::stdin().read_to_string(&mut input).unwrap();
+    let sum: i64 = input.split_whitespace().map(|x| x.parse::<i64>().unwrap()).sum();
+    println!("{}", sum);
+}
+""",
+}
+
+HANDLERS = {
+    "cpp": lambda: CppHandler(use_ccache=False, binary_cache_dir=None),
+    "python": PythonHandler,
+    "java": lambda: JavaHandler(binary_cache_dir=None),
+    "java (javac)": lambda: JavaHandler(compile_servers=0, binary_cache_dir=None),
+    "go": lambda: GoHandler(binary_cache_dir=None),
+    "rust": lambda: RustHandler(binary_cache_dir=None),
+}
+
+TEST = StdinStdout(stdin="1 2", stdout="3")
+
+
+def summary(times):
+    times = sorted(times)
+    return (
+        f"mean {statistics.mean(times) * 1000:8.1f} ms  "
+        f"p50 {times[len(times) // 2] * 1000:8.1f} ms"
+    )
+
+
+def bench(name, iterations):
+    handler = HANDLERS[name]()
+    try:
+        handler.warm_up()
+    except RuntimeError as e:
+        print(f"{name:>13}: skipped ({e})")
+        return
+    code = PROGRAMS[name.split()[0]]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        compile_times = []
+        for i in range(iterations):
+            # A fresh directory per compile, as for a request
+            work_dir = os.path.join(temp_dir, str(i))
+            os.mkdir(work_dir)
+            code_path = os.path.join(work_dir, handler.program_filename)
+            start = time.perf_counter()
+            assert handler.compile(code, code_path).passed
+            compile_times.append(time.perf_counter() - start)
+        exec_times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            assert handler.execute(code_path, TEST).passed
+            exec_times.append(time.perf_counter() - start)
+    print(f"{name:>13}: compile {summary(compile_times)} | exec {summary(exec_times)}")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name in HANDLERS:
+        bench(name, iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare pass rate and runtime of the Python interpreters detected here
+
+Runs a set of CPU-bound programs (or, with --codecontests N, the first N
+Python 3 solutions from CodeContests with their tests) under every interpreter
+the PythonHandler detects, with a per-test time limit.
+
+Usage: PYTHONPATH=src python benchmarks/bench_python_interpreters.py
+           [--time-limit 2] [--codecontests N]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+
+from code_execution.languages.python import PythonHandler
+from code_execution.types import StdinStdout
+
+WORKLOADS = [
+    (
+        "loop",
+        "n = int(input())\ntotal = 0\nfor i in range(n):\n    total += i * i % 7\n"
+        "print(total)",
+        "3000000",
+        str(sum(i * i % 7 for i in range(3000000))),
+    ),
+    (
+        "sieve",
+        "n = int(input())\nsieve = [True] * (n + 1)\nsieve[0] = sieve[1] = False\n"
+        "for i in range(2, int(n ** 0.5) + 1):\n"
+        "    if sieve[i]:\n"
+        "        for j in range(i * i, n + 1, i):\n"
+        "            sieve[j] = False\n"
+        "print(sum(sieve))",
+        "2000000",
+        "148933",
+    ),
+    (
+        "dp",
+        "n = int(input())\ndp = [0] * (n + 1)\ndp[0] = 1\n"
+        "for coin in (1, 2, 5, 10, 20, 50):\n"
+        "    for v in range(coin, n + 1):\n"
+        "        dp[v] = (dp[v] + dp[v - coin]) % 1000000007\n"
+        "print(dp[n])",
+        "300000",
+        None,
+    ),
+    (
+        "dict",
+        "n = int(input())\ncounts = {}\nfor i in range(n):\n"
+        "    key = (i * 7919) % 10007\n"
+        "    counts[key] = counts.get(key, 0) + 1\nprint(max(counts.values()))",
+        "1000000",
+        None,
+    ),
+]
+
+
+def codecontests_workloads(count):
+    import datasets
+
+    dataset = datasets.load_dataset("deepmind/code_contests", split="test")
+    workloads = []
+    for problem in dataset:
+        solutions = problem["solutions"]
+        for language, solution in zip(solutions["language"], solutions["solution"]):
+            if language != 3:  # PYTHON3
+                continue
+            tests = problem["public_tests"]
+            for stdin, stdout in zip(tests["input"], tests["output"]):
+                workloads.append((problem["name"], solution, stdin, stdout))
+            break
+        if len(workloads) >= count:
+            break
+    return workloads[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--time-limit", type=float, default=2.0)
+    parser.add_argument("--codecontests", type=int, default=0)
+    args = parser.parse_args()
+
+    workloads = (
+        codecontests_workloads(args.codecontests) if args.codecontests else WORKLOADS
+    )
+    handler = PythonHandler()
+    handler.warm_up()
+    # Outputs not given above are taken from the default interpreter
+    reference = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, version in handler.interpreters.items():
+            interpreter = handler.for_interpreter(name)
+            passed, times = 0, []
+            for index, (_, code, stdin, stdout) in enumerate(workloads):
+                code_path = os.path.join(temp_dir, f"{index}.py")
+                interpreter.compile(code, code_path)
+                if stdout is None:
+                    stdout = reference.setdefault(
+                        index,
+                        handler.execute(code_path, StdinStdout(stdin=stdin, stdout=""))
+                        .stdout.strip(),
+                    )
+                output = interpreter.execute(
+                    code_path,
+                    StdinStdout(stdin=stdin, stdout=stdout),
+                    timeout=args.time_limit,
+                )
+                passed += output.passed
+                times.append(output.time_seconds)
+            print(
+                f"{name:>11} ({version}): passed {passed}/{len(workloads)}  "
+                f"mean {statistics.mean(times):6.3f}s  total {sum(times):7.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
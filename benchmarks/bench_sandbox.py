@@ -0,0 +1,63 @@
+"""Compare per-test launch overhead of the sandbox against plain subprocess.run
+
+Usage: PYTHONPATH=src python benchmarks/bench_sandbox.py [iterations]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from code_execution.languages.cpp import CppHandler
+from code_execution.sandbox import Sandbox
+
+PROGRAM = """
+#include <iostream>
+int main() {
+    int a, b;
+    std::cin >> a >> b;
+    std::cout << a + b << std::endl;
+    return 0;
+}
+"""
+
+
+def time_runs(command, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run(command, input="1 2", capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name, times):
+    times = sorted(times)
+    print(
+        f"{name:>10}: mean {statistics.mean(times) * 1000:7.3f} ms  "
+        f"p50 {times[len(times) // 2] * 1000:7.3f} ms  "
+        f"p99 {times[int(len(times) * 0.99) - 1] * 1000:7.3f} ms"
+    )
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sandbox = Sandbox.build()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        executable = os.path.join(temp_dir, "program")
+        assert CppHandler(binary_cache_dir=None).compile(PROGRAM, executable).passed
+        plain = time_runs([executable], iterations)
+        command = sandbox.wrap(
+            [executable], cpu_time_limit_seconds=10, visible_dirs=[temp_dir]
+        )
+        sandboxed = time_runs(command, iterations)
+    report("plain", plain)
+    report("sandboxed", sandboxed)
+    overhead = statistics.mean(sandboxed) - statistics.mean(plain)
+    print(f"sandbox overhead: {overhead * 1000:.3f} ms per launch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Measure the cost of starting a program against the parent's resident memory
+
+The server's heap grows as caches fill. process.spawn (vfork) should cost the
+same at any size, while a plain fork copies page tables and grows with it.
+
+Usage: PYTHONPATH=src python benchmarks/bench_spawn.py [iterations] [max_mb]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from code_execution.process import spawn
+
+_CHUNK_MB = 64
+
+
+def resident_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") >> 20
+
+
+def median_ms(start, iterations):
+    times = []
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        process = start()
+        times.append(time.perf_counter() - begin)
+        process.wait()
+    return statistics.median(times) * 1000
+
+
+def start_spawn():
+    return spawn(
+        ["/bin/true"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def start_fork():
+    # A preexec_fn makes Popen fall back to fork
+    return subprocess.Popen(
+        ["/bin/true"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=lambda: None,
+    )
+
+
+class _Started:
+    def __init__(self, pid):
+        self.pid = pid
+
+    def wait(self):
+        os.waitpid(self.pid, 0)
+
+
+def start_posix_spawn():
+    return _Started(os.posix_spawn("/bin/true", ["/bin/true"], os.environ))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    max_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    ballast = []
+    print(f"{'rss MB':>8} {'spawn ms':>10} {'posix_spawn ms':>15} {'fork ms':>10}")
+    target_mb = 0
+    while target_mb <= max_mb:
+        while len(ballast) * _CHUNK_MB < target_mb:
+            # Touched, so the pages are really resident
+            ballast.append(bytearray(b"x" * (_CHUNK_MB << 20)))
+        print(
+            f"{resident_mb():>8} "
+            f"{median_ms(start_spawn, iterations):>10.3f} "
+            f"{median_ms(start_posix_spawn, iterations):>15.3f} "
+            f"{median_ms(start_fork, iterations):>10.3f}"
+        )
+        target_mb = target_mb * 2 if target_mb else 256
+
+
+if __name__ == "__main__":
+    main()
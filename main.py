@@ -1,53 +1,179 @@
-import os
-import tempfile
-import shutil
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
 
-from fastapi import FastAPI, HTTPException
-from code_execution.types import CodeExecutionRequest, CodeExecutionResponse
-from code_execution.languages import get_language_handler
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from code_execution import config, tracing
+from code_execution.types import (
+    BatchExecutionRequest,
+    BatchExecutionResponse,
+    CodeExecutionRequest,
+    ExecutionResponse,
+    JobStatus,
+    JobSubmission,
+    MultiExecutionRequest,
+    MultiExecutionResponse,
+)
+from code_execution.execution import execute_batch, execute_multi, execute_request
+from code_execution.job_queue import JobQueue
+from code_execution.languages import LanguageUnavailableError, warm_up_handlers
+from code_execution.metrics import metrics
+from code_execution.process import reaper
+from code_execution.profiler import ProfilerBusyError, profile
+from code_execution.shutdown import ShuttingDownError, drain
 
-app = FastAPI(title="Code Execution API")
+# Set once every language handler has been created and warmed up
+_warm_up_done = threading.Event()
+_warm_up_status: Dict[str, Optional[str]] = {}
+# Coordinator side of the job queue mode, if enabled
+_job_queue = JobQueue(config.JOB_QUEUE_DB) if config.JOB_QUEUE_DB else None
 
-@app.post("/execute", response_model=CodeExecutionResponse)
-def execute_code(request: CodeExecutionRequest) -> CodeExecutionResponse:
+
+def _warm_up() -> None:
+    _warm_up_status.update(warm_up_handlers())
+    _warm_up_done.set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reaper.start()
+    tracing.configure()
+    # Leftovers of workers that were killed instead of shut down
+    drain.sweep([config.BINARY_CACHE_DIR, config.GENERATED_TESTS_DIR])
+    drain.install_signal_handler()
+    # Warm up in the background so the server can answer /ready meanwhile
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+    # The server has stopped taking connections and waited for the open ones
+    drain.begin()
+    drain.wait(drain.drain_seconds)
+    drain.close()
+    reaper.stop()
+
+
+app = FastAPI(title="Code Execution API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    request.state.received_at = time.perf_counter()
+    response = await call_next(request)
+    now = time.perf_counter()
+    timings = [f"total;dur={(now - request.state.received_at) * 1000:.3f}"]
+    # Set by endpoints when they finish; the rest is response serialization
+    handled_at = getattr(request.state, "handled_at", None)
+    if handled_at is not None:
+        timings.append(f"serialize;dur={(now - handled_at) * 1000:.3f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    # Not ready while shutting down, so the load balancer stops routing here
+    ready = _warm_up_done.is_set() and not drain.draining
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "languages": dict(_warm_up_status)},
+    )
+
+
+@app.post("/execute", response_model=ExecutionResponse)
+def execute_code(
+    request: CodeExecutionRequest, http_request: Request
+) -> ExecutionResponse:
     try:
-        handler = get_language_handler(request.language)
+        response = execute_request(request, http_request.state.received_at)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except LanguageUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ShuttingDownError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    http_request.state.handled_at = time.perf_counter()
+    return response
+
+
+@app.post("/execute_batch", response_model=BatchExecutionResponse)
+def execute_code_batch(batch: BatchExecutionRequest) -> BatchExecutionResponse:
+    return execute_batch(batch)
+
 
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-    code_path = os.path.join(temp_dir, f"program{'.py' if handler.language_id == 'python' else ''}")
-    
+@app.post("/execute_multi", response_model=MultiExecutionResponse)
+def execute_code_multi(request: MultiExecutionRequest) -> MultiExecutionResponse:
     try:
-        # Compile/prepare the code
-        compile_output = handler.compile(request.code, code_path)
-        print("BLAH")
-        print(compile_output)
-        
-        if not compile_output.passed:
-            return CodeExecutionResponse(
-                compile_output=compile_output,
-                exec_outputs=[],
-                all_passed=False,
-            )
-        
-        # Execute tests
-        results = []
-        
-        for test_case in request.stdin_stdout:
-            exec_output = handler.execute(code_path, test_case)
-            results.append(exec_output)
-        
-        return CodeExecutionResponse(
-            compile_output=compile_output,
-            exec_outputs=results,
-            all_passed=all([r.passed for r in results])
+        return execute_multi(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LanguageUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ShuttingDownError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
         )
-    
-    finally:
-        # Clean up the temporary directory
-        shutil.rmtree(temp_dir)
+
+
+def _require_job_queue() -> JobQueue:
+    if _job_queue is None:
+        raise HTTPException(status_code=404, detail="Job queue mode is not enabled")
+    return _job_queue
+
+
+@app.post("/jobs", response_model=JobSubmission)
+def submit_job(request: CodeExecutionRequest) -> JobSubmission:
+    return JobSubmission(job_id=_require_job_queue().submit(request))
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str, wait_seconds: float = 0) -> JobStatus:
+    job_queue = _require_job_queue()
+    status = (
+        job_queue.wait(job_id, min(wait_seconds, 60))
+        if wait_seconds > 0
+        else job_queue.get(job_id)
+    )
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return status
+
+
+@app.get("/metrics")
+def get_metrics() -> dict:
+    return metrics.snapshot()
+
+
+def _require_admin(authorization: Optional[str]) -> None:
+    # Without a token the endpoints are off, so they can't be used by anyone
+    if config.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if authorization != f"Bearer {config.ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/admin/profile", response_class=PlainTextResponse)
+def admin_profile(
+    seconds: float = Query(default=10, gt=0, le=300),
+    interval_ms: float = Query(default=10, ge=1),
+    idle: bool = False,
+    authorization: Optional[str] = Header(default=None),
+) -> PlainTextResponse:
+    """Sample this worker's Python stacks and return them as collapsed stacks"""
+    _require_admin(authorization)
+    try:
+        collapsed, samples = profile(seconds, interval_ms / 1000, include_idle=idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        collapsed,
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+            "X-Profile-Samples": str(samples),
+        },
+    )
 
 
 if __name__ == "__main__":
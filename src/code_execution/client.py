@@ -0,0 +1,247 @@
+"""Async client for code execution servers
+
+    async with CodeExecutionClient(["http://a:8080", "http://b:8080"]) as client:
+        responses = await client.execute_many(requests)
+
+Requests are routed to a server by rendezvous hashing of their language and
+code, so repeats of the same program hit the server whose compile caches are
+warm for it. Requests for the same server are coalesced into /execute_batch
+calls, HTTP connections are pooled and kept alive, the number of in-flight
+HTTP calls is bounded, and 429/503 responses, of whole calls or of single
+items of a batch, are retried with backoff.
+"""
+
+import asyncio
+import hashlib
+import random
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import aiohttp
+from pydantic import TypeAdapter
+
+from code_execution.types import (
+    BatchExecutionResponse,
+    CodeExecutionRequest,
+    ExecutionResponse,
+    MultiExecutionRequest,
+    MultiExecutionResponse,
+)
+
+RequestLike = Union[CodeExecutionRequest, Dict[str, Any]]
+
+_RETRY_STATUSES = (429, 502, 503, 504)
+_response_adapter: TypeAdapter = TypeAdapter(ExecutionResponse)
+
+
+class CodeExecutionError(Exception):
+    """Raised when the server rejects a request or retries are exhausted"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _PendingBatch:
+    def __init__(self):
+        self.items: List[Tuple[CodeExecutionRequest, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+
+class CodeExecutionClient:
+    """Connection-pooling, batching, cache-affinity aware async client"""
+
+    def __init__(
+        self,
+        base_urls: Union[str, Sequence[str]],
+        max_concurrency: int = 32,
+        batch_size: int = 8,
+        batch_wait_seconds: float = 0.005,
+        max_retries: int = 5,
+        backoff_seconds: float = 0.5,
+        timeout_seconds: float = 600,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        self.base_urls = [url.rstrip("/") for url in base_urls]
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.headers = headers or {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._in_flight: Set[asyncio.Future] = set()
+
+    async def __aenter__(self) -> "CodeExecutionClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            # One keep-alive pool shared by all servers, sized to the concurrency
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.max_concurrency,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self) -> None:
+        """Flush pending batches, wait for in-flight calls and close connections"""
+        for base_url in list(self._pending):
+            self._flush(base_url)
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def server_for(self, request: RequestLike) -> str:
+        """Pick the server for a request by rendezvous hashing of its code"""
+        request = CodeExecutionRequest.model_validate(request)
+        return self._server_for_key(f"{request.language}\0{request.code}".encode())
+
+    def _server_for_key(self, key: bytes) -> str:
+        return max(
+            self.base_urls,
+            key=lambda url: hashlib.sha256(url.encode() + b"\0" + key).digest(),
+        )
+
+    async def execute(self, request: RequestLike) -> ExecutionResponse:
+        """Execute one request; it may be sent as part of a batch"""
+        request = CodeExecutionRequest.model_validate(request)
+        self._get_session()
+        base_url = self.server_for(request)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(base_url, _PendingBatch())
+        batch.items.append((request, future))
+        if len(batch.items) >= self.batch_size:
+            self._flush(base_url)
+        elif batch.flush_handle is None:
+            batch.flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_wait_seconds, self._flush, base_url
+            )
+        return await future
+
+    async def execute_many(
+        self, requests: Sequence[RequestLike]
+    ) -> List[ExecutionResponse]:
+        """Execute many requests concurrently, returning responses in order"""
+        return list(await asyncio.gather(*(self.execute(r) for r in requests)))
+
+    async def execute_multi(
+        self, request: Union[MultiExecutionRequest, Dict[str, Any]]
+    ) -> MultiExecutionResponse:
+        """Run several candidate programs against one test suite on one server"""
+        request = MultiExecutionRequest.model_validate(request)
+        # Route by the tests, so later candidates for a problem go to one server
+        key = hashlib.sha256()
+        for test in request.stdin_stdout:
+            key.update(test.stdin.encode() + b"\0")
+        base_url = self._server_for_key(key.digest())
+        body = await self._post(
+            f"{base_url}/execute_multi", request.model_dump(exclude_none=True)
+        )
+        return MultiExecutionResponse.model_validate(body)
+
+    def _flush(self, base_url: str) -> None:
+        batch = self._pending.pop(base_url, None)
+        if batch is None or not batch.items:
+            return
+        if batch.flush_handle is not None:
+            batch.flush_handle.cancel()
+        task = asyncio.ensure_future(self._send_batch(base_url, batch.items))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send_batch(
+        self,
+        base_url: str,
+        items: List[Tuple[CodeExecutionRequest, asyncio.Future]],
+    ) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = await self._send(base_url, [r for r, _ in items])
+            except Exception as e:
+                # Whole-call failures have already been retried by _post
+                results = [e] * len(items)
+            retry = []
+            for item, result in zip(items, results):
+                future = item[1]
+                if future.done():
+                    continue
+                if (
+                    isinstance(result, CodeExecutionError)
+                    and result.status_code in _RETRY_STATUSES
+                    and attempt < self.max_retries
+                ):
+                    retry.append(item)
+                elif isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if not retry:
+                return
+            # Items the server couldn't take (e.g. while draining) go again
+            items = retry
+            await asyncio.sleep(self._backoff_seconds(attempt))
+
+    async def _send(
+        self, base_url: str, requests: List[CodeExecutionRequest]
+    ) -> List[Any]:
+        """Send requests in one call; per-item errors become CodeExecutionErrors"""
+        if len(requests) == 1:
+            body = await self._post(
+                f"{base_url}/execute", requests[0].model_dump(exclude_none=True)
+            )
+            return [_response_adapter.validate_python(body)]
+        payload = {"requests": [r.model_dump(exclude_none=True) for r in requests]}
+        body = await self._post(f"{base_url}/execute_batch", payload)
+        results: List[Any] = []
+        for item in BatchExecutionResponse.model_validate(body).responses:
+            if item.response is not None:
+                results.append(item.response)
+            else:
+                results.append(CodeExecutionError(item.status_code, item.error or ""))
+        return results
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, self.backoff_seconds * 2**attempt)
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> Any:
+        session = self._get_session()
+        assert self._semaphore is not None
+        for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                async with self._semaphore:
+                    async with session.post(url, json=payload) as response:
+                        if response.status == 200:
+                            return await response.json()
+                        detail = await response.text()
+                        if response.status not in _RETRY_STATUSES:
+                            raise CodeExecutionError(response.status, detail)
+                        if attempt == self.max_retries:
+                            raise CodeExecutionError(response.status, detail)
+                        header = response.headers.get("Retry-After", "")
+                        retry_after = float(header) if header.isdigit() else None
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            # Back off, unless the server says when to come back
+            await asyncio.sleep(retry_after or self._backoff_seconds(attempt))
+        raise AssertionError("unreachable")
@@ -0,0 +1,142 @@
+"""Runtime configuration, read from environment variables"""
+
+import os
+import tempfile
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Root directory for on-disk caches (compile caches, binaries, ...)
+CACHE_ROOT = os.environ.get(
+    "CODE_EXECUTION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "code_execution_cache"),
+)
+
+# ccache integration for g++ (only used if the ccache binary is installed)
+CCACHE_ENABLED = _env_bool("CODE_EXECUTION_CCACHE", True)
+CCACHE_DIR = os.environ.get(
+    "CODE_EXECUTION_CCACHE_DIR", os.path.join(CACHE_ROOT, "ccache")
+)
+CCACHE_MAX_SIZE = os.environ.get("CODE_EXECUTION_CCACHE_MAX_SIZE", "2G")
+
+# Content-addressed cache of compiled binaries, keyed by source and flags
+BINARY_CACHE_ENABLED = _env_bool("CODE_EXECUTION_BINARY_CACHE", True)
+BINARY_CACHE_DIR = os.environ.get(
+    "CODE_EXECUTION_BINARY_CACHE_DIR", os.path.join(CACHE_ROOT, "binaries")
+)
+# Least recently used binaries are evicted beyond this total size
+BINARY_CACHE_MAX_BYTES = (
+    int(os.environ.get("CODE_EXECUTION_BINARY_CACHE_MAX_MB", "4096")) << 20
+)
+
+# How C++ programs are linked: "dynamic", "static-libstdc++" (libstdc++ and
+# libgcc linked in, glibc shared) or "static". Static binaries skip the
+# dynamic linker's relocations on every test run; if the static libraries
+# aren't installed the handler falls back to dynamic linking at startup.
+CPP_LINK = os.environ.get("CODE_EXECUTION_CPP_LINK", "dynamic").strip().lower()
+
+# Lock the shared libraries compiled programs load into memory, so test runs
+# never wait for them to be read back after the page cache dropped them
+PIN_LIBRARIES = _env_bool("CODE_EXECUTION_PIN_LIBRARIES", True)
+
+# Inputs and expected outputs of tests generated from a request's generator
+# program, keyed by the programs and the seed
+GENERATED_TESTS_DIR = os.environ.get(
+    "CODE_EXECUTION_GENERATED_TESTS_DIR", os.path.join(CACHE_ROOT, "generated-tests")
+)
+GENERATED_TESTS_MAX_BYTES = (
+    int(os.environ.get("CODE_EXECUTION_GENERATED_TESTS_MAX_MB", "2048")) << 20
+)
+
+# Go's own build cache; kept across requests so the standard library and
+# repeated packages aren't rebuilt
+GO_CACHE_DIR = os.environ.get(
+    "CODE_EXECUTION_GO_CACHE_DIR", os.path.join(CACHE_ROOT, "go-build")
+)
+
+# Number of warm JVMs compiling Java through javax.tools (0 runs javac per compile)
+JAVA_COMPILE_SERVERS = int(os.environ.get("CODE_EXECUTION_JAVA_COMPILE_SERVERS", "2"))
+# Heap of Java programs; keep well below the sandbox memory limit, which also
+# bounds the JVM's other reservations
+JAVA_HEAP_MB = int(os.environ.get("CODE_EXECUTION_JAVA_HEAP_MB", "1024"))
+
+# Python interpreters requests may pick with "interpreter"; the ones that are
+# installed and work are detected at startup. The first is the default.
+PYTHON_INTERPRETERS = [
+    name.strip()
+    for name in os.environ.get(
+        "CODE_EXECUTION_PYTHON_INTERPRETERS",
+        "python3,pypy3,python3.8,python3.9,python3.10,python3.11,python3.12,python3.13",
+    ).split(",")
+    if name.strip()
+]
+
+# Namespace/seccomp sandbox around submitted programs: "auto" uses it when the
+# kernel allows unprivileged user namespaces, "on" requires it, "off" disables it
+SANDBOX_MODE = os.environ.get("CODE_EXECUTION_SANDBOX", "auto").strip().lower()
+SANDBOX_MEMORY_LIMIT_BYTES = (
+    int(os.environ.get("CODE_EXECUTION_SANDBOX_MEMORY_MB", "2048")) << 20
+)
+SANDBOX_FILE_SIZE_LIMIT_BYTES = (
+    int(os.environ.get("CODE_EXECUTION_SANDBOX_FILE_SIZE_MB", "64")) << 20
+)
+SANDBOX_TMPFS_SIZE_BYTES = (
+    int(os.environ.get("CODE_EXECUTION_SANDBOX_TMPFS_MB", "64")) << 20
+)
+
+# Request workspaces (sources, binaries, test files) live in one directory per
+# worker process under this one, so what a killed worker leaves behind is
+# removed by the next one to start
+WORKSPACE_DIR = os.environ.get(
+    "CODE_EXECUTION_WORKSPACE_DIR",
+    os.path.join(tempfile.gettempdir(), "code_execution_workspaces"),
+)
+
+# After SIGTERM, how long running requests get to finish before their
+# programs are killed and they fail with 503 (Cloud Run sends SIGKILL 10s
+# after SIGTERM, gunicorn after its graceful timeout)
+DRAIN_SECONDS = float(os.environ.get("CODE_EXECUTION_DRAIN_SECONDS", "8"))
+
+# How often the background reaper looks for processes left behind by programs
+REAPER_INTERVAL_SECONDS = float(
+    os.environ.get("CODE_EXECUTION_REAPER_INTERVAL_SECONDS", "1.0")
+)
+
+# Run at most one test per CPU across all worker processes, each pinned to
+# its CPU, so test timings don't depend on how busy the server is. CPUs
+# defaults to the ones the server may run on (comma-separated list).
+CPU_SCHEDULER = _env_bool("CODE_EXECUTION_CPU_SCHEDULER", False)
+CPU_SCHEDULER_CPUS = [
+    int(cpu)
+    for cpu in os.environ.get("CODE_EXECUTION_CPU_SCHEDULER_CPUS", "").split(",")
+    if cpu.strip()
+]
+
+# SQLite database used as the job queue broker; the /jobs endpoints are only
+# enabled when this is set
+JOB_QUEUE_DB = os.environ.get("CODE_EXECUTION_JOB_QUEUE_DB")
+JOB_LEASE_SECONDS = float(os.environ.get("CODE_EXECUTION_JOB_LEASE_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("CODE_EXECUTION_JOB_MAX_ATTEMPTS", "3"))
+# How long a job waits for the worker that has its binary cached before any
+# other worker may take it
+JOB_AFFINITY_WAIT_SECONDS = float(
+    os.environ.get("CODE_EXECUTION_JOB_AFFINITY_WAIT_SECONDS", "2")
+)
+
+# How many requests of one /execute_batch call, or (candidate, test) jobs of one
+# /execute_multi call, run concurrently
+BATCH_PARALLELISM = int(
+    os.environ.get("CODE_EXECUTION_BATCH_PARALLELISM", str(os.cpu_count() or 1))
+)
+
+# Where OpenTelemetry spans go: unset (no export), "console", "otlp" (needs
+# opentelemetry-exporter-otlp) or "jsonl:/path/to/spans.jsonl"
+TRACE_EXPORTER = os.environ.get("CODE_EXECUTION_TRACE_EXPORTER")
+
+# Bearer token required by the /admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.environ.get("CODE_EXECUTION_ADMIN_TOKEN")
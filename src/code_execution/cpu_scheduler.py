@@ -0,0 +1,159 @@
+"""CPU slots for test runs: one running test per core, pinned to it
+
+With CODE_EXECUTION_CPU_SCHEDULER on, each test holds a CPU slot while it
+runs. Slots are flock()ed files shared by every worker process of the
+server, so at most one test per core runs at a time across all of them, and
+a test waits for a free core instead of sharing one. Programs started while
+the slot is held are pinned to its CPU: spawn() starts them from a thread
+pinned to it, and the warm harnesses pin the test they fork or call.
+
+Pinning is not a security boundary (a program may change its own affinity);
+it keeps timings comparable under load.
+"""
+
+import fcntl
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Union
+from code_execution import config, tracing
+from code_execution.metrics import metrics
+
+# Backoff while every slot is taken
+_POLL_MIN_SECONDS = 0.0005
+_POLL_MAX_SECONDS = 0.005
+
+# The CPU of the slot each thread holds
+_held = threading.local()
+
+
+def read_cpu_pressure() -> Dict[str, float]:
+    """System-wide CPU pressure (PSI) averages, empty if the kernel lacks it"""
+    try:
+        with open("/proc/pressure/cpu") as pressure_file:
+            line = pressure_file.readline()
+    except OSError:
+        return {}
+    # some avg10=0.00 avg60=0.00 avg300=0.00 total=0
+    fields = dict(item.split("=") for item in line.split()[1:])
+    return {
+        f"some_{name}": float(fields[name])
+        for name in ("avg10", "avg60", "avg300")
+        if name in fields
+    }
+
+
+class CpuScheduler:
+    """Hands out CPUs to test runs, one test per CPU across worker processes"""
+
+    def __init__(self, cpus: List[int], lock_dir: str):
+        unavailable = set(cpus) - os.sched_getaffinity(0)
+        if unavailable:
+            raise ValueError(
+                f"CPUs {sorted(unavailable)} are not available to the server"
+            )
+        self.cpus = cpus
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+        # flock() locks belong to the open file, which every thread of the
+        # process shares, so threads also need a lock of their own per CPU
+        self._thread_locks = {cpu: threading.Lock() for cpu in cpus}
+        self._fds: Dict[int, int] = {}
+        self._fds_pid: Optional[int] = None
+        self._fds_lock = threading.Lock()
+        self._next = itertools.count()
+
+    def _fd(self, cpu: int) -> int:
+        with self._fds_lock:
+            if self._fds_pid != os.getpid():
+                # Opened per process: forked workers must not share the files
+                self._fds = {}
+                self._fds_pid = os.getpid()
+            if cpu not in self._fds:
+                self._fds[cpu] = os.open(
+                    os.path.join(self.lock_dir, f"cpu-{cpu}.lock"),
+                    os.O_RDWR | os.O_CREAT,
+                    0o644,
+                )
+            return self._fds[cpu]
+
+    def _try_acquire(self, cpu: int) -> bool:
+        if not self._thread_locks[cpu].acquire(blocking=False):
+            return False
+        try:
+            fcntl.flock(self._fd(cpu), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._thread_locks[cpu].release()
+            return False
+
+    def _release(self, cpu: int) -> None:
+        fcntl.flock(self._fd(cpu), fcntl.LOCK_UN)
+        self._thread_locks[cpu].release()
+
+    def acquire(self) -> int:
+        """Wait for a free CPU and take it"""
+        start = time.perf_counter()
+        delay = _POLL_MIN_SECONDS
+        contended = False
+        while True:
+            # Start from a different CPU each time to spread the tests out
+            offset = next(self._next)
+            for i in range(len(self.cpus)):
+                cpu = self.cpus[(offset + i) % len(self.cpus)]
+                if self._try_acquire(cpu):
+                    waited = time.perf_counter() - start
+                    metrics.observe("cpu_wait", waited)
+                    if contended:
+                        metrics.inc("cpu_waits")
+                    return cpu
+            contended = True
+            time.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX_SECONDS)
+
+    @contextmanager
+    def slot(self) -> Iterator[int]:
+        """Hold a CPU for the programs the calling thread starts meanwhile"""
+        with tracing.span("cpu_wait"):
+            cpu = self.acquire()
+        _held.cpu = cpu
+        try:
+            yield cpu
+        finally:
+            _held.cpu = None
+            self._release(cpu)
+
+    def stats(self) -> Dict[str, Union[int, List[int], Dict[str, float]]]:
+        busy = 0
+        for cpu in self.cpus:
+            if self._try_acquire(cpu):
+                self._release(cpu)
+            else:
+                busy += 1
+        return {"cpus": self.cpus, "busy": busy, "pressure": read_cpu_pressure()}
+
+
+_scheduler: Optional[CpuScheduler] = None
+if config.CPU_SCHEDULER:
+    _scheduler = CpuScheduler(
+        config.CPU_SCHEDULER_CPUS or sorted(os.sched_getaffinity(0)),
+        os.path.join(config.CACHE_ROOT, "cpu-slots"),
+    )
+    metrics.register_collector("cpu_scheduler", _scheduler.stats)
+
+
+@contextmanager
+def cpu_slot() -> Iterator[Optional[int]]:
+    """Run a test on a CPU of its own; yields None when scheduling is off"""
+    if _scheduler is None:
+        yield None
+        return
+    with _scheduler.slot() as cpu:
+        yield cpu
+
+
+def current_cpu() -> Optional[int]:
+    """The CPU programs started by the calling thread are pinned to, if any"""
+    return getattr(_held, "cpu", None)
@@ -0,0 +1,563 @@
+import hashlib
+import os
+import shutil
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, TypeVar, Union
+from code_execution import config, tracing
+from code_execution.cpu_scheduler import cpu_slot
+from code_execution.generated_tests import generated_tests
+from code_execution.interactive import InteractiveJudge
+from code_execution.languages import LanguageUnavailableError, get_language_handler
+from code_execution.languages.base import LanguageHandler
+from code_execution.metrics import metrics
+from code_execution.results import ResultBuffer
+from code_execution.shutdown import ShuttingDownError, drain
+from code_execution.snapshot import SnapshotSession
+from code_execution.types import (
+    AdaptiveTimeout,
+    BatchExecutionRequest,
+    BatchExecutionResponse,
+    BatchItemResponse,
+    Candidate,
+    CodeExecutionRequest,
+    ExecutionResponse,
+    MultiExecutionRequest,
+    MultiExecutionResponse,
+    OutputGroup,
+    Reruns,
+    RunResult,
+    StdinStdout,
+)
+
+
+def skipped_result(reason: str) -> RunResult:
+    return RunResult(
+        passed=False,
+        stdout="",
+        stderr=f"Skipped: {reason}",
+        time_seconds=0,
+        timed_out=False,
+        skipped=True,
+    )
+
+
+def shape_output(output: RunResult, verbosity: str) -> RunResult:
+    """Trim a test's stdout/stderr in place according to output_verbosity"""
+    if verbosity == "full":
+        return output
+    output.stdout_sha256 = hashlib.sha256(output.stdout.encode()).hexdigest()
+    if verbosity == "none" or (verbosity == "failures_only" and output.passed):
+        limit = 0
+    elif verbosity == "failures_only":
+        return output
+    else:
+        limit = int(verbosity[len("truncated:") :])
+    if len(output.stdout) > limit or len(output.stderr) > limit:
+        output.stdout = output.stdout[:limit]
+        output.stderr = output.stderr[:limit]
+        output.truncated = True
+    return output
+
+
+_Request = TypeVar("_Request", bound=Union[CodeExecutionRequest, MultiExecutionRequest])
+
+
+def with_generated_tests(request: _Request) -> _Request:
+    """Return the request with its generated tests appended to stdin_stdout"""
+    if request.generated_tests is None:
+        return request
+    with tracing.span("generate_tests"):
+        tests = generated_tests(request.generated_tests)
+    return request.model_copy(
+        update={
+            "stdin_stdout": request.stdin_stdout + tests,
+            "generated_tests": None,
+        }
+    )
+
+
+class TimeoutPolicy:
+    """Decides each test's timeout from the request's limits and budget"""
+
+    def __init__(self, request: CodeExecutionRequest, handler: LanguageHandler):
+        self.time_limit_seconds = (
+            request.time_limit_seconds or handler.default_timeout_seconds
+        )
+        self.deadline = (
+            time.monotonic() + request.total_time_budget_seconds
+            if request.total_time_budget_seconds is not None
+            else None
+        )
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def timeout_for(
+        self,
+        reference_seconds: Optional[float] = None,
+        adaptive: Optional[AdaptiveTimeout] = None,
+    ) -> Optional[float]:
+        """Return the timeout for the next test, or None if the budget is spent"""
+        timeout = self.time_limit_seconds
+        if adaptive is not None and reference_seconds is not None:
+            scaled = adaptive.multiplier * reference_seconds
+            timeout = min(timeout, max(adaptive.min_seconds, scaled))
+        remaining = self.remaining_seconds()
+        if remaining is not None:
+            if remaining <= 0:
+                return None
+            timeout = min(timeout, remaining)
+        return timeout
+
+
+class ReferenceTimer:
+    """Runs the adaptive-timeout reference solution to measure per-test runtimes"""
+
+    def __init__(self, adaptive: AdaptiveTimeout, language: str, work_dir: str):
+        self.handler = get_language_handler(adaptive.reference_language or language)
+        reference_dir = os.path.join(work_dir, "reference")
+        os.mkdir(reference_dir)
+        self.code_path = os.path.join(reference_dir, self.handler.program_filename)
+        with tracing.span("reference_compile"):
+            compile_output = self.handler.compile(
+                adaptive.reference_code, self.code_path
+            )
+        if not compile_output.passed:
+            raise ValueError(
+                f"Reference solution failed to compile: {compile_output.stderr}"
+            )
+
+    def measure(self, test: StdinStdout, timeout: float) -> Optional[float]:
+        """Return the reference's runtime on the test, or None if it didn't finish"""
+        with tracing.span("reference"), cpu_slot():
+            output = self.handler.run_test(self.code_path, test, timeout=timeout)
+        return None if output.timed_out else output.time_seconds
+
+
+# Separate from _batch_executor, whose threads may be the ones waiting on reruns
+_rerun_executor = ThreadPoolExecutor(
+    max_workers=config.BATCH_PARALLELISM, thread_name_prefix="rerun"
+)
+
+
+def _needs_rerun(result: RunResult, timeout: float, reruns: Reruns) -> bool:
+    return not result.passed or (
+        result.time_seconds >= reruns.borderline_fraction * timeout
+    )
+
+
+def rerun_tests(
+    handler: LanguageHandler,
+    code_path: str,
+    request: CodeExecutionRequest,
+    policy: TimeoutPolicy,
+    first_runs: List[Tuple[int, RunResult, float]],
+    snapshot: Optional[SnapshotSession] = None,
+) -> None:
+    """Run each (index, first run, timeout) test again, in parallel
+
+    The first runs are updated in place with the re-runs' statistics. With a
+    snapshot the re-runs are restored from it too, one at a time, so their
+    times compare with the first run's. Re-runs come out of the request's
+    time budget; those it has no time left for are left out.
+    """
+    assert request.reruns is not None
+    count = request.reruns.count
+
+    def run_again(index: int, timeout: float) -> Optional[RunResult]:
+        remaining = policy.timeout_for()
+        if remaining is None:
+            return None
+        capped = min(timeout, remaining)
+        test = request.stdin_stdout[index]
+        with cpu_slot():
+            result = snapshot.run_test(test, capped) if snapshot else None
+            if result is None:
+                result = handler.run_test(code_path, test, timeout=capped)
+        if result.timed_out and capped < timeout:
+            # Cut short by the budget, not the limit: says nothing about flakiness
+            return None
+        return result
+
+    with tracing.span("reruns"):
+        if snapshot is not None:
+            reruns = [
+                [run_again(index, timeout) for _ in range(count)]
+                for index, _, timeout in first_runs
+            ]
+        else:
+            futures = [
+                [
+                    tracing.submit(_rerun_executor, run_again, index, timeout)
+                    for _ in range(count)
+                ]
+                for index, _, timeout in first_runs
+            ]
+            reruns = [[future.result() for future in test] for test in futures]
+        done = 0
+        for (_, first, _), test_reruns in zip(first_runs, reruns):
+            runs = [first] + [run for run in test_reruns if run is not None]
+            done += len(runs) - 1
+            times = [run.time_seconds for run in runs]
+            first.runs = len(runs)
+            first.min_time_seconds = min(times)
+            first.median_time_seconds = statistics.median(times)
+            first.flaky = len({(run.passed, run.timed_out) for run in runs}) > 1
+            if first.flaky:
+                metrics.inc("flaky_tests")
+    metrics.inc("reruns", done)
+
+
+def run_tests(
+    handler: LanguageHandler,
+    code_path: str,
+    request: CodeExecutionRequest,
+    policy: TimeoutPolicy,
+    work_dir: str,
+) -> ResultBuffer:
+    if request.function_calls:
+        raise ValueError("function_calls need an entry_point")
+    if request.interactor is not None and request.adaptive_timeout is not None:
+        raise ValueError("adaptive_timeout cannot be used with an interactor")
+    if request.interactor is not None and request.reruns is not None:
+        raise ValueError("reruns cannot be used with an interactor")
+    reference = (
+        ReferenceTimer(request.adaptive_timeout, request.language, work_dir)
+        if request.adaptive_timeout is not None
+        else None
+    )
+    judge = (
+        InteractiveJudge(request.interactor) if request.interactor is not None else None
+    )
+    # The setup runs under the request's limits like any test would
+    setup_timeout = policy.timeout_for()
+    snapshot = (
+        handler.snapshot_session(code_path, setup_timeout)
+        if request.snapshot and judge is None and setup_timeout is not None
+        else None
+    )
+    results = ResultBuffer(
+        len(request.stdin_stdout), keep_outputs=request.response_format != "compact"
+    )
+    # Tests to run again once all have run once: (index, first run, timeout)
+    first_runs: List[Tuple[int, RunResult, float]] = []
+    try:
+        for index, test_case in enumerate(request.stdin_stdout):
+            with tracing.test_span(index):
+                reference_seconds = None
+                if reference is not None:
+                    budget_timeout = policy.timeout_for()
+                    if budget_timeout is not None:
+                        reference_seconds = reference.measure(test_case, budget_timeout)
+                timeout = policy.timeout_for(
+                    reference_seconds, request.adaptive_timeout
+                )
+                if timeout is None:
+                    results.set(index, skipped_result("time budget exhausted"))
+                    continue
+                with cpu_slot():
+                    result = None
+                    if judge is not None:
+                        result = judge.run_test(handler, code_path, test_case, timeout)
+                    elif snapshot is not None:
+                        result = snapshot.run_test(test_case, timeout)
+                    if result is None:
+                        if request.snapshot and judge is None:
+                            metrics.inc("snapshot_fallbacks")
+                        result = handler.run_test(code_path, test_case, timeout=timeout)
+                if request.reruns is not None and _needs_rerun(
+                    result, timeout, request.reruns
+                ):
+                    first_runs.append((index, result, timeout))
+                    continue
+                results.set(index, shape_output(result, request.output_verbosity))
+        # Re-runs are skipped once the request is out of time
+        if first_runs and policy.timeout_for() is not None:
+            rerun_tests(handler, code_path, request, policy, first_runs, snapshot)
+        for index, result, _ in first_runs:
+            results.set(index, shape_output(result, request.output_verbosity))
+    finally:
+        if judge is not None:
+            judge.close()
+        if snapshot is not None:
+            snapshot.close()
+    return results
+
+
+def run_function_calls(
+    handler: LanguageHandler,
+    code_path: str,
+    request: CodeExecutionRequest,
+    policy: TimeoutPolicy,
+) -> ResultBuffer:
+    """Run the request's function calls in one warm harness, one result per call"""
+    assert request.entry_point is not None
+    if (
+        request.stdin_stdout
+        or request.interactor
+        or request.adaptive_timeout
+        or request.reruns
+    ):
+        raise ValueError(
+            "Function-call tests can't be combined with stdin_stdout, "
+            "interactor, adaptive_timeout or reruns"
+        )
+    session = handler.function_session(code_path, request.entry_point)
+    results = ResultBuffer(
+        len(request.function_calls),
+        keep_outputs=request.response_format != "compact",
+    )
+    try:
+        for index, call in enumerate(request.function_calls):
+            with tracing.test_span(index):
+                timeout = policy.timeout_for()
+                if timeout is None:
+                    results.set(index, skipped_result("time budget exhausted"))
+                    continue
+                with cpu_slot():
+                    result = session.call(call, timeout)
+                results.set(index, shape_output(result, request.output_verbosity))
+    finally:
+        session.close()
+    return results
+
+
+def execute_request(
+    request: CodeExecutionRequest, received_at: Optional[float] = None
+) -> ExecutionResponse:
+    """Compile the code and run it against every test in the request
+
+    received_at is the perf_counter() time the request arrived at the server,
+    used to report how long it was queued. Raises ShuttingDownError once the
+    server is shutting down.
+    """
+    with drain.admit(), tracing.request_trace(
+        request.profile,
+        received_at,
+        language=request.language,
+        tests=len(request.stdin_stdout) + len(request.function_calls),
+    ) as trace:
+        response = _execute_request(request)
+    if trace is not None:
+        response.profile = trace.profile()
+    return response
+
+
+def _execute_request(request: CodeExecutionRequest) -> ExecutionResponse:
+    request = with_generated_tests(request)
+    handler = get_language_handler(request.language, request.interpreter)
+    policy = TimeoutPolicy(request, handler)
+
+    # Create a temporary directory
+    with tracing.span("tempdir"):
+        temp_dir = drain.workspace()
+    code_path = os.path.join(temp_dir, handler.program_filename)
+
+    try:
+        # Compile/prepare the code
+        with tracing.span("compile"):
+            compile_output = handler.compile(request.code, code_path)
+
+        if not compile_output.passed:
+            response = ResultBuffer(0).response(
+                compile_output, request.response_format
+            )
+            response.all_passed = False
+            return response
+
+        # Execute tests
+        with tracing.span("tests"):
+            if request.entry_point is not None:
+                results = run_function_calls(handler, code_path, request, policy)
+            else:
+                results = run_tests(handler, code_path, request, policy, temp_dir)
+
+        return results.response(compile_output, request.response_format)
+
+    finally:
+        # Clean up the temporary directory
+        with tracing.span("cleanup"):
+            shutil.rmtree(temp_dir)
+
+
+_batch_executor = ThreadPoolExecutor(
+    max_workers=config.BATCH_PARALLELISM, thread_name_prefix="batch"
+)
+
+
+def _execute_batch_item(request: CodeExecutionRequest) -> BatchItemResponse:
+    try:
+        return BatchItemResponse(response=execute_request(request))
+    except ValueError as e:
+        return BatchItemResponse(error=str(e), status_code=400)
+    except (LanguageUnavailableError, ShuttingDownError) as e:
+        return BatchItemResponse(error=str(e), status_code=503)
+
+
+def execute_batch(batch: BatchExecutionRequest) -> BatchExecutionResponse:
+    """Run the requests of a batch concurrently, keeping their order"""
+    jobs = [
+        tracing.submit(_batch_executor, _execute_batch_item, request)
+        for request in batch.requests
+    ]
+    return BatchExecutionResponse(responses=[job.result() for job in jobs])
+
+
+def output_hash(stdout: str) -> str:
+    """SHA-256 of stdout ignoring trailing whitespace on lines and at the end"""
+    lines = [line.rstrip() for line in stdout.strip().splitlines()]
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+class _CandidateRun:
+    """One compiled candidate of a multi-candidate request and its test results"""
+
+    def __init__(
+        self, candidate: Candidate, request: MultiExecutionRequest, work_dir: str
+    ):
+        self.handler = get_language_handler(candidate.language, candidate.interpreter)
+        os.mkdir(work_dir)
+        self.code_path = os.path.join(work_dir, self.handler.program_filename)
+        self.compile_output = self.handler.compile(candidate.code, self.code_path)
+        self.timeout = (
+            request.time_limit_seconds or self.handler.default_timeout_seconds
+        )
+        self.results: List[Optional[RunResult]] = [None] * len(request.stdin_stdout)
+        # output_hash of each test's stdout, with group_outputs
+        self.output_hashes: List[Optional[str]] = [None] * len(self.results)
+        # Set by the first failing test, for stop_on_first_failure
+        self.failed = threading.Event()
+
+    def run_test(self, index: int, test: StdinStdout, request: MultiExecutionRequest):
+        if request.stop_on_first_failure and self.failed.is_set():
+            result = skipped_result("an earlier test failed")
+        else:
+            with cpu_slot():
+                result = self.handler.run_test(
+                    self.code_path, test, timeout=self.timeout
+                )
+            if not result.passed:
+                self.failed.set()
+            if request.group_outputs and not result.timed_out:
+                self.output_hashes[index] = output_hash(result.stdout)
+        self.results[index] = shape_output(result, request.output_verbosity)
+
+    def response(self, response_format: str) -> ExecutionResponse:
+        if not self.compile_output.passed:
+            response = ResultBuffer(0).response(self.compile_output, response_format)
+            response.all_passed = False
+            return response
+        results = ResultBuffer(
+            len(self.results), keep_outputs=response_format != "compact"
+        )
+        for index, result in enumerate(self.results):
+            assert result is not None
+            results.set(index, result)
+        return results.response(self.compile_output, response_format)
+
+
+def _group_outputs(
+    compiled: List[Tuple[int, _CandidateRun]], num_tests: int
+) -> Tuple[List[List[OutputGroup]], List[List[int]]]:
+    """Group candidates by output per test and by their outputs on all tests"""
+    output_groups = []
+    for test_index in range(num_tests):
+        by_hash: Dict[str, List[int]] = {}
+        for index, run in compiled:
+            digest = run.output_hashes[test_index]
+            if digest is not None:
+                by_hash.setdefault(digest, []).append(index)
+        output_groups.append(
+            [
+                OutputGroup(output_sha256=digest, candidates=members)
+                for digest, members in sorted(
+                    by_hash.items(), key=lambda item: -len(item[1])
+                )
+            ]
+        )
+    # Candidates with a test that timed out or was skipped have no known
+    # output on it, so they can't be said to behave like any other
+    by_behavior: Dict[Tuple[str, ...], List[int]] = {}
+    for index, run in compiled:
+        hashes = [digest for digest in run.output_hashes if digest is not None]
+        if len(hashes) == len(run.output_hashes):
+            by_behavior.setdefault(tuple(hashes), []).append(index)
+    behavior_groups = sorted(by_behavior.values(), key=len, reverse=True)
+    return output_groups, behavior_groups
+
+
+def execute_multi(request: MultiExecutionRequest) -> MultiExecutionResponse:
+    """Run every candidate against the same tests
+
+    Candidates are compiled concurrently, then each (candidate, test) pair is
+    a separate job on the batch pool. Jobs are queued test by test across
+    candidates, so with stop_on_first_failure a failing candidate is found
+    early and its later tests are skipped instead of run.
+    """
+    with drain.admit():
+        return _execute_multi(request)
+
+
+def _execute_multi(request: MultiExecutionRequest) -> MultiExecutionResponse:
+    request = with_generated_tests(request)
+    temp_dir = drain.workspace()
+
+    def prepare(index: int, candidate: Candidate):
+        work_dir = os.path.join(temp_dir, str(index))
+        try:
+            return _CandidateRun(candidate, request, work_dir)
+        except ValueError as e:
+            return BatchItemResponse(error=str(e), status_code=400)
+        except LanguageUnavailableError as e:
+            return BatchItemResponse(error=str(e), status_code=503)
+
+    try:
+        preparing = [
+            tracing.submit(_batch_executor, prepare, index, candidate)
+            for index, candidate in enumerate(request.candidates)
+        ]
+        runs = [job.result() for job in preparing]
+        runnable = [
+            run
+            for run in runs
+            if isinstance(run, _CandidateRun) and run.compile_output.passed
+        ]
+        jobs = [
+            tracing.submit(_batch_executor, run.run_test, index, test, request)
+            for index, test in enumerate(request.stdin_stdout)
+            for run in runnable
+        ]
+        for job in jobs:
+            job.result()
+    finally:
+        shutil.rmtree(temp_dir)
+
+    pass_matrix = []
+    candidates = []
+    for run in runs:
+        if isinstance(run, BatchItemResponse):
+            pass_matrix.append([False] * len(request.stdin_stdout))
+            candidates.append(run)
+            continue
+        pass_matrix.append(
+            [result is not None and result.passed for result in run.results]
+        )
+        candidates.append(
+            BatchItemResponse(response=run.response(request.response_format))
+        )
+    response = MultiExecutionResponse(pass_matrix=pass_matrix, candidates=candidates)
+    if request.group_outputs:
+        compiled = [
+            (index, run)
+            for index, run in enumerate(runs)
+            if isinstance(run, _CandidateRun) and run.compile_output.passed
+        ]
+        response.output_groups, response.behavior_groups = _group_outputs(
+            compiled, len(request.stdin_stdout)
+        )
+    return response
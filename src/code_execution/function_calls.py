@@ -0,0 +1,191 @@
+"""Function-call tests: call a program's function and compare return values
+
+A FunctionSession keeps one harness process (languages/python_harness.py)
+running with the program loaded and sends it one call at a time, so a
+submission's calls share a warm interpreter. A call that times out kills the
+harness; the next call starts a fresh one.
+"""
+
+import json
+import math
+import os
+import selectors
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+from code_execution import tracing
+from code_execution.cpu_scheduler import current_cpu
+from code_execution.process import kill_process_group, reaper, spawn
+from code_execution.types import FunctionCall, RunResult
+
+_READ_CHUNK = 64 * 1024
+# Relative and absolute tolerance of float comparisons
+FLOAT_TOLERANCE = 1e-6
+
+
+def values_equal(actual: Any, expected: Any) -> bool:
+    """Compare JSON values structurally; floats compare with a tolerance"""
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return type(actual) is type(expected) and actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        if isinstance(actual, int) and isinstance(expected, int):
+            return actual == expected
+        return math.isclose(
+            actual, expected, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE
+        )
+    if isinstance(expected, list):
+        return (
+            isinstance(actual, list)
+            and len(actual) == len(expected)
+            and all(values_equal(a, e) for a, e in zip(actual, expected))
+        )
+    if isinstance(expected, dict):
+        return (
+            isinstance(actual, dict)
+            and actual.keys() == expected.keys()
+            and all(values_equal(actual[key], expected[key]) for key in expected)
+        )
+    return actual == expected
+
+
+def _failed(stderr: str, time_seconds: float = 0, timed_out: bool = False):
+    return RunResult(
+        passed=False,
+        stdout="Error: Timed out" if timed_out else "",
+        stderr=stderr,
+        time_seconds=time_seconds,
+        timed_out=timed_out,
+    )
+
+
+class FunctionSession:
+    """A harness process calling one function of a program, one call at a time"""
+
+    def __init__(
+        self,
+        command: List[str],
+        env: Optional[Dict[str, str]] = None,
+        cwd: Optional[str] = None,
+    ):
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        # Set when the program itself fails to load; every call fails with it
+        self.load_error: Optional[str] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._buffer = b""
+
+    def _start(self, timeout: float) -> Optional[RunResult]:
+        """Start the harness; return the failure if it didn't load"""
+        with tracing.span("spawn"):
+            self._process = spawn(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd=self.cwd,
+                env=self.env,
+            )
+        reaper.track(self._process.pid)
+        assert self._process.stdout is not None
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._process.stdout, selectors.EVENT_READ)
+        start = time.perf_counter()
+        with tracing.span("load"):
+            message = self._receive(time.monotonic() + timeout)
+        if message is None:
+            self._stop()
+            return _failed(
+                "Error: Timed out loading the program",
+                time.perf_counter() - start,
+                timed_out=True,
+            )
+        if "error" in message or not message:
+            load_error: str = message.get("error", "Error: The program exited")
+            self.load_error = load_error
+            self._stop()
+            return _failed(load_error)
+        return None
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+        kill_process_group(self._process.pid)
+        self._process.wait()
+        reaper.release(self._process.pid)
+        assert self._process.stdin and self._process.stdout and self._selector
+        self._selector.close()
+        for pipe in (self._process.stdin, self._process.stdout):
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+        self._process = None
+        self._selector = None
+        self._buffer = b""
+
+    def close(self) -> None:
+        self._stop()
+
+    def _receive(self, deadline: float) -> Optional[Dict[str, Any]]:
+        """Return the harness's next message, {} if it exited, None on timeout"""
+        assert self._process is not None and self._selector is not None
+        assert self._process.stdout is not None
+        fd = self._process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._selector.select(remaining):
+                return None
+            data = os.read(fd, _READ_CHUNK)
+            if not data:
+                return {}
+            self._buffer += data
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return json.loads(line)
+
+    def call(self, call: FunctionCall, timeout: float) -> RunResult:
+        if self.load_error is not None:
+            return _failed(self.load_error)
+        if self._process is None:
+            failure = self._start(timeout)
+            if failure is not None:
+                return failure
+        assert self._process is not None and self._process.stdin is not None
+
+        start = time.perf_counter()
+        try:
+            line = json.dumps(
+                {"args": call.args, "kwargs": call.kwargs, "cpu": current_cpu()}
+            )
+            self._process.stdin.write(line.encode() + b"\n")
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            pass
+        with tracing.span("run"):
+            message = self._receive(time.monotonic() + timeout)
+        if message is None:
+            self._stop()
+            return _failed(
+                "Error: Timed out", time.perf_counter() - start, timed_out=True
+            )
+        if not message:
+            process = self._process
+            self._stop()
+            status = process.returncode
+            return _failed(
+                f"Error: The program exited with status {status}",
+                time.perf_counter() - start,
+            )
+        output = message["output"]
+        if "error" in message:
+            return _failed(output + message["error"], message["time"])
+        with tracing.span("compare"):
+            passed = values_equal(message["value"], call.expected)
+        return RunResult(
+            passed=passed,
+            stdout=json.dumps(message["value"]),
+            stderr=output,
+            time_seconds=message["time"],
+            timed_out=False,
+        )
@@ -0,0 +1,228 @@
+"""Tests generated on the server from a generator program and seeds
+
+Requests can name a generator and its seeds instead of shipping large
+generated inputs. Each seed's input, and a reference solution's output on
+it, is cached on disk under a hash of the programs and the seed, so every
+candidate evaluated against the same problem shares one generation, in
+every worker process.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from code_execution import config, tracing
+from code_execution.languages import get_language_handler
+from code_execution.metrics import metrics
+from code_execution.process import run_process
+from code_execution.sandbox import get_sandbox
+from code_execution.shared_cache import SharedCache
+from code_execution.shutdown import drain
+from code_execution.types import GeneratedTests, StdinStdout
+
+_executor = ThreadPoolExecutor(
+    max_workers=config.BATCH_PARALLELISM, thread_name_prefix="generate"
+)
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class _Program:
+    """A compiled generator or reference solution"""
+
+    def __init__(
+        self,
+        role: str,
+        language: str,
+        interpreter: Optional[str],
+        code: str,
+        work_dir: str,
+    ):
+        self.role = role
+        self.handler = get_language_handler(language, interpreter)
+        os.mkdir(work_dir)
+        self.code_path = os.path.join(work_dir, self.handler.program_filename)
+        compile_output = self.handler.compile(code, self.code_path)
+        if not compile_output.passed:
+            raise ValueError(f"{role} failed to compile: {compile_output.stderr}")
+
+    def run(self, args: List[str], stdin: str, timeout: float, seed: str) -> str:
+        command = self.handler.program_command(self.code_path) + args
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            command = sandbox.wrap(
+                command,
+                cpu_time_limit_seconds=timeout,
+                visible_dirs=[os.path.dirname(self.code_path)],
+            )
+        process = run_process(
+            command, stdin=stdin, timeout=timeout, env=self.handler.program_env()
+        )
+        if process.timed_out:
+            raise ValueError(f"{self.role} timed out on seed {seed}")
+        if process.returncode != 0:
+            raise ValueError(
+                f"{self.role} failed on seed {seed} with status "
+                f"{process.returncode}: {process.stderr}"
+            )
+        return process.stdout
+
+
+class GeneratedTestCache:
+    """Generates tests and keeps their inputs and expected outputs on disk"""
+
+    def __init__(
+        self,
+        cache_dir: str = config.GENERATED_TESTS_DIR,
+        max_bytes: int = config.GENERATED_TESTS_MAX_BYTES,
+    ):
+        self.store = SharedCache("generated_test", cache_dir, max_bytes)
+
+    def _read(self, key: str) -> Optional[str]:
+        data = self.store.read(key)
+        return None if data is None else data.decode("utf-8")
+
+    def _write(self, key: str, text: str) -> None:
+        self.store.write(key, text.encode("utf-8"))
+
+    def expand(self, generator: GeneratedTests) -> List[StdinStdout]:
+        """Return the generator's test for each seed, generating missing ones"""
+        generator_key = _hash(
+            generator.language, generator.interpreter or "", generator.code
+        )
+        seeds = [str(seed) for seed in generator.seeds]
+        input_keys = [_hash("input", generator_key, seed) for seed in seeds]
+        output_keys: Optional[List[str]] = None
+        reference_key = ""
+        if generator.reference_code is not None:
+            reference_key = _hash(
+                generator.reference_language or generator.language,
+                generator.reference_code,
+            )
+            output_keys = [_hash("output", reference_key, key) for key in input_keys]
+
+        inputs = [self._read(key) for key in input_keys]
+        outputs = (
+            [self._read(key) for key in output_keys]
+            if output_keys is not None
+            else None
+        )
+        missing = sum(
+            inputs[i] is None or (outputs is not None and outputs[i] is None)
+            for i in range(len(seeds))
+        )
+        metrics.inc("generated_test_cache_hits", len(seeds) - missing)
+        metrics.inc("generated_test_cache_misses", missing)
+        if missing:
+            # The candidates of one problem tend to arrive together, on every
+            # worker; the first generates and the others wait for its tests
+            with self.store.single_flight(_hash(generator_key, reference_key)):
+                for i in range(len(seeds)):
+                    if inputs[i] is None:
+                        inputs[i] = self._read(input_keys[i])
+                    if outputs is not None and output_keys is not None:
+                        if outputs[i] is None:
+                            outputs[i] = self._read(output_keys[i])
+                work_dir = drain.workspace()
+                try:
+                    self._generate(
+                        generator,
+                        seeds,
+                        input_keys,
+                        output_keys,
+                        inputs,
+                        outputs,
+                        work_dir,
+                    )
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+        tests = []
+        for i, stdin in enumerate(inputs):
+            assert stdin is not None
+            stdout = outputs[i] if outputs is not None else ""
+            assert stdout is not None
+            tests.append(StdinStdout(stdin=stdin, stdout=stdout))
+        return tests
+
+    def _generate(
+        self,
+        generator: GeneratedTests,
+        seeds: List[str],
+        input_keys: List[str],
+        output_keys: Optional[List[str]],
+        inputs: List[Optional[str]],
+        outputs: Optional[List[Optional[str]]],
+        work_dir: str,
+    ) -> None:
+        """Generate the tests missing from inputs and outputs, filling them in"""
+        timeout = generator.time_limit_seconds
+        missing_inputs = [i for i, text in enumerate(inputs) if text is None]
+        if missing_inputs:
+            with tracing.span("generator_compile"):
+                program = _Program(
+                    "Generator",
+                    generator.language,
+                    generator.interpreter,
+                    generator.code,
+                    os.path.join(work_dir, "generator"),
+                )
+
+            def generate_input(i: int) -> None:
+                text = program.run([seeds[i]], "", timeout, seeds[i])
+                self._write(input_keys[i], text)
+                inputs[i] = text
+
+            with tracing.span("generate"):
+                jobs = [
+                    tracing.submit(_executor, generate_input, i) for i in missing_inputs
+                ]
+                for job in jobs:
+                    job.result()
+
+        if outputs is None or output_keys is None:
+            return
+        missing_outputs = [i for i, text in enumerate(outputs) if text is None]
+        if missing_outputs:
+            assert generator.reference_code is not None
+            with tracing.span("reference_compile"):
+                reference = _Program(
+                    "Reference solution",
+                    generator.reference_language or generator.language,
+                    None,
+                    generator.reference_code,
+                    os.path.join(work_dir, "reference"),
+                )
+
+            def generate_output(i: int) -> None:
+                stdin = inputs[i]
+                assert stdin is not None
+                text = reference.run([], stdin, timeout, seeds[i])
+                self._write(output_keys[i], text)
+                outputs[i] = text
+
+            with tracing.span("generate_expected"):
+                jobs = [
+                    tracing.submit(_executor, generate_output, i)
+                    for i in missing_outputs
+                ]
+                for job in jobs:
+                    job.result()
+
+
+_cache: Optional[GeneratedTestCache] = None
+_lock = threading.Lock()
+
+
+def generated_tests(generator: GeneratedTests) -> List[StdinStdout]:
+    """Expand a request's generator into tests through the shared cache"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = GeneratedTestCache()
+            metrics.register_collector("generated_test_cache", _cache.store.stats)
+    return _cache.expand(generator)
@@ -0,0 +1,117 @@
+"""Judging of interactive problems, where the submission talks to an interactor"""
+
+import os
+import shutil
+from typing import List
+from code_execution import tracing
+from code_execution.languages import get_language_handler
+from code_execution.languages.base import LanguageHandler
+from code_execution.process import InteractiveSide, run_interactive
+from code_execution.sandbox import get_sandbox
+from code_execution.shutdown import drain
+from code_execution.types import Interactor, RunResult, StdinStdout
+
+
+def _side(
+    handler: LanguageHandler,
+    code_path: str,
+    timeout: float,
+    cpu_time_limit_seconds: float,
+    args: List[str],
+) -> InteractiveSide:
+    command = handler.program_command(code_path) + args
+    sandbox = get_sandbox()
+    if sandbox is not None:
+        command = sandbox.wrap(
+            command,
+            cpu_time_limit_seconds=cpu_time_limit_seconds,
+            visible_dirs=[os.path.dirname(code_path)],
+        )
+    return InteractiveSide(
+        command=command,
+        timeout=timeout,
+        cpu_time_limit_seconds=cpu_time_limit_seconds,
+        env=handler.program_env(),
+    )
+
+
+class InteractiveJudge:
+    """A request's compiled interactor, run against the submission on each test
+
+    The interactor and the test files live in their own directory, outside
+    the submission's workspace, so a sandboxed submission can't read them.
+    """
+
+    def __init__(self, interactor: Interactor):
+        self.interactor = interactor
+        self.handler = get_language_handler(interactor.language, interactor.interpreter)
+        self.work_dir = drain.workspace(prefix="interactor")
+        self.code_path = os.path.join(self.work_dir, self.handler.program_filename)
+        self.input_path = os.path.join(self.work_dir, "input.txt")
+        self.answer_path = os.path.join(self.work_dir, "answer.txt")
+        try:
+            with tracing.span("interactor_compile"):
+                compile_output = self.handler.compile(interactor.code, self.code_path)
+        except BaseException:
+            self.close()
+            raise
+        if not compile_output.passed:
+            self.close()
+            raise ValueError(f"Interactor failed to compile: {compile_output.stderr}")
+
+    def close(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def run_test(
+        self,
+        handler: LanguageHandler,
+        code_path: str,
+        test: StdinStdout,
+        timeout: float,
+    ) -> RunResult:
+        with open(self.input_path, "w") as input_file:
+            input_file.write(test.stdin)
+        with open(self.answer_path, "w") as answer_file:
+            answer_file.write(test.stdout)
+        interactor_timeout = self.interactor.time_limit_seconds or timeout
+        program = _side(
+            handler,
+            code_path,
+            timeout,
+            self.interactor.program_cpu_time_limit_seconds or timeout,
+            [],
+        )
+        judge = _side(
+            self.handler,
+            self.code_path,
+            interactor_timeout,
+            self.interactor.cpu_time_limit_seconds or interactor_timeout,
+            [self.input_path, self.answer_path],
+        )
+        program_result, interactor_result = run_interactive(program, judge)
+
+        if program_result.timed_out:
+            return RunResult(
+                passed=False,
+                stdout="Error: Timed out",
+                stderr="Error: Timed out",
+                time_seconds=program_result.time_seconds,
+                timed_out=True,
+            )
+        if interactor_result.timed_out:
+            return RunResult(
+                passed=False,
+                stdout=interactor_result.stderr,
+                stderr="Error: Interactor timed out",
+                time_seconds=program_result.time_seconds,
+                timed_out=False,
+            )
+        # The interactor gives the verdict; a submission that crashed after
+        # answering still fails
+        return RunResult(
+            passed=interactor_result.returncode == 0 and program_result.returncode == 0,
+            stdout=interactor_result.stderr,
+            stderr=program_result.stderr,
+            time_seconds=program_result.time_seconds,
+            timed_out=False,
+        )
@@ -0,0 +1,342 @@
+"""Job queue mode: a coordinator enqueues requests and workers pull them
+
+The broker is a SQLite database, so the coordinator and any number of worker
+processes on one machine (or sharing a volume) can use it without extra
+services. Workers hold a lease on the job they run and renew it while running;
+if a worker dies its lease expires and the job is retried by another worker,
+and a worker cut short by SIGTERM gives its job back right away.
+Jobs are routed by an affinity key derived from the code, so a resubmission of
+the same program is preferably picked up by the worker that compiled it last.
+
+Run a worker with: python -m code_execution.job_queue --db /path/to/queue.db
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+from code_execution import config
+from code_execution.types import CodeExecutionRequest, ExecutionResponse, JobStatus
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    affinity_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    response TEXT,
+    error TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    last_heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS affinity (
+    key TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL
+);
+"""
+
+
+def affinity_key(request: CodeExecutionRequest) -> str:
+    """Key under which a request's compiled program would be cached"""
+    return hashlib.sha256(f"{request.language}\0{request.code}".encode()).hexdigest()
+
+
+class JobQueue:
+    """SQLite-backed job broker shared by the coordinator and workers"""
+
+    def __init__(
+        self,
+        db_path: str,
+        lease_seconds: float = config.JOB_LEASE_SECONDS,
+        max_attempts: int = config.JOB_MAX_ATTEMPTS,
+        affinity_wait_seconds: float = config.JOB_AFFINITY_WAIT_SECONDS,
+    ):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.affinity_wait_seconds = affinity_wait_seconds
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def submit(self, request: CodeExecutionRequest) -> str:
+        """Enqueue a request and return its job id"""
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO jobs (id, request, affinity_key, status, created) "
+            "VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, request.model_dump_json(), affinity_key(request), time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        row = self._connection().execute(
+            "SELECT status, attempts, worker_id, response, error "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        status, attempts, worker_id, response, error = row
+        return JobStatus(
+            job_id=job_id,
+            status=status,
+            attempts=attempts,
+            worker_id=worker_id,
+            response=json.loads(response) if response else None,
+            error=error,
+        )
+
+    def wait(
+        self, job_id: str, timeout: float, poll_interval_seconds: float = 0.05
+    ) -> Optional[JobStatus]:
+        """Poll until the job is done or failed, or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.get(job_id)
+            if status is None or status.status in ("done", "failed"):
+                return status
+            if time.monotonic() >= deadline:
+                return status
+            time.sleep(poll_interval_seconds)
+
+    def heartbeat(self, worker_id: str, job_id: Optional[str] = None) -> None:
+        """Mark the worker alive and extend the lease on its running job"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO workers (id, last_heartbeat) VALUES (?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET last_heartbeat = excluded.last_heartbeat",
+            (worker_id, now),
+        )
+        if job_id is not None:
+            connection.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, job_id, worker_id),
+            )
+
+    def _requeue_expired(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute(
+            "UPDATE jobs SET "
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = CASE WHEN attempts >= ? THEN 'Worker lease expired too often' "
+            "ELSE error END, "
+            "worker_id = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (self.max_attempts, self.max_attempts, now),
+        )
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, CodeExecutionRequest]]:
+        """Take the next job for this worker, preferring jobs with affinity to it"""
+        now = time.time()
+        self.heartbeat(worker_id)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._requeue_expired(connection, now)
+            # A job may go to any worker if no live worker has its key cached,
+            # or once it has waited long enough for the one that does
+            row = connection.execute(
+                "SELECT j.id, j.request, j.affinity_key FROM jobs j "
+                "LEFT JOIN affinity a ON a.key = j.affinity_key "
+                "LEFT JOIN workers w ON w.id = a.worker_id "
+                "WHERE j.status = 'queued' AND ("
+                "  a.worker_id IS NULL OR a.worker_id = ? "
+                "  OR w.last_heartbeat IS NULL OR w.last_heartbeat < ? "
+                "  OR j.created < ?"
+                ") "
+                "ORDER BY CASE WHEN a.worker_id = ? THEN 0 ELSE 1 END, j.created "
+                "LIMIT 1",
+                (
+                    worker_id,
+                    now - self.lease_seconds,
+                    now - self.affinity_wait_seconds,
+                    worker_id,
+                ),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            job_id, request, key = row
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + self.lease_seconds, job_id),
+            )
+            connection.execute(
+                "INSERT INTO affinity (key, worker_id) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET worker_id = excluded.worker_id",
+                (key, worker_id),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return job_id, CodeExecutionRequest.model_validate_json(request)
+
+    def complete(
+        self, job_id: str, worker_id: str, response: ExecutionResponse
+    ) -> bool:
+        """Store a job's result; False if the worker no longer holds the lease"""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'done', response = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (response.model_dump_json(), job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """Give a job back unfinished without spending one of its attempts
+
+        The job loses its affinity to the worker, so it isn't held back for
+        a worker that is going away.
+        """
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM affinity WHERE worker_id = ? AND key = "
+            "(SELECT affinity_key FROM jobs WHERE id = ?)",
+            (worker_id, job_id),
+        )
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, "
+            "worker_id = NULL, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (job_id, worker_id),
+        )
+
+    def fail(
+        self, job_id: str, worker_id: str, error: str, retry: bool = True
+    ) -> None:
+        """Give a job back after an error, or fail it once out of attempts
+
+        With retry=False the job is failed right away, for errors that would
+        happen again on any worker.
+        """
+        max_attempts = self.max_attempts if retry else 0
+        self._connection().execute(
+            "UPDATE jobs SET "
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, worker_id = NULL, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (max_attempts, error, job_id, worker_id),
+        )
+
+
+class JobWorker:
+    """Pulls jobs from the queue, executes them and pushes the results back"""
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        worker_id: Optional[str] = None,
+        poll_interval_seconds: float = 0.1,
+    ):
+        self.job_queue = job_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval_seconds = poll_interval_seconds
+
+    def _renew_lease(self, job_id: str, done: threading.Event) -> None:
+        while not done.wait(self.job_queue.lease_seconds / 3):
+            self.job_queue.heartbeat(self.worker_id, job_id)
+
+    def run_once(self) -> bool:
+        """Run one job if there is one; return whether a job was run"""
+        # Imported here so the coordinator doesn't need the language handlers
+        from code_execution.execution import execute_request
+        from code_execution.languages import LanguageUnavailableError
+        from code_execution.shutdown import ShuttingDownError, drain
+
+        if drain.draining:
+            return False
+        claimed = self.job_queue.claim(self.worker_id)
+        if claimed is None:
+            return False
+        job_id, request = claimed
+        done = threading.Event()
+        renewer = threading.Thread(
+            target=self._renew_lease, args=(job_id, done), daemon=True
+        )
+        renewer.start()
+        try:
+            response = execute_request(request)
+        except ShuttingDownError:
+            # Cut short by shutdown: another worker retries it from scratch
+            logger.info("Giving job %s back: shutting down", job_id)
+            self.job_queue.release(job_id, self.worker_id)
+            return True
+        except (ValueError, LanguageUnavailableError) as e:
+            # A bad request or a missing toolchain fails the same way every time
+            logger.info("Job %s failed: %s", job_id, e)
+            self.job_queue.fail(job_id, self.worker_id, str(e), retry=False)
+            return True
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self.job_queue.fail(job_id, self.worker_id, str(e))
+            return True
+        finally:
+            done.set()
+            renewer.join()
+        if not self.job_queue.complete(job_id, self.worker_id, response):
+            logger.warning("Lease on job %s was lost before completion", job_id)
+        return True
+
+    def run_forever(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.run_once():
+                self.job_queue.heartbeat(self.worker_id)
+                stop.wait(self.poll_interval_seconds)
+
+
+def main() -> None:
+    from code_execution.languages import warm_up_handlers
+    from code_execution.process import reaper
+    from code_execution.shutdown import drain
+
+    parser = argparse.ArgumentParser(description="Run a code execution queue worker")
+    parser.add_argument(
+        "--db", default=config.JOB_QUEUE_DB, required=config.JOB_QUEUE_DB is None
+    )
+    parser.add_argument("--worker-id", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reaper.start()
+    drain.sweep([config.BINARY_CACHE_DIR, config.GENERATED_TESTS_DIR])
+    stop = threading.Event()
+    drain.install_signal_handler(stop.set)
+    for language, error in warm_up_handlers().items():
+        if error is not None:
+            logger.warning("Language %s is unavailable: %s", language, error)
+    JobWorker(JobQueue(args.db), args.worker_id).run_forever(stop)
+    drain.wait(drain.drain_seconds)
+    drain.close()
+
+
+if __name__ == "__main__":
+    main()
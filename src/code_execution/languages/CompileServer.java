@@ -0,0 +1,42 @@
+// Long-lived javac for the Java language handler.
+//
+// Reads one request per line from stdin, "<classes dir>\t<source file>\t<log file>",
+// compiles the source in-process with javax.tools, writes the diagnostics to the
+// log file and answers with javac's exit status on a line of its own. Keeping
+// the JVM (and javac's JIT-compiled code) alive avoids paying JVM startup and
+// warm-up on every compile. Exits when stdin is closed.
+
+import java.io.BufferedReader;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+
+public class CompileServer {
+    public static void main(String[] args) throws Exception {
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("no system Java compiler (is this a JRE?)");
+            System.exit(1);
+        }
+        BufferedReader in = new BufferedReader(
+                new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PrintStream out = new PrintStream(System.out, true, "UTF-8");
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] request = line.split("\t");
+            int status;
+            try (OutputStream log = new FileOutputStream(request[2])) {
+                status = compiler.run(
+                        null, log, log, "-encoding", "UTF-8", "-nowarn",
+                        "-d", request[0], request[1]);
+            } catch (Throwable e) {
+                status = 2;
+            }
+            out.println(status);
+        }
+    }
+}
@@ -1,19 +1,68 @@
-from typing import Dict, Type
+import threading
+from typing import Dict, Optional, Type
 from code_execution.languages.base import LanguageHandler
 from code_execution.languages.cpp import CppHandler
+from code_execution.languages.go import GoHandler
+from code_execution.languages.java import JavaHandler
 from code_execution.languages.python import PythonHandler
+from code_execution.languages.rust import RustHandler
 
+# Languages whose toolchain isn't installed are reported unavailable at warm-up
 _HANDLERS: Dict[str, Type[LanguageHandler]] = {
     "cpp": CppHandler,
     "python": PythonHandler,
+    "java": JavaHandler,
+    "go": GoHandler,
+    "rust": RustHandler,
 }
 
-def get_language_handler(language: str) -> LanguageHandler:
-    """Get a language handler instance for the specified language"""
+# Long-lived handler instances, one per language per worker process
+_INSTANCES: Dict[str, LanguageHandler] = {}
+# Toolchain errors found during warm-up, by language
+_UNAVAILABLE: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+class LanguageUnavailableError(RuntimeError):
+    """Raised when a supported language's toolchain failed its startup check"""
+
+
+def _get_instance(language: str) -> LanguageHandler:
+    with _lock:
+        if language not in _INSTANCES:
+            _INSTANCES[language] = _HANDLERS[language]()
+        return _INSTANCES[language]
+
+
+def get_language_handler(
+    language: str, interpreter: Optional[str] = None
+) -> LanguageHandler:
+    """Get the shared language handler instance for the specified language"""
     language = language.lower()
     if language not in _HANDLERS:
         supported = ", ".join(f"'{lang}'" for lang in _HANDLERS.keys())
         raise ValueError(
             f"Language '{language}' is not supported. Supported languages: {supported}"
         )
-    return _HANDLERS[language]()
\ No newline at end of file
+    if language in _UNAVAILABLE:
+        raise LanguageUnavailableError(
+            f"Language '{language}' is unavailable: {_UNAVAILABLE[language]}"
+        )
+    handler = _get_instance(language)
+    if interpreter is not None:
+        return handler.for_interpreter(interpreter)
+    return handler
+
+
+def warm_up_handlers() -> Dict[str, Optional[str]]:
+    """Create and warm up every handler; return the error (or None) per language"""
+    status: Dict[str, Optional[str]] = {}
+    for language in _HANDLERS:
+        try:
+            _get_instance(language).warm_up()
+            _UNAVAILABLE.pop(language, None)
+            status[language] = None
+        except Exception as e:
+            _UNAVAILABLE[language] = str(e)
+            status[language] = str(e)
+    return status
@@ -1,9 +1,23 @@
 from abc import ABC, abstractmethod
-from code_execution.types import StdinStdout, Output
+from typing import TYPE_CHECKING, Dict, List, Optional
+from code_execution.types import Output, RunResult, StdinStdout
+
+if TYPE_CHECKING:
+    from code_execution.function_calls import FunctionSession
+    from code_execution.snapshot import SnapshotSession
 
 
 class LanguageHandler(ABC):
-    """Base class for language handlers"""
+    """Base class for language handlers
+
+    Handlers are created once per worker process and shared by all requests,
+    so they may own long-lived state (caches, pools) but must be thread-safe.
+    """
+
+    # Per-test timeout used when the request doesn't set one
+    default_timeout_seconds: float = 120
+    # File name of the compiled program or script inside the workspace
+    program_filename: str = "program"
     
     @property
     @abstractmethod
@@ -17,6 +31,46 @@ class LanguageHandler(ABC):
         pass
     
     @abstractmethod
-    def execute(self, code_path: str, test: StdinStdout) -> Output:
+    def run_test(
+        self, code_path: str, test: StdinStdout, timeout: Optional[float] = None
+    ) -> RunResult:
+        """Execute the code with the given input and return the test's result"""
+        pass
+
+    def execute(
+        self, code_path: str, test: StdinStdout, timeout: Optional[float] = None
+    ) -> Output:
         """Execute the code with the given input and return execution output"""
-        pass
\ No newline at end of file
+        return self.run_test(code_path, test, timeout).to_output()
+
+    def program_command(self, code_path: str) -> List[str]:
+        """The command running a prepared program, for callers that start it"""
+        raise NotImplementedError(
+            f"Language '{self.language_id}' cannot be run as a command"
+        )
+
+    def program_env(self) -> Optional[Dict[str, str]]:
+        """Environment for program_command; None inherits the server's"""
+        return None
+
+    def function_session(self, code_path: str, entry_point: str) -> "FunctionSession":
+        """Start calling a function of the prepared program, for function-call tests"""
+        raise ValueError(
+            f"Language '{self.language_id}' does not support function-call tests"
+        )
+
+    def snapshot_session(
+        self, code_path: str, setup_timeout: float
+    ) -> Optional["SnapshotSession"]:
+        """Start snapshotting the prepared program; None if the language can't"""
+        return None
+
+    def for_interpreter(self, interpreter: str) -> "LanguageHandler":
+        """Return the handler variant running programs with the given interpreter"""
+        raise ValueError(
+            f"Language '{self.language_id}' does not support choosing an interpreter"
+        )
+
+    def warm_up(self) -> None:
+        """Check the toolchain and warm caches; raise RuntimeError if unusable"""
+        pass
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from abc import abstractmethod
+from typing import Dict, List, Optional
+from code_execution import config, tracing
+from code_execution.metrics import metrics
+from code_execution.page_cache import pinned_files, prefetch, shared_libraries
+from code_execution.process import ProcessResult, run_process
+from code_execution.sandbox import get_sandbox
+from code_execution.shared_cache import SharedCache
+from code_execution.types import Output, RunResult, StdinStdout
+from code_execution.languages.base import LanguageHandler
+
+
+# Runs of the warm-up program timed at startup to report launch latency
+_STARTUP_SAMPLES = 5
+
+
+class CompiledLanguageHandler(LanguageHandler):
+    """Base class for languages compiled ahead of the tests
+
+    Subclasses give the compiler and run commands; compiling, the on-disk
+    binary cache, metrics and sandboxed execution are shared. Artifacts are
+    cached by a hash of the compiler command and the code, in a SharedCache
+    every worker process uses, so a program is compiled once per machine.
+    """
+
+    default_timeout_seconds = 120
+    program_filename = "program"
+    # Name the source is written under, next to the compiled program
+    source_filename: str = "program"
+    # Executable that must be on PATH for the language to be available
+    toolchain: str = ""
+    compile_timeout_seconds: float = 60
+    # Compiled and run at startup to check the toolchain and warm its caches;
+    # it must print "ok"
+    warm_up_program: str = ""
+
+    def __init__(
+        self,
+        binary_cache_dir: Optional[str] = (
+            config.BINARY_CACHE_DIR if config.BINARY_CACHE_ENABLED else None
+        ),
+    ):
+        self.binary_cache: Optional[SharedCache] = None
+        # Median time to run the warm-up program, from spawn to exit
+        self.startup_seconds: Optional[float] = None
+        if binary_cache_dir is not None:
+            self.binary_cache = SharedCache(
+                "binary", binary_cache_dir, config.BINARY_CACHE_MAX_BYTES
+            )
+            metrics.register_collector("binary_cache", self.binary_cache.stats)
+
+    @abstractmethod
+    def _compiler_command(self, source: str, output: str) -> List[str]:
+        """The compiler invocation; its flags are part of the cache key"""
+        pass
+
+    def _compile_command(self, source: str, output: str) -> List[str]:
+        return self._compiler_command(source, output)
+
+    def _compile_env(self) -> Optional[Dict[str, str]]:
+        return None
+
+    def _source_name(self, code: str) -> str:
+        return self.source_filename
+
+    def program_command(self, code_path: str) -> List[str]:
+        return [code_path]
+
+    def program_env(self) -> Optional[Dict[str, str]]:
+        return None
+
+    def _build(
+        self, source_name: str, output_name: str, work_dir: str
+    ) -> ProcessResult:
+        """Compile source_name into output_name, both relative to work_dir"""
+        return run_process(
+            self._compile_command(source_name, output_name),
+            stdin="",
+            timeout=self.compile_timeout_seconds,
+            cwd=work_dir,
+            env=self._compile_env(),
+        )
+
+    def _cache_key(self, code: str) -> str:
+        flags = " ".join(self._compiler_command(self.source_filename, "program"))
+        return hashlib.sha256(f"{flags}\0{code}".encode()).hexdigest()
+
+    def _fetch_binary(self, key: str, output_path: str) -> bool:
+        assert self.binary_cache is not None
+        if not self.binary_cache.fetch(key, output_path):
+            return False
+        # Read it in while the request sets up, not during the first test
+        prefetch(output_path)
+        metrics.inc(f"{self.language_id}_binary_cache_hits")
+        return True
+
+    def _compile_and_publish(self, key: str, code: str, output_path: str) -> Output:
+        assert self.binary_cache is not None
+        metrics.inc(f"{self.language_id}_binary_cache_misses")
+        compile_output = self._compile_source(code, output_path)
+        if compile_output.passed:
+            try:
+                self.binary_cache.publish(key, output_path)
+            except OSError:
+                pass
+        return compile_output
+
+    def compile(self, code: str, output_path: str) -> Output:
+        if self.binary_cache is None:
+            return self._compile_source(code, output_path)
+
+        start_time = time.time()
+        key = self._cache_key(code)
+        if not self._fetch_binary(key, output_path):
+            # Workers that miss the same program at once compile it only once
+            with self.binary_cache.single_flight(key):
+                if not self._fetch_binary(key, output_path):
+                    return self._compile_and_publish(key, code, output_path)
+        return Output(
+            passed=True,
+            stdout="",
+            stderr="",
+            time_seconds=time.time() - start_time,
+            timed_out=False,
+        )
+
+    def _compile_source(self, code: str, output_path: str) -> Output:
+        # Write the code next to the output with a fixed name and compile with
+        # relative paths, so identical sources hash identically in compiler caches
+        work_dir = os.path.dirname(os.path.abspath(output_path))
+        source_name = self._source_name(code)
+        with open(os.path.join(work_dir, source_name), "w") as source_file:
+            source_file.write(code)
+
+        # Compile the code
+        try:
+            compile_process = self._build(
+                source_name, os.path.basename(output_path), work_dir
+            )
+        finally:
+            # Clean up the source file
+            os.unlink(os.path.join(work_dir, source_name))
+        metrics.observe(f"{self.language_id}_compile", compile_process.time_seconds)
+
+        if compile_process.timed_out:
+            return Output(
+                passed=False,
+                stdout="",
+                stderr="Compilation timed out",
+                time_seconds=compile_process.time_seconds,
+                timed_out=True,
+            )
+        if compile_process.returncode != 0:
+            return Output(
+                passed=False,
+                stdout="",
+                stderr=compile_process.stderr,
+                time_seconds=compile_process.time_seconds,
+                timed_out=False,
+            )
+        return Output(
+            passed=True,
+            stdout="",
+            stderr="",
+            time_seconds=compile_process.time_seconds,
+            timed_out=False,
+        )
+
+    def warm_up(self) -> None:
+        if shutil.which(self.toolchain) is None:
+            raise RuntimeError(f"{self.toolchain} not found on PATH")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Bypass the binary cache so the compiler actually runs
+            executable_path = os.path.join(temp_dir, self.program_filename)
+            compile_output = self._compile_source(self.warm_up_program, executable_path)
+            if not compile_output.passed:
+                raise RuntimeError(
+                    f"{self.toolchain} failed to compile a trivial program: "
+                    f"{compile_output.stderr}"
+                )
+            exec_output = self.execute(
+                executable_path, StdinStdout(stdin="", stdout="ok")
+            )
+            if not exec_output.passed:
+                raise RuntimeError(
+                    f"Trivial {self.language_id} program failed to run: "
+                    f"{exec_output.stderr}"
+                )
+            if config.PIN_LIBRARIES:
+                for library in shared_libraries(executable_path):
+                    pinned_files.pin(library)
+            startup = [
+                self.execute(executable_path, StdinStdout(stdin="", stdout="ok"))
+                for _ in range(_STARTUP_SAMPLES)
+            ]
+            self.startup_seconds = statistics.median(
+                output.time_seconds for output in startup
+            )
+        metrics.register_collector(f"{self.language_id}_launch", self.launch_info)
+
+    def launch_info(self) -> Dict[str, object]:
+        """How programs are launched, reported in /metrics"""
+        return {"startup_seconds": self.startup_seconds}
+
+    def run_test(
+        self, code_path: str, test: StdinStdout, timeout: Optional[float] = None
+    ) -> RunResult:
+        if timeout is None:
+            timeout = self.default_timeout_seconds
+        command = self.program_command(code_path)
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            command = sandbox.wrap(
+                command,
+                cpu_time_limit_seconds=timeout,
+                visible_dirs=[os.path.dirname(code_path)],
+            )
+
+        # Run the compiled program
+        process = run_process(
+            command, stdin=test.stdin, timeout=timeout, env=self.program_env()
+        )
+        metrics.observe(f"{self.language_id}_spawn", process.spawn_seconds)
+        if process.timed_out:
+            return RunResult(
+                passed=False,
+                stdout="Error: Timed out",
+                stderr="Error: Timed out",
+                time_seconds=process.time_seconds,
+                timed_out=True,
+            )
+        with tracing.span("compare"):
+            passed = process.stdout.strip() == test.stdout.strip()
+        return RunResult(
+            passed=passed,
+            stdout=process.stdout,
+            stderr=process.stderr,
+            time_seconds=process.time_seconds,
+            timed_out=False,
+        )
@@ -1,86 +1,132 @@
+import logging
 import os
-import tempfile
+import shutil
 import subprocess
-import time
-from code_execution.types import StdinStdout, Output
-from code_execution.languages.base import LanguageHandler
+from typing import Dict, List, Optional
+from code_execution import config
+from code_execution.metrics import metrics
+from code_execution.languages.compiled import CompiledLanguageHandler
+
+logger = logging.getLogger(__name__)
+
+# Linker flags of each CODE_EXECUTION_CPP_LINK mode
+LINK_FLAGS = {
+    "dynamic": [],
+    "static-libstdc++": ["-static-libstdc++", "-static-libgcc"],
+    "static": ["-static"],
+}
+
+
+def parse_ccache_stats(output: str) -> Dict[str, float]:
+    """Return hit/miss counters from `ccache --print-stats` output"""
+    raw: Dict[str, int] = {}
+    for line in output.splitlines():
+        key, _, value = line.partition("\t")
+        if value.isdigit():
+            raw[key] = int(value)
+    hits = raw.get("direct_cache_hit", 0) + raw.get("preprocessed_cache_hit", 0)
+    misses = raw.get("cache_miss", 0)
+    total = hits + misses
+    return {
+        "enabled": True,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "cache_size_kibibyte": raw.get("cache_size_kibibyte", 0),
+    }
+
+
+def ccache_stats(ccache_dir: str = config.CCACHE_DIR) -> Dict[str, float]:
+    """Return ccache hit/miss counters for the given cache directory"""
+    ccache = shutil.which("ccache")
+    if ccache is None:
+        return {"enabled": False}
+    process = subprocess.run(
+        [ccache, "--print-stats"],
+        capture_output=True,
+        text=True,
+        timeout=10,
+        env={**os.environ, "CCACHE_DIR": ccache_dir},
+    )
+    return parse_ccache_stats(process.stdout)
+
+
+metrics.register_collector("ccache", ccache_stats)
+
+# Compiled at startup to check g++ and pull the common headers into the page cache
+WARM_UP_PROGRAM = """
+#include <bits/stdc++.h>
+int main() {
+    std::cout << "ok" << std::endl;
+    return 0;
+}
+"""
+
+
+class CppHandler(CompiledLanguageHandler):
+    def __init__(
+        self,
+        use_ccache: bool = config.CCACHE_ENABLED,
+        ccache_dir: str = config.CCACHE_DIR,
+        ccache_max_size: str = config.CCACHE_MAX_SIZE,
+        binary_cache_dir: Optional[str] = (
+            config.BINARY_CACHE_DIR if config.BINARY_CACHE_ENABLED else None
+        ),
+        link: str = config.CPP_LINK,
+    ):
+        super().__init__(binary_cache_dir)
+        if link not in LINK_FLAGS:
+            modes = ", ".join(f"'{mode}'" for mode in LINK_FLAGS)
+            raise ValueError(f"Unknown C++ link mode '{link}'. Link modes: {modes}")
+        self.link = link
+        # Fall back to plain g++ if ccache is not installed
+        self.ccache = shutil.which("ccache") if use_ccache else None
+        self.ccache_dir = ccache_dir
+        self.ccache_max_size = ccache_max_size
+
+    default_timeout_seconds = 120
+    program_filename = "program"
+    source_filename = "program.cpp"
+    toolchain = "g++"
+    warm_up_program = WARM_UP_PROGRAM
 
-class CppHandler(LanguageHandler):
     @property
     def language_id(self) -> str:
         return "cpp"
-    
-    def compile(self, code: str, output_path: str) -> Output:
-        # Create a temporary file for the code
-        with tempfile.NamedTemporaryFile(
-            suffix=".cpp", delete=False, mode="w"
-        ) as temp_file:
-            temp_file_path = temp_file.name
-            temp_file.write(code)
-
-        start_time = time.time()
-        try:
-            # Compile the code
-            compile_process = subprocess.run(
-                ["g++", "-std=c++20", "-o", output_path, temp_file_path],
-                capture_output=True,
-                text=True,
-                timeout=60,  # 60 seconds timeout for compilation
-            )
-            compilation_time = time.time() - start_time  # seconds
-
-            if compile_process.returncode != 0:
-                return Output(
-                    passed=False,
-                    stdout="",
-                    stderr=compile_process.stderr,
-                    time_seconds=compilation_time,
-                    timed_out=False,
-                )
-            return Output(
-                passed=True,
-                stdout="",
-                stderr="",
-                time_seconds=compilation_time,
-                timed_out=False,
-            )
-        except subprocess.TimeoutExpired:
-            return Output(
-                passed=False,
-                stdout="",
-                stderr="Compilation timed out",
-                time_seconds=(time.time() - start_time),
-                timed_out=True,
-            )
-        finally:
-            # Clean up the temporary CPP file
-            os.unlink(temp_file_path)
-        
-    def execute(self, code_path: str, test: StdinStdout) -> Output:
-        start_time = time.time()
+
+    def _compiler_command(self, source: str, output: str) -> List[str]:
+        return ["g++", "-std=c++20", *LINK_FLAGS[self.link], "-o", output, source]
+
+    def warm_up(self) -> None:
         try:
-            # Run the compiled program
-            process = subprocess.run(
-                [code_path],
-                input=test.stdin,
-                capture_output=True,
-                text=True,
-                timeout=120,  # 120 seconds timeout for execution
-            )
-            execution_time = time.time() - start_time  # seconds
-
-            return Output(
-                passed=process.stdout.strip() == test.stdout.strip(),
-                stdout=process.stdout,
-                stderr=process.stderr,
-                time_seconds=execution_time,
-                timed_out=False,
+            super().warm_up()
+        except RuntimeError as e:
+            if self.link == "dynamic":
+                raise
+            # Usually the static libraries (libstdc++.a, libc.a) aren't installed
+            logger.warning(
+                "Linking C++ dynamically, %s linking failed: %s", self.link, e
             )
-        except subprocess.TimeoutExpired:
-            return Output(
-                passed=False,
-                stdout="Error: Timed out",
-                stderr="Error: Timed out",
-                time_seconds=(time.time() - start_time),
-                timed_out=True,
-            )
\ No newline at end of file
+            self.link = "dynamic"
+            super().warm_up()
+
+    def launch_info(self) -> Dict[str, object]:
+        return {**super().launch_info(), "link": self.link}
+
+    def _compile_command(self, source: str, output: str) -> List[str]:
+        command = self._compiler_command(source, output)
+        if self.ccache is not None:
+            command.insert(0, self.ccache)
+        return command
+
+    def _compile_env(self) -> Optional[Dict[str, str]]:
+        if self.ccache is None:
+            return None
+        return {
+            **os.environ,
+            "CCACHE_DIR": self.ccache_dir,
+            "CCACHE_MAXSIZE": self.ccache_max_size,
+            # Sources are compiled from per-request temp dirs with identical
+            # relative names, so don't let the directory affect the hash
+            "CCACHE_NOHASHDIR": "1",
+        }
@@ -0,0 +1,67 @@
+import os
+from typing import Dict, List, Optional
+from code_execution import config
+from code_execution.languages.compiled import CompiledLanguageHandler
+
+# Compiled at startup to check go and fill its build cache with the packages
+# solutions commonly import
+WARM_UP_PROGRAM = """
+package main
+
+import (
+	"bufio"
+	"fmt"
+	"os"
+	"sort"
+	"strconv"
+	"strings"
+)
+
+func main() {
+	writer := bufio.NewWriter(os.Stdout)
+	defer writer.Flush()
+	words := strings.Fields("ok")
+	sort.Strings(words)
+	_, _ = strconv.Atoi("0")
+	fmt.Fprintln(writer, words[0])
+}
+"""
+
+
+class GoHandler(CompiledLanguageHandler):
+    default_timeout_seconds = 120
+    program_filename = "program"
+    source_filename = "program.go"
+    toolchain = "go"
+    warm_up_program = WARM_UP_PROGRAM
+
+    def __init__(
+        self,
+        go_cache_dir: str = config.GO_CACHE_DIR,
+        binary_cache_dir: Optional[str] = (
+            config.BINARY_CACHE_DIR if config.BINARY_CACHE_ENABLED else None
+        ),
+    ):
+        super().__init__(binary_cache_dir)
+        self.go_cache_dir = go_cache_dir
+        os.makedirs(go_cache_dir, exist_ok=True)
+
+    @property
+    def language_id(self) -> str:
+        return "go"
+
+    def _compiler_command(self, source: str, output: str) -> List[str]:
+        # -trimpath keeps the per-request directory out of build cache keys
+        return ["go", "build", "-trimpath", "-o", output, source]
+
+    def _compile_env(self) -> Optional[Dict[str, str]]:
+        return {
+            **os.environ,
+            "GOCACHE": self.go_cache_dir,
+            "GOPATH": os.path.join(os.path.dirname(self.go_cache_dir), "gopath"),
+            # Single-file programs with only standard library imports: no
+            # module resolution, no network, no cgo toolchain needed
+            "GO111MODULE": "off",
+            "GOTOOLCHAIN": "local",
+            "CGO_ENABLED": "0",
+        }
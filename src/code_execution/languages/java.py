@@ -0,0 +1,335 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import select
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from typing import Dict, List, Optional
+from code_execution import config
+from code_execution.metrics import metrics
+from code_execution.process import ProcessResult, run_process, spawn
+from code_execution.languages.compiled import CompiledLanguageHandler
+
+logger = logging.getLogger(__name__)
+
+# Java source of the compile server, compiled on first use
+COMPILE_SERVER_SOURCE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "CompileServer.java"
+)
+
+# Compiled at startup to check the JDK and warm up the compile servers
+WARM_UP_PROGRAM = """
+import java.io.*;
+import java.util.*;
+
+public class Main {
+    public static void main(String[] args) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+        PrintWriter out = new PrintWriter(new BufferedOutputStream(System.out));
+        List<String> words = new ArrayList<>(Arrays.asList("ok"));
+        Collections.sort(words);
+        out.println(words.get(0));
+        out.flush();
+    }
+}
+"""
+
+_PUBLIC_CLASS = re.compile(r"^\s*public\s+(?:final\s+|abstract\s+)*class\s+(\w+)", re.M)
+_TYPE = re.compile(r"\b(?:class|interface|enum|record)\s+(\w+)")
+_MAIN_METHOD = re.compile(r"\bvoid\s+main\s*\(")
+_COMMENT_OR_LITERAL = re.compile(
+    r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'", re.S
+)
+
+# A compile server is replaced after this many compiles, bounding leaks in javac
+_MAX_COMPILES_PER_SERVER = 500
+
+
+def _blank_comments_and_literals(code: str) -> str:
+    # Same offsets and lines, without braces or keywords hiding in text
+    return _COMMENT_OR_LITERAL.sub(
+        lambda match: re.sub(r"[^\n]", " ", match.group()), code
+    )
+
+
+def entry_class_name(code: str) -> Optional[str]:
+    """Return the top-level class declaring main(), or None if there is none"""
+    code = _blank_comments_and_literals(code)
+    main = _MAIN_METHOD.search(code)
+    if main is None:
+        return None
+    entry = None
+    depth, scanned = 0, 0
+    for declaration in _TYPE.finditer(code, 0, main.start()):
+        depth += code.count("{", scanned, declaration.start())
+        depth -= code.count("}", scanned, declaration.start())
+        scanned = declaration.start()
+        # Top-level types don't nest, so the last one before main holds it
+        if depth == 0:
+            entry = declaration.group(1)
+    return entry
+
+
+def main_class_name(code: str) -> str:
+    """Name of the source file's class: the public class, or the one with main()"""
+    public = _PUBLIC_CLASS.search(_blank_comments_and_literals(code))
+    if public is not None:
+        return public.group(1)
+    return entry_class_name(code) or "Main"
+
+
+class CompileServerError(RuntimeError):
+    """Raised when a compile server dies or answers garbage"""
+
+
+class CompileServer:
+    """A JVM running CompileServer.java, compiling one source at a time"""
+
+    def __init__(self, classpath: str):
+        # Not in a new session: the process reaper would take it for a leftover
+        self.process = spawn(
+            [
+                "java",
+                "-Xmx512m",
+                "-XX:+UseSerialGC",
+                "-XX:-UsePerfData",
+                "-cp",
+                classpath,
+                "CompileServer",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=False,
+        )
+        self.compiles = 0
+        metrics.inc("java_compile_server_starts")
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def compile(
+        self, classes_dir: str, source_path: str, log_path: str, timeout: float
+    ) -> Optional[int]:
+        """Return javac's exit status, or None if the compile timed out"""
+        assert self.process.stdin and self.process.stdout
+        self.compiles += 1
+        try:
+            self.process.stdin.write(
+                f"{classes_dir}\t{source_path}\t{log_path}\n".encode()
+            )
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            self.close()
+            raise CompileServerError("Compile server exited")
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            # It may be stuck in the compile; a fresh server will replace it
+            self.close()
+            return None
+        line = self.process.stdout.readline()
+        if not line.strip().isdigit():
+            self.close()
+            raise CompileServerError(f"Compile server answered {line!r}")
+        return int(line)
+
+    def close(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+def build_compile_server(
+    build_dir: str = os.path.join(config.CACHE_ROOT, "java"),
+) -> str:
+    """Compile CompileServer.java (once per source version); return its classpath"""
+    with open(COMPILE_SERVER_SOURCE, "rb") as source_file:
+        digest = hashlib.sha256(source_file.read()).hexdigest()[:16]
+    classpath = os.path.join(build_dir, f"compile-server-{digest}")
+    if not os.path.exists(classpath):
+        os.makedirs(build_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=build_dir)
+        process = subprocess.run(
+            ["javac", "-d", temp_dir, COMPILE_SERVER_SOURCE],
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        if process.returncode != 0:
+            shutil.rmtree(temp_dir)
+            raise RuntimeError(
+                f"Failed to compile the compile server: {process.stderr}"
+            )
+        try:
+            os.rename(temp_dir, classpath)
+        except OSError:
+            # Another worker published it first
+            shutil.rmtree(temp_dir)
+    return classpath
+
+
+class JavaHandler(CompiledLanguageHandler):
+    """Java, compiled by a pool of warm in-process javac servers
+
+    Programs are packaged as an executable jar so the compiled artifact is a
+    single cacheable file. Without a working compile server (or with
+    CODE_EXECUTION_JAVA_COMPILE_SERVERS=0) each compile runs javac.
+    """
+
+    default_timeout_seconds = 120
+    program_filename = "program.jar"
+    source_filename = "Main.java"
+    toolchain = "javac"
+    warm_up_program = WARM_UP_PROGRAM
+
+    def __init__(
+        self,
+        compile_servers: int = config.JAVA_COMPILE_SERVERS,
+        heap_mb: int = config.JAVA_HEAP_MB,
+        binary_cache_dir: Optional[str] = (
+            config.BINARY_CACHE_DIR if config.BINARY_CACHE_ENABLED else None
+        ),
+    ):
+        super().__init__(binary_cache_dir)
+        self.compile_servers = compile_servers
+        self.heap_mb = heap_mb
+        # Set by warm_up once the compile server is built
+        self._classpath: Optional[str] = None
+        # Idle servers; None entries are started when first needed
+        self._servers: "queue.Queue[Optional[CompileServer]]" = queue.Queue()
+        for _ in range(compile_servers):
+            self._servers.put(None)
+
+    @property
+    def language_id(self) -> str:
+        return "java"
+
+    def _compiler_command(self, source: str, output: str) -> List[str]:
+        return ["javac", "-encoding", "UTF-8", "-nowarn", "-d", output, source]
+
+    def _source_name(self, code: str) -> str:
+        # javac requires a public class to live in a file of the same name
+        return f"{main_class_name(code)}.java"
+
+    def program_command(self, code_path: str) -> List[str]:
+        return [
+            "java",
+            f"-Xmx{self.heap_mb}m",
+            "-Xss64m",
+            "-XX:+UseSerialGC",
+            "-XX:-UsePerfData",
+            # Bound the JVM's other reservations to fit the address space limit
+            "-XX:ReservedCodeCacheSize=64m",
+            "-XX:CompressedClassSpaceSize=64m",
+            "-jar",
+            code_path,
+        ]
+
+    def program_env(self) -> Optional[Dict[str, str]]:
+        # glibc reserves 64 MiB per arena per thread, which adds up in a JVM
+        return {**os.environ, "MALLOC_ARENA_MAX": "2"}
+
+    def _javac(
+        self, source_name: str, classes_dir: str, work_dir: str
+    ) -> ProcessResult:
+        if self._classpath is not None and self.compile_servers > 0:
+            start_time = time.time()
+            log_path = os.path.join(work_dir, "javac.log")
+            server = self._servers.get()
+            try:
+                if server is not None and (
+                    not server.alive() or server.compiles >= _MAX_COMPILES_PER_SERVER
+                ):
+                    server.close()
+                    server = None
+                if server is None:
+                    server = CompileServer(self._classpath)
+                status = server.compile(
+                    classes_dir,
+                    os.path.join(work_dir, source_name),
+                    log_path,
+                    self.compile_timeout_seconds,
+                )
+            except (CompileServerError, OSError) as e:
+                logger.warning("Java compile server failed, running javac: %s", e)
+                metrics.inc("java_compile_server_errors")
+                server = None
+            else:
+                with open(log_path, "rb") as log_file:
+                    log = log_file.read().decode("utf-8", errors="replace")
+                os.unlink(log_path)
+                return ProcessResult(
+                    returncode=-9 if status is None else status,
+                    stdout="",
+                    stderr=log,
+                    time_seconds=time.time() - start_time,
+                    timed_out=status is None,
+                )
+            finally:
+                self._servers.put(
+                    server if server is not None and server.alive() else None
+                )
+
+        return run_process(
+            self._compiler_command(source_name, classes_dir),
+            stdin="",
+            timeout=self.compile_timeout_seconds,
+            cwd=work_dir,
+        )
+
+    def _build(
+        self, source_name: str, output_name: str, work_dir: str
+    ) -> ProcessResult:
+        classes_dir = os.path.join(work_dir, "classes")
+        os.mkdir(classes_dir)
+        try:
+            result = self._javac(source_name, classes_dir, work_dir)
+            if result.returncode != 0 or result.timed_out:
+                return result
+            with open(os.path.join(work_dir, source_name)) as source_file:
+                main_class = entry_class_name(source_file.read())
+            if main_class is None:
+                result.returncode = 1
+                result.stderr += (
+                    "error: no top-level class declares "
+                    "public static void main(String[] args)\n"
+                )
+                return result
+            _write_jar(classes_dir, main_class, os.path.join(work_dir, output_name))
+            return result
+        finally:
+            shutil.rmtree(classes_dir, ignore_errors=True)
+
+    def warm_up(self) -> None:
+        if shutil.which("java") is None:
+            raise RuntimeError("java not found on PATH")
+        if self.compile_servers > 0 and shutil.which("javac") is not None:
+            try:
+                self._classpath = build_compile_server()
+            except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+                logger.warning("Compiling Java with javac per request: %s", e)
+        # Checks javac and the runtime through one server...
+        super().warm_up()
+        # ...then start and warm up the others too
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for _ in range(self.compile_servers - 1):
+                self._compile_source(
+                    self.warm_up_program, os.path.join(temp_dir, "warm-up.jar")
+                )
+
+
+def _write_jar(classes_dir: str, main_class: str, jar_path: str) -> None:
+    # Uncompressed: the jar is written once and read on every run
+    with zipfile.ZipFile(jar_path, "w", zipfile.ZIP_STORED) as jar:
+        jar.writestr(
+            "META-INF/MANIFEST.MF",
+            f"Manifest-Version: 1.0\nMain-Class: {main_class}\n\n",
+        )
+        for root, _, files in os.walk(classes_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                jar.write(path, os.path.relpath(path, classes_dir))
@@ -1,13 +1,107 @@
+import logging
+import os
+import shutil
 import subprocess
-import time
-from code_execution.types import StdinStdout, Output
+import tempfile
+import threading
+from typing import Dict, List, Optional
+from code_execution import config, tracing
+from code_execution.function_calls import FunctionSession
+from code_execution.metrics import metrics
+from code_execution.process import run_process
+from code_execution.sandbox import get_sandbox
+from code_execution.snapshot import SnapshotSession
+from code_execution.types import Output, RunResult, StdinStdout
 from code_execution.languages.base import LanguageHandler
 
+logger = logging.getLogger(__name__)
+
+# Script that loads a program and calls its function, for function-call tests
+HARNESS_SOURCE = os.path.join(os.path.dirname(__file__), "python_harness.py")
+# Fork server that snapshots a program at its first stdin read
+SNAPSHOT_SOURCE = os.path.join(os.path.dirname(__file__), "python_snapshot.py")
+
+_PROBE = (
+    "import platform; "
+    "print(platform.python_implementation(), platform.python_version())"
+)
+
+
+def detect_interpreters(candidates: List[str]) -> Dict[str, str]:
+    """Return the candidates that run, mapped to their implementation and version"""
+    found = {}
+    for name in candidates:
+        path = shutil.which(name)
+        if path is None:
+            continue
+        try:
+            # Version shims (pyenv) exist for versions that aren't installed
+            probe = subprocess.run(
+                [path, "-c", _PROBE], capture_output=True, text=True, timeout=30
+            )
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if probe.returncode == 0:
+            found[name] = probe.stdout.strip()
+    return found
+
+
 class PythonHandler(LanguageHandler):
+    default_timeout_seconds = 30  # reduced for testing
+    program_filename = "program.py"
+
+    def __init__(self, interpreter: Optional[str] = None):
+        self.interpreter = interpreter or config.PYTHON_INTERPRETERS[0]
+        # Working interpreters, filled in by warm_up and shared with variants
+        self.interpreters: Dict[str, str] = {}
+        self._variants: Dict[str, "PythonHandler"] = {}
+        self._lock = threading.Lock()
+
     @property
     def language_id(self) -> str:
         return "python"
+
+    def for_interpreter(self, interpreter: str) -> "PythonHandler":
+        if interpreter == self.interpreter:
+            return self
+        if interpreter not in self.interpreters:
+            available = ", ".join(f"'{name}'" for name in self.interpreters)
+            raise ValueError(
+                f"Interpreter '{interpreter}' is not available. "
+                f"Available interpreters: {available}"
+            )
+        with self._lock:
+            if interpreter not in self._variants:
+                variant = PythonHandler(interpreter)
+                variant.interpreters = self.interpreters
+                self._variants[interpreter] = variant
+            return self._variants[interpreter]
     
+    def program_command(self, code_path: str) -> List[str]:
+        return [self.interpreter, code_path]
+
+    def function_session(self, code_path: str, entry_point: str) -> FunctionSession:
+        # The harness runs under the same interpreter, next to the program
+        work_dir = os.path.dirname(code_path)
+        harness_path = os.path.join(work_dir, "harness.py")
+        shutil.copyfile(HARNESS_SOURCE, harness_path)
+        command = [self.interpreter, harness_path, code_path, entry_point]
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            command = sandbox.wrap(command, visible_dirs=[work_dir])
+        return FunctionSession(command)
+
+    def snapshot_session(self, code_path: str, setup_timeout: float) -> SnapshotSession:
+        work_dir = os.path.dirname(code_path)
+        snapshot_path = os.path.join(work_dir, "snapshot.py")
+        shutil.copyfile(SNAPSHOT_SOURCE, snapshot_path)
+        command = [self.interpreter, snapshot_path, code_path]
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            # The fork server sets each test's CPU limit itself
+            command = sandbox.wrap(command, visible_dirs=[work_dir])
+        return SnapshotSession(command, setup_timeout=setup_timeout)
+
     def compile(self, code: str, output_path: str) -> Output:
         # Python doesn't need compilation, write code to file
         with open(output_path, 'w') as f:
@@ -20,33 +114,72 @@ class PythonHandler(LanguageHandler):
             timed_out=False,
         )
         
-    def execute(self, code_path: str, test: StdinStdout) -> Output:
-        # Execute Python script
-        start_time = time.time()
-        try:
-            # Run the Python script
-            process = subprocess.run(
-                ["python3", code_path],
-                input=test.stdin,
-                capture_output=True,
-                text=True,
-                timeout=30,  # 30 seconds timeout for execution (reduced for testing)
-                check=False,
-            )
-            execution_time = time.time() - start_time  # seconds
-
-            return Output(
-                passed=process.stdout.strip() == test.stdout.strip(),
-                stdout=process.stdout,
-                stderr=process.stderr,
-                time_seconds=execution_time,
-                timed_out=False,
+    def warm_up(self) -> None:
+        detected = detect_interpreters(config.PYTHON_INTERPRETERS)
+        if self.interpreter not in detected:
+            raise RuntimeError(f"{self.interpreter} not found on PATH")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            code_path = os.path.join(temp_dir, "program.py")
+            self.compile("print(input())", code_path)
+            for name in list(detected):
+                exec_output = self._run(
+                    name, code_path, StdinStdout(stdin="ok", stdout="ok")
+                ).to_output()
+                if exec_output.passed:
+                    continue
+                if name == self.interpreter:
+                    raise RuntimeError(
+                        f"Trivial Python program failed to run: {exec_output.stderr}"
+                    )
+                logger.warning(
+                    "Python interpreter %s is unusable: %s", name, exec_output.stderr
+                )
+                del detected[name]
+        self.interpreters.clear()
+        self.interpreters.update(detected)
+        metrics.register_collector(
+            "python_interpreters", lambda: dict(self.interpreters)
+        )
+
+    def run_test(
+        self, code_path: str, test: StdinStdout, timeout: Optional[float] = None
+    ) -> RunResult:
+        return self._run(self.interpreter, code_path, test, timeout)
+
+    def _run(
+        self,
+        interpreter: str,
+        code_path: str,
+        test: StdinStdout,
+        timeout: Optional[float] = None,
+    ) -> RunResult:
+        if timeout is None:
+            timeout = self.default_timeout_seconds
+        command = [interpreter, code_path]
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            command = sandbox.wrap(
+                command,
+                cpu_time_limit_seconds=timeout,
+                visible_dirs=[os.path.dirname(code_path)],
             )
-        except subprocess.TimeoutExpired:
-            return Output(
+
+        # Execute Python script
+        process = run_process(command, stdin=test.stdin, timeout=timeout)
+        if process.timed_out:
+            return RunResult(
                 passed=False,
                 stdout="Error: Timed out",
                 stderr="Error: Timed out",
-                time_seconds=(time.time() - start_time),
+                time_seconds=process.time_seconds,
                 timed_out=True,
             )
+        with tracing.span("compare"):
+            passed = process.stdout.strip() == test.stdout.strip()
+        return RunResult(
+            passed=passed,
+            stdout=process.stdout,
+            stderr=process.stderr,
+            time_seconds=process.time_seconds,
+            timed_out=False,
+        )
@@ -0,0 +1,138 @@
+"""Calls one function of a Python program for function-call tests
+
+Started as `python harness.py program.py entry_point` by
+code_execution.function_calls.FunctionSession and never imported by the
+server, so it must run on every interpreter the server supports. It answers
+{"ready": true} or {"error": ...} once the program is loaded, then reads one
+JSON call ({"args": [...], "kwargs": {...}, "cpu": ...}) per line from stdin
+and answers each with one JSON line: {"value": ...} or {"error": ...}, plus
+the call's "time" and whatever it printed as "output".
+
+entry_point may be dotted; classes along the path are instantiated without
+arguments for every call, so "Solution.twoSum" calls Solution().twoSum on a
+new Solution each time.
+"""
+
+import io
+import json
+import os
+import sys
+import time
+import traceback
+
+
+def to_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        items = [to_json(item) for item in value]
+        try:
+            return sorted(items)
+        except TypeError:
+            return items
+    if isinstance(value, dict):
+        return {
+            key if isinstance(key, str) else str(key): to_json(item)
+            for key, item in value.items()
+        }
+    return repr(value)
+
+
+def format_error():
+    error_type, error, tb = sys.exc_info()
+    # Leave out the harness's own frames
+    while tb is not None and tb.tb_frame.f_code.co_filename == __file__:
+        tb = tb.tb_next
+    return "".join(traceback.format_exception(error_type, error, tb))
+
+
+def resolve(namespace, entry_point):
+    """Return a function that calls the entry point
+
+    Classes along the path are instantiated anew for every call, so state
+    one test leaves on an instance can't change the result of the next.
+    """
+    names = entry_point.split(".")
+    root = namespace[names[0]]
+    # Fail at load time if the path doesn't exist
+    target = root
+    for name in names[1:]:
+        target = getattr(target, name)
+
+    def call(*args, **kwargs):
+        target = root
+        for name in names[1:]:
+            if isinstance(target, type):
+                target = target()
+            target = getattr(target, name)
+        return target(*args, **kwargs)
+
+    return call
+
+
+def pin(cpu):
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except (AttributeError, OSError):
+        pass
+
+
+def main():
+    path, entry_point = sys.argv[1], sys.argv[2]
+    # Keep the protocol on private descriptors, so programs that print or
+    # read stdin at the file descriptor level can't corrupt it
+    calls = os.fdopen(os.dup(0), "r")
+    protocol = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdin = io.StringIO()
+
+    def send(message):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    captured = io.StringIO()
+    sys.stdout = sys.stderr = captured
+    try:
+        with open(path) as source_file:
+            source = source_file.read()
+        namespace: dict = {"__name__": "solution", "__file__": path}
+        exec(compile(source, path, "exec"), namespace)
+        function = resolve(namespace, entry_point)
+    except BaseException:
+        send({"error": captured.getvalue() + format_error()})
+        return
+    send({"ready": True})
+
+    for line in calls:
+        call = json.loads(line)
+        if call.get("cpu") is not None:
+            # Run the call on the CPU the server reserved for it
+            pin(call["cpu"])
+        captured = io.StringIO()
+        sys.stdout = sys.stderr = captured
+        start = time.perf_counter()
+        try:
+            value = function(*call["args"], **call["kwargs"])
+            message: dict = {"value": to_json(value)}
+        except BaseException:
+            message = {"error": format_error()}
+        message["time"] = time.perf_counter() - start
+        message["output"] = captured.getvalue()
+        try:
+            send(message)
+        except (TypeError, ValueError) as e:
+            send(
+                {
+                    "error": f"Return value can't be sent back: {e}",
+                    "time": message["time"],
+                    "output": message["output"],
+                }
+            )
+
+
+if __name__ == "__main__":
+    main()
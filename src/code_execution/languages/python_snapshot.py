@@ -0,0 +1,224 @@
+"""Fork server that snapshots a Python program at its first stdin read
+
+Started as `python snapshot.py program.py` with a Unix socket as stdin by
+code_execution.snapshot.SnapshotSession and never imported by the server, so
+it must run on every interpreter the server supports. The program runs until
+it first touches sys.stdin, which turns this process into a fork server: for
+each test the server sends {"timeout": ..., "cpu": ...} with the test's
+stdin, stdout and stderr pipes attached, a forked child (pinned to "cpu" if
+set) continues the program from that read with the pipes as its standard
+streams, and the server gets back {"returncode": ..., "timed_out": ...,
+"time": ...}. What the program printed
+before the first read is printed again by every child.
+
+A program that exits (or fails, e.g. by reading file descriptor 0 directly)
+before touching sys.stdin never reports ready, and the server falls back to
+running it normally.
+"""
+
+import array
+import io
+import json
+import math
+import os
+import resource
+import signal
+import socket
+import sys
+import time
+
+control = None
+restored = False
+# The replaced standard streams, kept alive: input() holds borrowed
+# references to sys.stdin and sys.stdout while the first read swaps them
+streams = []
+
+
+def send(message):
+    assert control is not None
+    control.send(json.dumps(message).encode())
+
+
+def receive():
+    assert control is not None
+    fds = array.array("i")
+    data, ancdata, _, _ = control.recvmsg(4096, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, kind, payload in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[: len(payload) - len(payload) % fds.itemsize])
+    return data, list(fds)
+
+
+def wait(pid, timeout):
+    """Return the child's exit status, or None if it outlived the timeout"""
+    deadline = time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            return status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.01)
+
+
+def kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def pin(cpu):
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except (AttributeError, OSError):
+        pass
+
+
+def serve():
+    """Fork a child per test; returns only in a child"""
+    send({"ready": True})
+    while True:
+        data, fds = receive()
+        if not data:
+            os._exit(0)
+        message = json.loads(data)
+        timeout = message["timeout"]
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.setpgid(0, 0)
+            assert control is not None
+            control.close()
+            # Backstop behind the wall-clock timeout, like the sandbox's
+            limit = math.ceil(timeout) + 1
+            try:
+                resource.setrlimit(resource.RLIMIT_CPU, (limit, limit))
+            except (OSError, ValueError):
+                pass
+            if message.get("cpu") is not None:
+                pin(message["cpu"])
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+                os.close(fd)
+            return
+        for fd in fds:
+            os.close(fd)
+        status = wait(pid, timeout)
+        elapsed = time.perf_counter() - start
+        kill_group(pid)
+        if status is None:
+            os.waitpid(pid, 0)
+            send({"returncode": None, "timed_out": True, "time": elapsed})
+            continue
+        if os.WIFEXITED(status):
+            returncode = os.WEXITSTATUS(status)
+        else:
+            returncode = -os.WTERMSIG(status)
+        send({"returncode": returncode, "timed_out": False, "time": elapsed})
+
+
+def restore():
+    """Snapshot on the first call; in the child, point the streams at the test"""
+    global restored
+    if not restored:
+        serve()
+        restored = True
+        sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+        for fd, stream in ((1, sys.stdout), (2, sys.stderr)):
+            if isinstance(stream, Output):
+                stream.restore(fd)
+    return sys.stdin
+
+
+class FirstRead(io.TextIOBase):
+    """sys.stdin until the snapshot; any use of it takes the snapshot"""
+
+    def readable(self):
+        return True
+
+    def read(self, *args):
+        return restore().read(*args)
+
+    def readline(self, *args):
+        return restore().readline(*args)
+
+    def readlines(self, *args):
+        return restore().readlines(*args)
+
+    def __iter__(self):
+        return iter(restore())
+
+    def __next__(self):
+        return next(restore())
+
+    def fileno(self):
+        return restore().fileno()
+
+    @property
+    def buffer(self):
+        return restore().buffer
+
+
+class Output(io.TextIOBase):
+    """sys.stdout/stderr that buffers until the snapshot, then writes through"""
+
+    def __init__(self):
+        self.target = io.StringIO()
+
+    def restore(self, fd):
+        buffered = self.target
+        assert isinstance(buffered, io.StringIO)
+        text = buffered.getvalue()
+        self.target = open(fd, "w", encoding="utf-8", closefd=False)
+        self.target.write(text)
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return self.target.write(text)
+
+    def writelines(self, lines):
+        self.target.writelines(lines)
+
+    def flush(self):
+        self.target.flush()
+
+    def fileno(self):
+        return self.target.fileno()
+
+    @property
+    def buffer(self):
+        return self.target.buffer
+
+
+def main():
+    global control
+    path = sys.argv[1]
+    control = socket.socket(fileno=os.dup(0))
+    # Reads of file descriptor 0 that bypass sys.stdin fail instead of
+    # reading the control socket
+    directory = os.open("/", os.O_RDONLY)
+    os.dup2(directory, 0)
+    os.close(directory)
+    sys.stdin = FirstRead()
+    sys.stdout = Output()
+    sys.stderr = Output()
+    streams.extend([sys.stdin, sys.stdout, sys.stderr])
+    sys.argv = [path]
+    with open(path) as source_file:
+        code = compile(source_file.read(), path, "exec")
+    try:
+        exec(code, {"__name__": "__main__", "__file__": path})
+    finally:
+        if not restored:
+            # Finished without reading stdin: nothing to snapshot
+            os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from typing import List
+from code_execution.languages.compiled import CompiledLanguageHandler
+
+# Compiled at startup to check rustc and load it and std into the page cache
+WARM_UP_PROGRAM = """
+use std::io::{self, BufRead, Write};
+
+fn main() {
+    let stdin = io::stdin();
+    let _lines: Vec<String> = stdin.lock().lines().map(|l| l.unwrap()).collect();
+    let stdout = io::stdout();
+    let mut out = io::BufWriter::new(stdout.lock());
+    writeln!(out, "ok").unwrap();
+}
+"""
+
+
+class RustHandler(CompiledLanguageHandler):
+    default_timeout_seconds = 120
+    program_filename = "program"
+    source_filename = "program.rs"
+    toolchain = "rustc"
+    warm_up_program = WARM_UP_PROGRAM
+
+    @property
+    def language_id(self) -> str:
+        return "rust"
+
+    def _compiler_command(self, source: str, output: str) -> List[str]:
+        return ["rustc", "--edition", "2021", "-O", "-o", output, source]
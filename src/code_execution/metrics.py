@@ -0,0 +1,51 @@
+import threading
+from typing import Any, Callable, Dict
+
+
+class Metrics:
+    """Process-local counters and timing summaries, exposed at /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one timing sample"""
+        with self._lock:
+            summary = self._timings.setdefault(
+                name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            summary["count"] += 1
+            summary["total_seconds"] += seconds
+            summary["max_seconds"] = max(summary["max_seconds"], seconds)
+
+    def register_collector(
+        self, name: str, collector: Callable[[], Dict[str, Any]]
+    ) -> None:
+        """Register a callable whose result is included in every snapshot"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of all metrics"""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: dict(summary) for name, summary in self._timings.items()}
+            collectors = dict(self._collectors)
+        result: Dict[str, Any] = {"counters": counters, "timings": timings}
+        for name, collector in collectors.items():
+            try:
+                result[name] = collector()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+
+metrics = Metrics()
@@ -0,0 +1,123 @@
+"""Keeping the files test runs start from in the page cache
+
+Every test execs the compiled program, and the dynamic linker maps the shared
+libraries it needs. prefetch() asks the kernel to read a file ahead of its
+first run; pinned_files maps and locks files so their pages stay resident for
+the server's lifetime, however much test output churns through the cache.
+"""
+
+import ctypes
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Dict, List, Union
+from code_execution.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_PROT_READ = 1
+_MAP_SHARED = 1
+_MAP_FAILED = ctypes.c_void_p(-1).value
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [
+    ctypes.c_void_p,
+    ctypes.c_size_t,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_long,
+]
+_libc.mlock.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+
+# "libstdc++.so.6 => /lib/x86_64-linux-gnu/libstdc++.so.6 (0x...)" or
+# "/lib64/ld-linux-x86-64.so.2 (0x...)"
+_LDD_PATH = re.compile(r"(?:=>\s+)?(/\S+)\s+\(0x[0-9a-f]+\)")
+
+
+def prefetch(path: str) -> None:
+    """Start reading a file into the page cache without waiting for it"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except (OSError, AttributeError):
+        pass
+    finally:
+        os.close(fd)
+
+
+def shared_libraries(executable: str) -> List[str]:
+    """Paths of the shared libraries an executable loads; empty if static"""
+    ldd = shutil.which("ldd")
+    if ldd is None:
+        return []
+    try:
+        process = subprocess.run(
+            [ldd, executable], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return []
+    if process.returncode != 0:
+        return []
+    return _LDD_PATH.findall(process.stdout)
+
+
+class PinnedFiles:
+    """Files mapped and locked into memory for the life of the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+
+    def pin(self, path: str) -> bool:
+        """Lock a file's pages in memory; return whether it is pinned"""
+        path = os.path.realpath(path)
+        with self._lock:
+            if path in self._sizes:
+                return True
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError as e:
+                logger.warning("Can't pin %s: %s", path, e)
+                return False
+            try:
+                size = os.fstat(fd).st_size
+                if size == 0:
+                    return False
+                address = _libc.mmap(None, size, _PROT_READ, _MAP_SHARED, fd, 0)
+            finally:
+                os.close(fd)
+            if address is None or address == _MAP_FAILED:
+                logger.warning(
+                    "Can't map %s: %s", path, os.strerror(ctypes.get_errno())
+                )
+                return False
+            if _libc.mlock(address, size) != 0:
+                # Usually RLIMIT_MEMLOCK; the mapping alone doesn't help
+                logger.warning(
+                    "Can't lock %s in memory: %s", path, os.strerror(ctypes.get_errno())
+                )
+                _libc.munmap(address, size)
+                return False
+            # The mapping is never unmapped, so the pages stay locked
+            self._sizes[path] = size
+            return True
+
+    def stats(self) -> Dict[str, Union[int, List[str]]]:
+        with self._lock:
+            return {
+                "files": sorted(self._sizes),
+                "bytes": sum(self._sizes.values()),
+            }
+
+
+pinned_files = PinnedFiles()
+metrics.register_collector("pinned_files", pinned_files.stats)
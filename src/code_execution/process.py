@@ -0,0 +1,572 @@
+import ctypes
+import logging
+import math
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from code_execution import config, tracing
+from code_execution.cpu_scheduler import current_cpu
+from code_execution.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_PR_SET_CHILD_SUBREAPER = 36
+# How long to wait for pipes to close after killing a timed out program
+_DRAIN_TIMEOUT_SECONDS = 1.0
+_STDIN_CHUNK = 64 * 1024
+_READ_CHUNK = 64 * 1024
+
+# Process groups started on behalf of the current request, if it tracks them
+_request_groups: ContextVar[Optional[Set[int]]] = ContextVar(
+    "request_groups", default=None
+)
+
+
+class ShuttingDownError(Exception):
+    """The server is shutting down and can't finish the request"""
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    time_seconds: float
+    timed_out: bool
+    # User plus system CPU time; only measured by run_interactive
+    cpu_seconds: float = 0.0
+    # Time to fork and exec the program; only measured by run_process
+    spawn_seconds: float = 0.0
+
+
+def kill_process_group(pgid: int) -> bool:
+    """SIGKILL every process in the group; return whether any were alive"""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The pgid was reused by a process we don't own
+        return False
+
+
+class ProcessReaper:
+    """Tracks process groups of running programs and cleans up stragglers
+
+    Every program runs as the leader of its own process group, so killing the
+    group on timeout takes its children with it. Programs that escape their
+    group (setsid, double fork) are reparented to this process, which is made
+    a child subreaper; a background thread kills and reaps those.
+    """
+
+    def __init__(self, interval_seconds: float = config.REAPER_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._active: Set[int] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Start times of the stragglers found by the last scan, by pid
+        self._suspects: Dict[int, str] = {}
+        # Set by close(); spawn() raises ShuttingDownError from then on
+        self.closed = False
+        # Process groups close() killed while they were running
+        self._killed: Set[int] = set()
+
+    def track(self, pgid: int) -> None:
+        with self._lock:
+            self._active.add(pgid)
+            groups = _request_groups.get()
+            if groups is not None:
+                groups.add(pgid)
+
+    @contextmanager
+    def track_request(self) -> Iterator[Set[int]]:
+        """Collect the process groups the enclosed block starts
+
+        Work submitted with tracing.submit() runs in a copy of the context, so
+        programs started on other threads are collected too.
+        """
+        groups: Set[int] = set()
+        token = _request_groups.set(groups)
+        try:
+            yield groups
+        finally:
+            _request_groups.reset(token)
+
+    def killed_any(self, groups: Set[int]) -> bool:
+        """Whether close() killed any of the groups while they were running"""
+        with self._lock:
+            return not self._killed.isdisjoint(groups)
+
+    def release(self, pgid: int) -> None:
+        """Stop tracking a finished program and kill anything left in its group"""
+        with self._lock:
+            self._active.discard(pgid)
+        kill_process_group(pgid)
+
+    def active_groups(self) -> List[int]:
+        with self._lock:
+            return list(self._active)
+
+    def start(self) -> None:
+        """Become a child subreaper and start the background reaper thread"""
+        if self._thread is not None:
+            return
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.prctl(_PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) != 0:
+                raise OSError(ctypes.get_errno(), "prctl(PR_SET_CHILD_SUBREAPER)")
+        except (OSError, AttributeError) as e:
+            logger.warning("Escaped processes will not be reaped: %s", e)
+        self._thread = threading.Thread(
+            target=self._run, name="process-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> int:
+        """Kill every running program and refuse to start new ones
+
+        Used at shutdown; returns how many process groups were killed.
+        """
+        self.closed = True
+        with self._lock:
+            active = set(self._active)
+        killed = {pgid for pgid in active if kill_process_group(pgid)}
+        with self._lock:
+            self._killed.update(killed)
+        stragglers = {pgid for pgid, _ in self._stragglers().values()} - active
+        return len(killed) + sum(kill_process_group(pgid) for pgid in stragglers)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Process reaper failed")
+
+    def _stragglers(self) -> Dict[int, Tuple[int, str]]:
+        # Children of ours that are not in our session were started by a
+        # program (we only spawn programs with start_new_session) and are not
+        # part of a program that is still running
+        my_pid = os.getpid()
+        my_sid = os.getsid(0)
+        with self._lock:
+            active = set(self._active)
+        stragglers = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as stat_file:
+                    stat = stat_file.read()
+            except OSError:
+                continue
+            # Fields after the parenthesized command: state ppid pgrp session
+            # ..., with the start time 20th
+            fields = stat[stat.rindex(")") + 2 :].split()
+            ppid, pgid, sid = int(fields[1]), int(fields[2]), int(fields[3])
+            if ppid == my_pid and sid != my_sid and pgid not in active:
+                stragglers[int(entry)] = (pgid, fields[19])
+        return stragglers
+
+    def reap(self) -> int:
+        """Kill and reap stragglers once; return how many were found"""
+        found = self._stragglers()
+        # Only kill what the previous scan found too: a program that was just
+        # spawned looks like a straggler until its group is tracked
+        stragglers = {
+            pid: pgid
+            for pid, (pgid, start) in found.items()
+            if self._suspects.get(pid) == start
+        }
+        self._suspects = {
+            pid: start for pid, (_, start) in found.items() if pid not in stragglers
+        }
+        for pid, pgid in stragglers.items():
+            kill_process_group(pgid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        if stragglers:
+            metrics.inc("reaped_processes", len(stragglers))
+        return len(stragglers)
+
+
+reaper = ProcessReaper()
+
+
+def spawn(
+    command: List[str],
+    stdin: Union[int, IO[Any], None],
+    stdout: Union[int, IO[Any], None],
+    stderr: Union[int, IO[Any], None],
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    start_new_session: bool = True,
+) -> subprocess.Popen:
+    """Start a program; every process the server runs for a request starts here
+
+    Popen starts children with vfork as long as it gets no preexec_fn and no
+    user or group changes, so the cost of starting one doesn't grow with the
+    server's memory, whereas fork copies the page tables of the whole worker
+    (benchmarks/bench_spawn.py). Setup the child needs beyond that belongs in
+    the sandbox launcher, not in a preexec_fn here. Inside a CPU slot the
+    program is pinned to the slot's CPU.
+    """
+    if reaper.closed:
+        raise ShuttingDownError("Not starting programs: the server is shutting down")
+    cpu = current_cpu()
+    previous: Optional[Set[int]] = None
+    if cpu is not None:
+        # The child inherits the affinity of the thread that starts it, so it
+        # is pinned from its first instruction
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {cpu})
+    try:
+        return subprocess.Popen(
+            command,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            cwd=cwd,
+            env=env,
+            start_new_session=start_new_session,
+        )
+    finally:
+        if previous is not None:
+            os.sched_setaffinity(0, previous)
+
+
+def decode_output(data: bytes) -> str:
+    """Match subprocess's text mode, but never fail on invalid UTF-8 output"""
+    text = data.decode("utf-8", errors="replace")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _pidfd_open(pid: int) -> Optional[int]:
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+
+def _communicate(
+    process: subprocess.Popen, stdin: bytes, timeout: float
+) -> Tuple[bytes, bytes, bool]:
+    """Feed stdin and collect output until the program exits or times out
+
+    Unlike Popen.communicate, this stops as soon as the group leader exits
+    (watched through a pidfd) instead of waiting for every descendant to close
+    the output pipes; leftover descendants are killed at that point.
+    """
+    assert process.stdin and process.stdout and process.stderr
+    stdout_fd, stderr_fd = process.stdout.fileno(), process.stderr.fileno()
+    chunks: Dict[int, List[bytes]] = {stdout_fd: [], stderr_fd: []}
+    open_outputs = 2
+    stdin_view = memoryview(stdin)
+    stdin_offset = 0
+    start = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    exited = False
+    pidfd = _pidfd_open(process.pid)
+
+    with selectors.DefaultSelector() as selector:
+        if stdin:
+            # A blocking write could wait forever on a program that stopped
+            # reading stdin because its stdout is full, past the timeout
+            os.set_blocking(process.stdin.fileno(), False)
+            selector.register(process.stdin, selectors.EVENT_WRITE)
+        else:
+            process.stdin.close()
+        selector.register(stdout_fd, selectors.EVENT_READ)
+        selector.register(stderr_fd, selectors.EVENT_READ)
+        if pidfd is not None:
+            selector.register(pidfd, selectors.EVENT_READ)
+
+        while open_outputs or not exited:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if exited:
+                    # Descendants that escaped the group hold the pipes open
+                    break
+                timed_out = True
+                kill_process_group(process.pid)
+                deadline = time.monotonic() + _DRAIN_TIMEOUT_SECONDS
+                continue
+
+            # Without a pidfd, poll for the leader's exit
+            select_timeout = remaining if pidfd is not None else min(remaining, 0.05)
+            leader_done = False
+            for key, _ in selector.select(select_timeout):
+                if key.fileobj is process.stdin:
+                    chunk = stdin_view[stdin_offset : stdin_offset + _STDIN_CHUNK]
+                    try:
+                        stdin_offset += os.write(key.fd, chunk)
+                    except BlockingIOError:
+                        pass
+                    except BrokenPipeError:
+                        stdin_offset = len(stdin)
+                    if stdin_offset >= len(stdin):
+                        selector.unregister(process.stdin)
+                        process.stdin.close()
+                        tracing.record("stdin_write", start, time.perf_counter())
+                elif pidfd is not None and key.fd == pidfd:
+                    selector.unregister(pidfd)
+                    leader_done = True
+                else:
+                    data = os.read(key.fd, _READ_CHUNK)
+                    if data:
+                        chunks[key.fd].append(data)
+                    else:
+                        selector.unregister(key.fd)
+                        open_outputs -= 1
+            if pidfd is None and not exited and process.poll() is not None:
+                leader_done = True
+
+            if leader_done and not exited:
+                exited = True
+                process.wait()
+                tracing.record("run", start, time.perf_counter())
+                # Anything still in the group outlived the program; kill it so
+                # the pipes close and the remaining output can be drained
+                if kill_process_group(process.pid) and not timed_out:
+                    metrics.inc("leaked_process_groups")
+                if not process.stdin.closed:
+                    selector.unregister(process.stdin)
+                    process.stdin.close()
+                deadline = time.monotonic() + _DRAIN_TIMEOUT_SECONDS
+
+    if pidfd is not None:
+        os.close(pidfd)
+    process.stdout.close()
+    process.stderr.close()
+    process.wait()
+    return b"".join(chunks[stdout_fd]), b"".join(chunks[stderr_fd]), timed_out
+
+
+def run_process(
+    command: List[str],
+    stdin: str,
+    timeout: float,
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> ProcessResult:
+    """Run a command in its own process group, killing the whole group on timeout"""
+    start_time = time.time()
+    with tracing.span("spawn"):
+        process = spawn(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+        )
+    spawn_seconds = time.time() - start_time
+    reaper.track(process.pid)
+    try:
+        stdout, stderr, timed_out = _communicate(process, stdin.encode(), timeout)
+    except BaseException:
+        kill_process_group(process.pid)
+        process.wait()
+        raise
+    finally:
+        reaper.release(process.pid)
+    return ProcessResult(
+        returncode=process.returncode,
+        stdout=decode_output(stdout),
+        stderr=decode_output(stderr),
+        time_seconds=time.time() - start_time,
+        timed_out=timed_out,
+        spawn_seconds=spawn_seconds,
+    )
+
+
+@dataclass
+class InteractiveSide:
+    """Command and limits of one of the two processes of run_interactive"""
+
+    command: List[str]
+    timeout: float
+    cpu_time_limit_seconds: float
+    env: Optional[Dict[str, str]] = None
+
+
+class _RunningSide:
+    def __init__(self, side: InteractiveSide, process: subprocess.Popen):
+        self.side = side
+        self.process = process
+        self.start = time.perf_counter()
+        self.deadline = time.monotonic() + side.timeout
+        self.pidfd = _pidfd_open(process.pid)
+        self.stderr: List[bytes] = []
+        self.stderr_open = True
+        self.exited = False
+        self.timed_out = False
+        self.time_seconds = 0.0
+        self.cpu_seconds = 0.0
+        try:
+            # Backstop for unsandboxed programs; the sandbox sets its own
+            limit = math.ceil(side.cpu_time_limit_seconds) + 1
+            resource.prlimit(process.pid, resource.RLIMIT_CPU, (limit, limit))
+        except (OSError, ValueError):
+            pass
+
+    def reap(self, block: bool) -> bool:
+        """Collect the exit status and rusage if the leader exited"""
+        pid, status, usage = os.wait4(self.process.pid, 0 if block else os.WNOHANG)
+        if pid == 0:
+            return False
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        self.exited = True
+        self.time_seconds = time.perf_counter() - self.start
+        self.cpu_seconds = usage.ru_utime + usage.ru_stime
+        if self.cpu_seconds > self.side.cpu_time_limit_seconds:
+            self.timed_out = True
+        # Leftovers in the group would hold the pipes open
+        kill_process_group(self.process.pid)
+        self.deadline = time.monotonic() + _DRAIN_TIMEOUT_SECONDS
+        return True
+
+    def result(self) -> ProcessResult:
+        return ProcessResult(
+            returncode=self.process.returncode,
+            stdout="",
+            stderr=decode_output(b"".join(self.stderr)),
+            time_seconds=self.time_seconds,
+            timed_out=self.timed_out,
+            cpu_seconds=self.cpu_seconds,
+        )
+
+
+def run_interactive(
+    program: InteractiveSide, interactor: InteractiveSide, cwd: Optional[str] = None
+) -> Tuple[ProcessResult, ProcessResult]:
+    """Run a program and an interactor, each one's stdout piped to the other's stdin
+
+    The pipes connect the two processes directly, so their messages never
+    pass through this process; only their stderr is collected. Each side
+    has its own wall-clock timeout and CPU time limit (checked against its
+    rusage at exit, with RLIMIT_CPU as a backstop) and runs in its own
+    process group, killed with everything in it when its leader exits.
+    """
+    to_program_read, to_program_write = os.pipe()
+    to_interactor_read, to_interactor_write = os.pipe()
+    sides: List[_RunningSide] = []
+    try:
+        with tracing.span("spawn"):
+            for side, stdin, stdout in (
+                (program, to_program_read, to_interactor_write),
+                (interactor, to_interactor_read, to_program_write),
+            ):
+                process = spawn(
+                    side.command,
+                    stdin=stdin,
+                    stdout=stdout,
+                    stderr=subprocess.PIPE,
+                    cwd=cwd,
+                    env=side.env,
+                )
+                reaper.track(process.pid)
+                sides.append(_RunningSide(side, process))
+    except BaseException:
+        for running in sides:
+            kill_process_group(running.process.pid)
+            running.process.wait()
+            reaper.release(running.process.pid)
+        raise
+    finally:
+        for fd in (
+            to_program_read,
+            to_program_write,
+            to_interactor_read,
+            to_interactor_write,
+        ):
+            os.close(fd)
+
+    try:
+        _wait_interactive(sides)
+    except BaseException:
+        for running in sides:
+            kill_process_group(running.process.pid)
+            if not running.exited:
+                running.process.wait()
+        raise
+    finally:
+        for running in sides:
+            assert running.process.stderr is not None
+            running.process.stderr.close()
+            if running.pidfd is not None:
+                os.close(running.pidfd)
+            reaper.release(running.process.pid)
+    tracing.record("run", sides[0].start, time.perf_counter())
+    return sides[0].result(), sides[1].result()
+
+
+def _wait_interactive(sides: List[_RunningSide]) -> None:
+    with selectors.DefaultSelector() as selector:
+        for running in sides:
+            assert running.process.stderr is not None
+            selector.register(
+                running.process.stderr.fileno(), selectors.EVENT_READ, running
+            )
+            if running.pidfd is not None:
+                selector.register(running.pidfd, selectors.EVENT_READ, running)
+
+        while True:
+            now = time.monotonic()
+            for running in sides:
+                if now < running.deadline:
+                    continue
+                if not running.exited:
+                    running.timed_out = True
+                    kill_process_group(running.process.pid)
+                    if running.pidfd is not None:
+                        selector.unregister(running.pidfd)
+                    running.reap(block=True)
+                elif running.stderr_open:
+                    # Descendants that escaped the group hold stderr open
+                    assert running.process.stderr is not None
+                    selector.unregister(running.process.stderr.fileno())
+                    running.stderr_open = False
+            active = [r for r in sides if not r.exited or r.stderr_open]
+            if not active:
+                return
+
+            remaining = min(running.deadline for running in active) - now
+            # Without a pidfd, poll for the leader's exit
+            if any(r.pidfd is None and not r.exited for r in sides):
+                remaining = min(remaining, 0.05)
+            for key, _ in selector.select(max(remaining, 0)):
+                running = key.data
+                if key.fd == running.pidfd:
+                    selector.unregister(key.fd)
+                    running.reap(block=True)
+                    continue
+                data = os.read(key.fd, _READ_CHUNK)
+                if data:
+                    running.stderr.append(data)
+                else:
+                    selector.unregister(key.fd)
+                    running.stderr_open = False
+            for running in sides:
+                if running.pidfd is None and not running.exited:
+                    running.reap(block=False)
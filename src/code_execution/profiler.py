@@ -0,0 +1,110 @@
+"""Sampling profiler for the server's own Python code
+
+A background thread snapshots every thread's stack with sys._current_frames()
+at a fixed interval and counts identical stacks. The result is in the
+collapsed-stack format read by flamegraph.pl, speedscope and inferno: one line
+per distinct stack, frames root first separated by ';', then the sample count.
+
+Sampling holds the GIL for roughly a few microseconds per thread, so at the
+default 100 Hz the overhead stays around a percent even with many threads.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+# Innermost frames of threads that are blocked rather than running Python code
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("base_events.py", "_run_once"),
+}
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """Samples all threads' Python stacks into collapsed-stack counts"""
+
+    def __init__(self, interval_seconds: float = 0.01, include_idle: bool = False):
+        self.interval_seconds = interval_seconds
+        self.include_idle = include_idle
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+
+    def sample(self, exclude_thread: Optional[int] = None) -> None:
+        """Take one snapshot of every thread's stack"""
+        names: Dict[int, str] = {
+            t.ident: t.name for t in threading.enumerate() if t.ident is not None
+        }
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude_thread:
+                continue
+            if not self.include_idle and _is_idle(frame):
+                continue
+            stack: List[str] = []
+            current: Optional[FrameType] = frame
+            while current is not None:
+                stack.append(_frame_label(current))
+                current = current.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.samples[";".join(reversed(stack))] += 1
+        self.sample_count += 1
+
+    def run(self, seconds: float) -> None:
+        """Sample from the calling thread until the duration has passed"""
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            self.sample(exclude_thread=me)
+            next_sample += self.interval_seconds
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind, e.g. waiting for the GIL; don't burst to catch up
+                next_sample = time.monotonic()
+
+    def collapsed(self) -> str:
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+_lock = threading.Lock()
+
+
+def profile(
+    seconds: float, interval_seconds: float = 0.01, include_idle: bool = False
+) -> Tuple[str, int]:
+    """Profile the process for a while; return collapsed stacks and sample count
+
+    Only one profile runs at a time; ProfilerBusyError is raised otherwise.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        profiler = SamplingProfiler(interval_seconds, include_idle)
+        profiler.run(seconds)
+        return profiler.collapsed(), profiler.sample_count
+    finally:
+        _lock.release()
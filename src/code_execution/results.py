@@ -0,0 +1,110 @@
+"""Array-backed accumulation of per-test results
+
+Results are stored as packed bitsets and a float32 array as tests finish, so a
+compact response never builds an Output per test; the full outputs are only
+kept when the response needs them.
+"""
+
+import base64
+import sys
+from array import array
+from typing import List, Optional
+from code_execution.types import (
+    CodeExecutionResponse,
+    CompactExecutionResponse,
+    ExecutionResponse,
+    Output,
+    RunResult,
+)
+
+
+def _set_bit(bits: bytearray, index: int) -> None:
+    bits[index >> 3] |= 1 << (index & 7)
+
+
+def pack_floats(values: array) -> str:
+    if sys.byteorder == "big":
+        values = array("f", values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode()
+
+
+def unpack_bits(encoded: str, count: int) -> List[bool]:
+    """Decode a base64 bitset from a compact response into count booleans"""
+    bits = base64.b64decode(encoded)
+    return [bool(bits[i >> 3] >> (i & 7) & 1) for i in range(count)]
+
+
+def unpack_floats(encoded: str) -> List[float]:
+    """Decode a base64 little-endian float32 array from a compact response"""
+    values = array("f")
+    values.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+class ResultBuffer:
+    """Per-test results of one request, filled in by index as tests finish"""
+
+    def __init__(self, count: int, keep_outputs: bool = True):
+        self.count = count
+        self.passed = bytearray((count + 7) // 8)
+        self.timed_out = bytearray((count + 7) // 8)
+        self.skipped = bytearray((count + 7) // 8)
+        # Only reported when some test was re-run
+        self.flaky: Optional[bytearray] = None
+        self.time_seconds = array("f", bytes(4 * count))
+        self.passed_count = 0
+        self._outputs: Optional[List[Optional[RunResult]]] = None
+        if keep_outputs:
+            outputs: List[Optional[RunResult]] = [None] * count
+            self._outputs = outputs
+
+    def set(self, index: int, result: RunResult) -> None:
+        if result.passed:
+            _set_bit(self.passed, index)
+            self.passed_count += 1
+        if result.timed_out:
+            _set_bit(self.timed_out, index)
+        if result.skipped:
+            _set_bit(self.skipped, index)
+        if result.flaky is not None:
+            if self.flaky is None:
+                self.flaky = bytearray((self.count + 7) // 8)
+            if result.flaky:
+                _set_bit(self.flaky, index)
+        self.time_seconds[index] = result.time_seconds
+        if self._outputs is not None:
+            self._outputs[index] = result
+
+    def all_passed(self) -> bool:
+        return self.passed_count == self.count
+
+    def outputs(self) -> List[Output]:
+        assert self._outputs is not None, "outputs were not kept"
+        return [result.to_output() for result in self._outputs if result is not None]
+
+    def response(
+        self, compile_output: Output, response_format: str = "default"
+    ) -> ExecutionResponse:
+        if response_format == "compact":
+            return CompactExecutionResponse(
+                compile_output=compile_output,
+                num_tests=self.count,
+                passed=base64.b64encode(self.passed).decode(),
+                timed_out=base64.b64encode(self.timed_out).decode(),
+                skipped=base64.b64encode(self.skipped).decode(),
+                time_seconds=pack_floats(self.time_seconds),
+                all_passed=self.all_passed(),
+                flaky=(
+                    base64.b64encode(self.flaky).decode()
+                    if self.flaky is not None
+                    else None
+                ),
+            )
+        return CodeExecutionResponse(
+            compile_output=compile_output,
+            exec_outputs=self.outputs(),
+            all_passed=self.all_passed(),
+        )
@@ -0,0 +1,281 @@
+// Lightweight sandbox launcher for submitted programs.
+//
+// Usage: sandbox [-m bytes] [-c seconds] [-f bytes] [-t bytes] [-b dir]... -- program [args...]
+//
+//   -b  directory to keep visible (read-only) under the private tmpfs mounts
+//   -m  address space limit (RLIMIT_AS)
+//   -c  CPU time limit (RLIMIT_CPU)
+//   -f  maximum size of written files (RLIMIT_FSIZE)
+//   -t  size of the private tmpfs mounted on /tmp and /dev/shm
+//
+// The program runs in fresh user, mount, pid, net, ipc and uts namespaces with
+// a read-only view of the root filesystem, private tmpfs mounts, the given
+// rlimits and a seccomp filter denying kernel-administration syscalls. This
+// process stays outside the pid namespace as a tiny supervisor and exits with
+// the program's status. The namespace's init process dies with the supervisor,
+// so killing the supervisor kills every process the program started.
+//
+// Exit status 125 means the sandbox itself could not be set up.
+
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <linux/audit.h>
+#include <linux/filter.h>
+#include <linux/seccomp.h>
+#include <sched.h>
+#include <signal.h>
+#include <stddef.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mount.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/stat.h>
+#include <sys/syscall.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#define SETUP_FAILED 125
+#define MAX_BINDS 16
+
+#if defined(__x86_64__)
+#define SANDBOX_AUDIT_ARCH AUDIT_ARCH_X86_64
+#elif defined(__aarch64__)
+#define SANDBOX_AUDIT_ARCH AUDIT_ARCH_AARCH64
+#else
+#error "unsupported architecture"
+#endif
+
+static void die(const char *what) {
+    fprintf(stderr, "sandbox: %s: %s\n", what, strerror(errno));
+    _exit(SETUP_FAILED);
+}
+
+static void write_file(const char *path, const char *content) {
+    int fd = open(path, O_WRONLY);
+    if (fd < 0) die(path);
+    size_t length = strlen(content);
+    if (write(fd, content, length) != (ssize_t)length) die(path);
+    close(fd);
+}
+
+static void mkdir_p(const char *path) {
+    char buffer[4096];
+    snprintf(buffer, sizeof(buffer), "%s", path);
+    for (char *p = buffer + 1; *p; p++) {
+        if (*p != '/') continue;
+        *p = '\0';
+        mkdir(buffer, 0755);
+        *p = '/';
+    }
+    if (mkdir(buffer, 0755) != 0 && errno != EEXIST) die(path);
+}
+
+static void set_limit(int resource, unsigned long long value) {
+    if (value == 0) return;
+    struct rlimit limit = {value, value};
+    if (setrlimit(resource, &limit) != 0) die("setrlimit");
+}
+
+static const int denied_syscalls[] = {
+    __NR_ptrace,           __NR_mount,             __NR_umount2,
+    __NR_pivot_root,       __NR_chroot,            __NR_kexec_load,
+    __NR_kexec_file_load,  __NR_init_module,       __NR_finit_module,
+    __NR_delete_module,    __NR_bpf,               __NR_perf_event_open,
+    __NR_unshare,          __NR_setns,             __NR_keyctl,
+    __NR_add_key,          __NR_request_key,       __NR_reboot,
+    __NR_swapon,           __NR_swapoff,           __NR_process_vm_readv,
+    __NR_process_vm_writev, __NR_userfaultfd,      __NR_open_by_handle_at,
+    __NR_name_to_handle_at, __NR_acct,             __NR_settimeofday,
+    __NR_clock_settime,    __NR_sethostname,       __NR_setdomainname,
+};
+
+#define DENIED_COUNT (sizeof(denied_syscalls) / sizeof(denied_syscalls[0]))
+
+// clone() flags that create namespaces; unshare() and setns() are denied
+// outright. CLONE_NEWTIME is left out: clone() reads that bit as part of the
+// exit signal, and only clone3() takes it.
+#define NAMESPACE_FLAGS                                                        \
+    (CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWIPC | \
+     CLONE_NEWUTS | CLONE_NEWCGROUP)
+
+// Instructions between the denied syscall jumps and the allow instruction
+#define CLONE_CHECKS 5
+
+static void install_seccomp(void) {
+    // arch check, syscall load, x32 check, one jump per denied syscall, clone
+    // checks, allow, deny
+    struct sock_filter filter[3 + 1 + 1 + DENIED_COUNT + CLONE_CHECKS + 2];
+    size_t n = 0;
+    filter[n++] = (struct sock_filter)BPF_STMT(
+        BPF_LD | BPF_W | BPF_ABS, offsetof(struct seccomp_data, arch));
+    filter[n++] = (struct sock_filter)BPF_JUMP(
+        BPF_JMP | BPF_JEQ | BPF_K, SANDBOX_AUDIT_ARCH, 1, 0);
+    filter[n++] = (struct sock_filter)BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_KILL_PROCESS);
+    filter[n++] = (struct sock_filter)BPF_STMT(
+        BPF_LD | BPF_W | BPF_ABS, offsetof(struct seccomp_data, nr));
+#if defined(__x86_64__)
+    // Reject the x32 ABI, whose syscall numbers would bypass the list below
+    filter[n++] = (struct sock_filter)BPF_JUMP(
+        BPF_JMP | BPF_JGE | BPF_K, 0x40000000, DENIED_COUNT + CLONE_CHECKS + 1, 0);
+#else
+    filter[n++] = (struct sock_filter)BPF_JUMP(BPF_JMP | BPF_JA, 0, 0, 0);
+#endif
+    for (size_t i = 0; i < DENIED_COUNT; i++) {
+        // Jump to the deny instruction, which sits after the remaining checks
+        filter[n++] = (struct sock_filter)BPF_JUMP(
+            BPF_JMP | BPF_JEQ | BPF_K, denied_syscalls[i],
+            DENIED_COUNT - i + CLONE_CHECKS, 0);
+    }
+    // clone3() passes its flags in memory seccomp can't read; ENOSYS makes
+    // libc fall back to clone(), whose flags it can
+    filter[n++] = (struct sock_filter)BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_clone3, 0, 1);
+    filter[n++] = (struct sock_filter)BPF_STMT(
+        BPF_RET | BPF_K, SECCOMP_RET_ERRNO | (ENOSYS & SECCOMP_RET_DATA));
+    filter[n++] = (struct sock_filter)BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_clone, 0, 2);
+    // The flags are the first argument; all namespace bits are in its low word
+    filter[n++] = (struct sock_filter)BPF_STMT(
+        BPF_LD | BPF_W | BPF_ABS, offsetof(struct seccomp_data, args[0]));
+    filter[n++] = (struct sock_filter)BPF_JUMP(
+        BPF_JMP | BPF_JSET | BPF_K, NAMESPACE_FLAGS, 1, 0);
+    filter[n++] = (struct sock_filter)BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_ALLOW);
+    filter[n++] = (struct sock_filter)BPF_STMT(
+        BPF_RET | BPF_K, SECCOMP_RET_ERRNO | (EPERM & SECCOMP_RET_DATA));
+
+    struct sock_fprog program = {(unsigned short)n, filter};
+    if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0) die("no_new_privs");
+    if (prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, &program) != 0) die("seccomp");
+}
+
+static void setup_filesystem(unsigned long long tmpfs_size, char **binds, int bind_count) {
+    char options[64];
+    snprintf(options, sizeof(options), "size=%llu,mode=1777", tmpfs_size);
+
+    // Hold the bind sources open: they may live under /tmp, which gets shadowed
+    int bind_fds[MAX_BINDS];
+    for (int i = 0; i < bind_count; i++) {
+        bind_fds[i] = open(binds[i], O_PATH | O_DIRECTORY);
+        if (bind_fds[i] < 0) die(binds[i]);
+    }
+
+    if (mount(NULL, "/", NULL, MS_REC | MS_PRIVATE, NULL) != 0) die("make / private");
+    if (mount("/", "/", NULL, MS_BIND | MS_REMOUNT | MS_RDONLY, NULL) != 0)
+        die("remount / read-only");
+    if (mount("tmpfs", "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, options) != 0)
+        die("mount /tmp");
+    // Best effort: this may be absent or masked in some container runtimes
+    mount("tmpfs", "/dev/shm", "tmpfs", MS_NOSUID | MS_NODEV, options);
+
+    for (int i = 0; i < bind_count; i++) {
+        char source[64];
+        snprintf(source, sizeof(source), "/proc/self/fd/%d", bind_fds[i]);
+        mkdir_p(binds[i]);
+        if (mount(source, binds[i], NULL, MS_BIND | MS_REC, NULL) != 0) die(binds[i]);
+        if (mount(NULL, binds[i], NULL, MS_BIND | MS_REMOUNT | MS_RDONLY, NULL) != 0)
+            die(binds[i]);
+        close(bind_fds[i]);
+    }
+    // Best effort, after the binds since they go through /proc/self/fd
+    mount("proc", "/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC, NULL);
+}
+
+int main(int argc, char **argv) {
+    unsigned long long memory_limit = 0, cpu_limit = 0, file_size_limit = 0;
+    unsigned long long tmpfs_size = 64ULL << 20;
+    char *binds[MAX_BINDS];
+    int bind_count = 0;
+    int opt;
+    while ((opt = getopt(argc, argv, "+m:c:f:t:b:")) != -1) {
+        switch (opt) {
+        case 'm': memory_limit = strtoull(optarg, NULL, 10); break;
+        case 'c': cpu_limit = strtoull(optarg, NULL, 10); break;
+        case 'f': file_size_limit = strtoull(optarg, NULL, 10); break;
+        case 't': tmpfs_size = strtoull(optarg, NULL, 10); break;
+        case 'b':
+            if (bind_count == MAX_BINDS) {
+                fprintf(stderr, "sandbox: too many -b directories\n");
+                return SETUP_FAILED;
+            }
+            binds[bind_count++] = optarg;
+            break;
+        default:
+            fprintf(stderr, "usage: %s [-m bytes] [-c seconds] [-f bytes] [-t bytes] [-b dir]... -- program [args...]\n", argv[0]);
+            return SETUP_FAILED;
+        }
+    }
+    if (optind >= argc) {
+        fprintf(stderr, "sandbox: missing program\n");
+        return SETUP_FAILED;
+    }
+
+    uid_t uid = getuid();
+    gid_t gid = getgid();
+    if (unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET |
+                CLONE_NEWIPC | CLONE_NEWUTS) != 0)
+        die("unshare");
+
+    // Keep the same ids inside the namespace; mounting still works because
+    // we hold all capabilities in the new user namespace until exec
+    char map[64];
+    write_file("/proc/self/setgroups", "deny");
+    snprintf(map, sizeof(map), "%u %u 1\n", uid, uid);
+    write_file("/proc/self/uid_map", map);
+    snprintf(map, sizeof(map), "%u %u 1\n", gid, gid);
+    write_file("/proc/self/gid_map", map);
+
+    // The init process reports the program's raw wait status through this pipe
+    int status_pipe[2];
+    if (pipe2(status_pipe, O_CLOEXEC) != 0) die("pipe");
+
+    pid_t init = fork();
+    if (init < 0) die("fork");
+    if (init == 0) {
+        // pid 1 of the new namespace; everything in it dies with us
+        close(status_pipe[0]);
+        if (prctl(PR_SET_PDEATHSIG, SIGKILL, 0, 0, 0) != 0) die("pdeathsig");
+        setup_filesystem(tmpfs_size, binds, bind_count);
+
+        // Run the program as a child so it doesn't get pid 1 signal semantics
+        pid_t program = fork();
+        if (program < 0) die("fork");
+        if (program == 0) {
+            set_limit(RLIMIT_AS, memory_limit);
+            set_limit(RLIMIT_CPU, cpu_limit);
+            set_limit(RLIMIT_FSIZE, file_size_limit);
+            install_seccomp();
+            execvp(argv[optind], &argv[optind]);
+            die(argv[optind]);
+        }
+
+        // Reap everything until the program itself exits
+        int status;
+        for (;;) {
+            pid_t pid = wait(&status);
+            if (pid == program) break;
+            if (pid < 0 && errno != EINTR) die("wait");
+        }
+        if (write(status_pipe[1], &status, sizeof(status)) != sizeof(status)) die("write");
+        _exit(0);
+    }
+    close(status_pipe[1]);
+
+    int status;
+    while (waitpid(init, &status, 0) < 0) {
+        if (errno != EINTR) die("waitpid");
+    }
+    int program_status;
+    if (read(status_pipe[0], &program_status, sizeof(program_status)) == sizeof(program_status))
+        status = program_status;
+    if (WIFSIGNALED(status)) {
+        // Re-raise so our parent sees the same termination signal
+        struct rlimit no_core = {0, 0};
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        kill(getpid(), WTERMSIG(status));
+        return 128 + WTERMSIG(status);
+    }
+    return WEXITSTATUS(status);
+}
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import math
+import os
+import shutil
+import subprocess
+import threading
+from typing import List, Optional, Sequence
+from code_execution import config
+from code_execution.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# C source of the launcher, compiled on first use (see the header comment there)
+SANDBOX_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox.c")
+
+
+class SandboxError(RuntimeError):
+    """Raised when the sandbox launcher cannot be built or does not work"""
+
+
+class Sandbox:
+    """Wraps program commands in the namespace/seccomp sandbox launcher"""
+
+    def __init__(
+        self,
+        launcher_path: str,
+        memory_limit_bytes: int = config.SANDBOX_MEMORY_LIMIT_BYTES,
+        file_size_limit_bytes: int = config.SANDBOX_FILE_SIZE_LIMIT_BYTES,
+        tmpfs_size_bytes: int = config.SANDBOX_TMPFS_SIZE_BYTES,
+    ):
+        self.launcher_path = launcher_path
+        self.memory_limit_bytes = memory_limit_bytes
+        self.file_size_limit_bytes = file_size_limit_bytes
+        self.tmpfs_size_bytes = tmpfs_size_bytes
+
+    @classmethod
+    def build(
+        cls, build_dir: str = os.path.join(config.CACHE_ROOT, "sandbox")
+    ) -> "Sandbox":
+        """Compile the launcher (once per source version) and check that it works"""
+        if shutil.which("gcc") is None:
+            raise SandboxError("gcc not found on PATH")
+        with open(SANDBOX_SOURCE, "rb") as source_file:
+            digest = hashlib.sha256(source_file.read()).hexdigest()[:16]
+        launcher_path = os.path.join(build_dir, f"sandbox-{digest}")
+        if not os.path.exists(launcher_path):
+            os.makedirs(build_dir, exist_ok=True)
+            temp_path = f"{launcher_path}.{os.getpid()}.tmp"
+            process = subprocess.run(
+                ["gcc", "-O2", "-o", temp_path, SANDBOX_SOURCE],
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            if process.returncode != 0:
+                raise SandboxError(f"Failed to compile sandbox: {process.stderr}")
+            os.replace(temp_path, launcher_path)
+
+        sandbox = cls(launcher_path)
+        process = subprocess.run(
+            sandbox.wrap(["true"]), capture_output=True, text=True, timeout=10
+        )
+        if process.returncode != 0:
+            raise SandboxError(f"Sandbox does not work here: {process.stderr.strip()}")
+        return sandbox
+
+    def wrap(
+        self,
+        command: List[str],
+        cpu_time_limit_seconds: Optional[float] = None,
+        visible_dirs: Sequence[str] = (),
+    ) -> List[str]:
+        """Return a command that runs the given one inside the sandbox
+
+        visible_dirs are kept readable inside the sandbox even if they live
+        under /tmp, which is otherwise replaced by a private tmpfs.
+        """
+        wrapped = [
+            self.launcher_path,
+            "-m", str(self.memory_limit_bytes),
+            "-f", str(self.file_size_limit_bytes),
+            "-t", str(self.tmpfs_size_bytes),
+        ]
+        for directory in visible_dirs:
+            wrapped += ["-b", os.path.abspath(directory)]
+        if cpu_time_limit_seconds is not None:
+            # RLIMIT_CPU is a backstop behind the wall-clock timeout
+            wrapped += ["-c", str(math.ceil(cpu_time_limit_seconds) + 1)]
+        return wrapped + ["--"] + command
+
+
+_sandbox: Optional[Sandbox] = None
+_sandbox_error: Optional[str] = None
+_sandbox_checked = False
+_lock = threading.Lock()
+
+
+def get_sandbox() -> Optional[Sandbox]:
+    """Return the shared sandbox, or None if sandboxing is off or unavailable"""
+    global _sandbox, _sandbox_error, _sandbox_checked
+    with _lock:
+        if not _sandbox_checked:
+            if config.SANDBOX_MODE != "off":
+                try:
+                    _sandbox = Sandbox.build()
+                except (SandboxError, OSError, subprocess.SubprocessError) as e:
+                    _sandbox_error = str(e)
+                    logger.warning("Running programs without a sandbox: %s", e)
+            _sandbox_checked = True
+        if _sandbox is None and config.SANDBOX_MODE == "on":
+            raise SandboxError(f"Sandbox is required but unavailable: {_sandbox_error}")
+        return _sandbox
+
+
+def sandbox_status() -> dict:
+    """Describe the sandbox state for /metrics"""
+    return {
+        "mode": config.SANDBOX_MODE,
+        "enabled": _sandbox is not None,
+        "error": _sandbox_error,
+    }
+
+
+metrics.register_collector("sandbox", sandbox_status)
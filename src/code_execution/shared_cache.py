@@ -0,0 +1,223 @@
+"""On-disk content store shared by every worker process of the server
+
+gunicorn runs several worker processes, so a cache kept in one worker's
+memory would be built again by each of them. SharedCache keeps entries as
+files in one directory instead, with a SQLite index of their sizes and last
+use that all workers update:
+
+- Entries are published atomically: written to a temp file and renamed into
+  place, so readers see a whole entry or none.
+- The least recently used entries are evicted once the entries take more
+  than max_bytes in total. Readers hold hard links or copies, so evicting an
+  entry in use doesn't affect them.
+- Building an entry is single-flight across processes: the first worker to
+  miss takes the key's flock() while it builds, and the others wait for it
+  and then read its entry rather than building their own.
+"""
+
+import fcntl
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from code_execution.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        if isinstance(e, FileNotFoundError):
+            raise
+        shutil.copy2(source, destination)
+
+
+class SharedCache:
+    """Files by key, shared by processes, evicted least recently used first"""
+
+    def __init__(self, name: str, directory: str, max_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock_dir = os.path.join(directory, "locks")
+        os.makedirs(self._lock_dir, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.sqlite")
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads (or processes)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._index_path, timeout=30, isolation_level=None
+            )
+            # Losing the last updates of the index in a power cut is harmless
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _touch(self, key: str) -> None:
+        connection = self._connection()
+        cursor = connection.execute(
+            "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+        )
+        if cursor.rowcount == 0:
+            # Published before it was indexed (or by an older server): adopt it
+            try:
+                size = os.path.getsize(self.path(key))
+            except FileNotFoundError:
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, size, time.time()),
+            )
+
+    def fetch(self, key: str, destination: str) -> bool:
+        """Hard link (or copy) the entry to destination; False if there is none"""
+        try:
+            _link_or_copy(self.path(key), destination)
+        except FileNotFoundError:
+            return False
+        self._touch(key)
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        """The entry's contents, or None if there is none"""
+        try:
+            with open(self.path(key), "rb") as entry_file:
+                data = entry_file.read()
+        except FileNotFoundError:
+            return None
+        self._touch(key)
+        return data
+
+    def publish(self, key: str, source: str) -> None:
+        """Copy a file in as the entry for key, replacing any previous one"""
+
+        def copy_temp(temp_path: str) -> None:
+            shutil.copy2(source, temp_path)
+
+        self._publish(key, copy_temp)
+
+    def write(self, key: str, data: bytes) -> None:
+        """Store data as the entry for key, replacing any previous one"""
+
+        def write_temp(temp_path: str) -> None:
+            with open(temp_path, "wb") as entry_file:
+                entry_file.write(data)
+
+        self._publish(key, write_temp)
+
+    def _publish(self, key: str, write_temp: Callable[[str], None]) -> None:
+        # Write to a unique temp name and rename, so readers never see a
+        # partial file and concurrent writers of the same key don't conflict
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write_temp(temp_path)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)",
+            (key, size, time.time()),
+        )
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used entries until they fit; return how many"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            (total,) = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            evicted = []
+            if total > self.max_bytes:
+                for key, size in connection.execute(
+                    "SELECT key, size FROM entries ORDER BY last_used"
+                ):
+                    evicted.append(key)
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                connection.executemany(
+                    "DELETE FROM entries WHERE key = ?", [(key,) for key in evicted]
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        for key in evicted:
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            metrics.inc(f"{self.name}_cache_evictions", len(evicted))
+        return len(evicted)
+
+    @contextmanager
+    def single_flight(self, key: str) -> Iterator[None]:
+        """Hold key's lock across processes while building its entry
+
+        Check for the entry again once inside: whoever held the lock before
+        may have just published it.
+        """
+        lock_path = os.path.join(self._lock_dir, key)
+        start = time.perf_counter()
+        while True:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    metrics.inc(f"{self.name}_cache_waits")
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                # The previous holder removes the lock file on its way out;
+                # a lock on the removed file no longer excludes anyone
+                try:
+                    current = os.stat(lock_path).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current != os.fstat(fd).st_ino:
+                    continue
+                metrics.observe(f"{self.name}_cache_wait", time.perf_counter() - start)
+                try:
+                    yield
+                finally:
+                    os.unlink(lock_path)
+                return
+            finally:
+                os.close(fd)
+
+    def stats(self) -> Dict[str, int]:
+        count, total = (
+            self._connection()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries")
+            .fetchone()
+        )
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
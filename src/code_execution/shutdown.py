@@ -0,0 +1,242 @@
+"""Graceful shutdown: stop admitting requests, drain them, then clean up
+
+On SIGTERM (Cloud Run scaling an instance down, gunicorn recycling a worker)
+the server stops admitting requests and gives the running ones until
+CODE_EXECUTION_DRAIN_SECONDS to finish. Requests still running then have
+their programs killed and fail with ShuttingDownError, a 503 the client can
+retry, instead of reporting the verdicts of killed tests; the job queue
+worker gives such jobs back without spending an attempt.
+
+Request workspaces live in a directory per worker process, locked with flock
+for as long as the worker lives and removed when it stops; the next worker to
+start removes the unlocked ones that killed workers left, along with stale
+temp files in the on-disk caches. The caches
+themselves (binaries, ccache, generated tests) are kept, so retries after a
+restart are warm.
+"""
+
+import fcntl
+import glob
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+from code_execution import config
+from code_execution.metrics import metrics
+from code_execution.process import ShuttingDownError, reaper
+
+logger = logging.getLogger(__name__)
+
+
+# Publishing a cache entry takes seconds; a temp file untouched for this long
+# was left by a worker that died
+_STALE_TEMP_SECONDS = 600
+
+
+def _try_lock(directory: str) -> Optional[int]:
+    """Return a descriptor holding the directory's lock, or None if it is held"""
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class Drain:
+    """Tracks running requests so shutdown can wait for them, or cut them short"""
+
+    def __init__(
+        self,
+        workspace_root: str = config.WORKSPACE_DIR,
+        drain_seconds: float = config.DRAIN_SECONDS,
+    ):
+        self.workspace_root = workspace_root
+        self.drain_seconds = drain_seconds
+        self._condition = threading.Condition()
+        self._running = 0
+        self._draining = False
+        # Set when the deadline passed with requests still running
+        self._aborted = False
+        self._thread: Optional[threading.Thread] = None
+        # This worker's workspace directory: (pid, path, locked descriptor)
+        self._workspace: Optional[Tuple[int, str, int]] = None
+        self._workspace_lock = threading.Lock()
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Run a request, unless the server is shutting down
+
+        A request whose programs were killed by the drain deadline fails with
+        ShuttingDownError, whatever it raised or returned: its results come
+        from killed programs. One that finished without losing a program
+        keeps its result.
+        """
+        with self._condition:
+            if self._draining:
+                metrics.inc("shutdown_rejected_requests")
+                raise ShuttingDownError("The server is shutting down")
+            self._running += 1
+        with reaper.track_request() as groups:
+            try:
+                yield
+            except ShuttingDownError:
+                raise
+            except Exception as e:
+                if self._aborted and reaper.killed_any(groups):
+                    raise ShuttingDownError(
+                        "The server shut down during the request"
+                    ) from e
+                raise
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
+        if self._aborted and reaper.killed_any(groups):
+            raise ShuttingDownError("The server shut down during the request")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no request is running; False if the timeout expired first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._running == 0, timeout)
+
+    def begin(self) -> None:
+        """Stop admitting requests and cut the running ones short at the deadline"""
+        with self._condition:
+            if self._draining:
+                return
+            self._draining = True
+        logger.info(
+            "Shutting down: draining %d running requests for up to %.1fs",
+            self._running,
+            self.drain_seconds,
+        )
+        self._thread = threading.Thread(
+            target=self._drain, name="shutdown-drain", daemon=True
+        )
+        self._thread.start()
+
+    def _drain(self) -> None:
+        if self.wait(self.drain_seconds):
+            return
+        self._aborted = True
+        metrics.inc("shutdown_aborted_requests", self._running)
+        killed = reaper.close()
+        logger.warning(
+            "Drain deadline passed: killed %d programs of %d running requests",
+            killed,
+            self._running,
+        )
+
+    def close(self) -> None:
+        """Kill what is still running and remove this worker's workspaces"""
+        reaper.close()
+        with self._workspace_lock:
+            workspace, self._workspace = self._workspace, None
+        if workspace is not None and workspace[0] == os.getpid():
+            shutil.rmtree(workspace[1], ignore_errors=True)
+            os.close(workspace[2])
+
+    def _workspace_dir(self) -> str:
+        # Per process, since gunicorn forks the workers after importing us
+        pid = os.getpid()
+        with self._workspace_lock:
+            if self._workspace is not None and self._workspace[0] == pid:
+                return self._workspace[1]
+            if self._workspace is not None:
+                # Inherited from the parent, whose lock this is
+                os.close(self._workspace[2])
+            os.makedirs(self.workspace_root, exist_ok=True)
+            # Made under a hidden name and renamed once locked, so sweep()
+            # never sees it unlocked; the random suffix keeps workers with
+            # the same pid in other pid namespaces apart
+            staging = tempfile.mkdtemp(prefix=f".{pid}-", dir=self.workspace_root)
+            fd = _try_lock(staging)
+            assert fd is not None
+            directory = os.path.join(
+                self.workspace_root, os.path.basename(staging)[1:]
+            )
+            os.rename(staging, directory)
+            self._workspace = (pid, directory, fd)
+            return directory
+
+    def workspace(self, prefix: Optional[str] = None) -> str:
+        """Create a request workspace; the caller removes it when done"""
+        return tempfile.mkdtemp(prefix=prefix, dir=self._workspace_dir())
+
+    def sweep(self, cache_dirs: Sequence[str] = ()) -> int:
+        """Remove what killed workers left behind; return how many entries
+
+        That is their workspace directories, which no live worker holds the
+        lock of, and the temp files of cache entries they were publishing
+        (named <entry>.<pid>[.<thread>].tmp) in cache_dirs, once stale.
+        """
+        removed = 0
+        if os.path.isdir(self.workspace_root):
+            for entry in os.listdir(self.workspace_root):
+                directory = os.path.join(self.workspace_root, entry)
+                if entry.startswith(".") or not os.path.isdir(directory):
+                    continue
+                fd = _try_lock(directory)
+                if fd is None:
+                    continue
+                try:
+                    shutil.rmtree(directory, ignore_errors=True)
+                finally:
+                    os.close(fd)
+                removed += 1
+        stale = time.time() - _STALE_TEMP_SECONDS
+        for cache_dir in cache_dirs:
+            for path in glob.glob(os.path.join(cache_dir, "*.tmp")):
+                try:
+                    if os.path.getmtime(path) < stale:
+                        os.unlink(path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            metrics.inc("shutdown_swept_leftovers", removed)
+        return removed
+
+    def install_signal_handler(
+        self, on_sigterm: Optional[Callable[[], None]] = None
+    ) -> None:
+        """Start draining on SIGTERM, then call on_sigterm and the previous handler
+
+        The previous handler is the server's own (uvicorn stops accepting
+        connections and waits for the open ones), so it keeps working.
+        """
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            self.begin()
+            if on_sigterm is not None:
+                on_sigterm()
+            if callable(previous):
+                previous(signum, frame)
+
+        try:
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            # Not the main thread, e.g. under a test client
+            logger.warning("Not draining on SIGTERM: not in the main thread")
+
+
+drain = Drain()
@@ -0,0 +1,224 @@
+"""Snapshot runs: restore a program from its first stdin read for each test
+
+A SnapshotSession runs the program once, up to the point where it first
+reads stdin, and keeps it there as a fork server (see
+languages/python_snapshot.py). Each test then forks the paused program, so
+imports and precomputation that don't depend on the input run once per
+submission instead of once per test. Per-test time limits apply to the
+restored part only; the setup has its own limit.
+
+Tests fall back to a normal run when the program can't be snapshotted: it
+finished or failed before reading stdin, or the fork server stopped answering.
+"""
+
+import array
+import json
+import os
+import selectors
+import socket
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from code_execution import tracing
+from code_execution.cpu_scheduler import current_cpu
+from code_execution.metrics import metrics
+from code_execution.process import decode_output, kill_process_group, reaper, spawn
+from code_execution.types import RunResult, StdinStdout
+
+_READ_CHUNK = 64 * 1024
+# How long past a test's timeout to wait for the fork server's answer
+_GRACE_SECONDS = 1.0
+# How long to wait for the pipes to close after the test's program exited
+_DRAIN_TIMEOUT_SECONDS = 1.0
+
+
+class SnapshotSession:
+    """A program paused at its first stdin read, forked once per test"""
+
+    def __init__(
+        self,
+        command: List[str],
+        setup_timeout: float,
+        env: Optional[Dict[str, str]] = None,
+    ):
+        self.command = command
+        self.setup_timeout = setup_timeout
+        self.env = env
+        # Set once the program turned out not to be snapshottable; every
+        # later test falls back to a normal run
+        self.unavailable = False
+        self._process: Optional[subprocess.Popen] = None
+        self._control: Optional[socket.socket] = None
+
+    def _start(self) -> bool:
+        """Run the program up to its first stdin read; return whether it got there"""
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        with tracing.span("spawn"):
+            self._process = spawn(
+                self.command,
+                stdin=theirs.fileno(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=self.env,
+            )
+        theirs.close()
+        reaper.track(self._process.pid)
+        self._control = ours
+        with tracing.span("snapshot"):
+            message = self._receive(time.monotonic() + self.setup_timeout)
+        if not message or not message.get("ready"):
+            self._fail()
+            return False
+        return True
+
+    def _fail(self) -> None:
+        self.unavailable = True
+        self._stop()
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+        assert self._control is not None
+        self._control.close()
+        kill_process_group(self._process.pid)
+        self._process.wait()
+        reaper.release(self._process.pid)
+        self._process = None
+        self._control = None
+
+    def close(self) -> None:
+        self._stop()
+
+    def _receive(self, deadline: float) -> Optional[Dict[str, Any]]:
+        """Return the fork server's next message, {} if it exited, None on timeout"""
+        assert self._control is not None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        self._control.settimeout(remaining)
+        try:
+            data = self._control.recv(4096)
+        except socket.timeout:
+            return None
+        return json.loads(data) if data else {}
+
+    def run_test(self, test: StdinStdout, timeout: float) -> Optional[RunResult]:
+        """Run one test from the snapshot; None if it has to run normally"""
+        if self.unavailable:
+            return None
+        if self._process is None and not self._start():
+            return None
+        assert self._control is not None
+
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        theirs = [stdin_read, stdout_write, stderr_write]
+        try:
+            self._control.sendmsg(
+                [json.dumps({"timeout": timeout, "cpu": current_cpu()}).encode()],
+                [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", theirs))],
+            )
+        except OSError:
+            for fd in (stdin_write, stdout_read, stderr_read):
+                os.close(fd)
+            self._fail()
+            return None
+        finally:
+            for fd in theirs:
+                os.close(fd)
+
+        with tracing.span("run"):
+            stdout, stderr, message = self._communicate(
+                stdin_write,
+                stdout_read,
+                stderr_read,
+                test.stdin.encode(),
+                time.monotonic() + timeout + _GRACE_SECONDS,
+            )
+        if not message:
+            # The fork server died or hung; it can't be trusted with more tests
+            self._fail()
+            return None
+        metrics.inc("snapshot_restores")
+        if message["timed_out"]:
+            return RunResult(
+                passed=False,
+                stdout="Error: Timed out",
+                stderr="Error: Timed out",
+                time_seconds=message["time"],
+                timed_out=True,
+            )
+        with tracing.span("compare"):
+            passed = stdout.strip() == test.stdout.strip()
+        return RunResult(
+            passed=passed,
+            stdout=stdout,
+            stderr=stderr,
+            time_seconds=message["time"],
+            timed_out=False,
+        )
+
+    def _communicate(
+        self,
+        stdin_fd: int,
+        stdout_fd: int,
+        stderr_fd: int,
+        stdin: bytes,
+        deadline: float,
+    ) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """Feed the test's stdin and collect its output and the fork server's answer"""
+        assert self._control is not None
+        chunks: Dict[int, List[bytes]] = {stdout_fd: [], stderr_fd: []}
+        stdin_view = memoryview(stdin)
+        message: Optional[Dict[str, Any]] = None
+        self._control.setblocking(False)
+        with selectors.DefaultSelector() as selector:
+            if stdin:
+                os.set_blocking(stdin_fd, False)
+                selector.register(stdin_fd, selectors.EVENT_WRITE)
+            else:
+                os.close(stdin_fd)
+            selector.register(stdout_fd, selectors.EVENT_READ)
+            selector.register(stderr_fd, selectors.EVENT_READ)
+            selector.register(self._control, selectors.EVENT_READ)
+
+            while message is None or len(selector.get_map()) > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for key, _ in selector.select(remaining):
+                    if key.fd == stdin_fd:
+                        try:
+                            written = os.write(stdin_fd, stdin_view[:_READ_CHUNK])
+                        except BrokenPipeError:
+                            written = len(stdin_view)
+                        stdin_view = stdin_view[written:]
+                        if not stdin_view:
+                            selector.unregister(stdin_fd)
+                            os.close(stdin_fd)
+                    elif key.fileobj is self._control:
+                        data = self._control.recv(4096)
+                        message = json.loads(data) if data else {}
+                        selector.unregister(self._control)
+                        # Leftovers that escaped the group hold the pipes open
+                        deadline = min(
+                            deadline, time.monotonic() + _DRAIN_TIMEOUT_SECONDS
+                        )
+                    else:
+                        data = os.read(key.fd, _READ_CHUNK)
+                        if data:
+                            chunks[key.fd].append(data)
+                        else:
+                            selector.unregister(key.fd)
+            for key in list(selector.get_map().values()):
+                if key.fd == stdin_fd:
+                    os.close(stdin_fd)
+        for fd in (stdout_fd, stderr_fd):
+            os.close(fd)
+        self._control.setblocking(True)
+        return (
+            decode_output(b"".join(chunks[stdout_fd])),
+            decode_output(b"".join(chunks[stderr_fd])),
+            message,
+        )
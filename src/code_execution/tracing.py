@@ -0,0 +1,242 @@
+"""Per-request timing breakdowns and OpenTelemetry spans
+
+Code paths mark their phases with span() and record(). Each span goes into the
+request's timing breakdown if the request asked for a profile, and is exported
+to OpenTelemetry if an exporter is configured. With neither, a span costs one
+context variable lookup. Work handed to other threads is started with submit(),
+so its spans stay part of the request that handed it off.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
+from code_execution import config
+from code_execution.types import Profile
+
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import ReadableSpan
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTrace:
+    """Timing breakdown of one request, filled in by the spans run inside it"""
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.tests: List[Dict[str, float]] = []
+        # Spans of jobs submitted to other threads are added concurrently
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        target, path = _scope.get()
+        key = ".".join(path + (name,))
+        with self._lock:
+            target[key] = target.get(key, 0.0) + seconds
+
+    def new_test(self) -> Dict[str, float]:
+        test: Dict[str, float] = {}
+        with self._lock:
+            self.tests.append(test)
+        return test
+
+    def profile(self) -> Profile:
+        return Profile(
+            total_seconds=time.perf_counter() - self.start,
+            phases=dict(self.phases),
+            tests=[dict(test) for test in self.tests],
+        )
+
+
+class JsonLinesSpanExporter:
+    """Appends finished spans to a local file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: "Sequence[ReadableSpan]") -> "SpanExportResult":
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        with open(self.path, "a") as spans_file:
+            for span in spans:
+                context = span.context
+                if context is None:
+                    continue
+                record = {
+                    "name": span.name,
+                    "trace_id": f"{context.trace_id:032x}",
+                    "span_id": f"{context.span_id:016x}",
+                    "parent_id": f"{span.parent.span_id:016x}" if span.parent else None,
+                    "start_time_ns": span.start_time,
+                    "end_time_ns": span.end_time,
+                    "attributes": dict(span.attributes or {}),
+                }
+                spans_file.write(json.dumps(record) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+# Spans are recorded into the current test's entry while one runs, named by
+# their path from it (e.g. compile.spawn)
+_scope: ContextVar[Tuple[Dict[str, float], Tuple[str, ...]]] = ContextVar(
+    "trace_scope", default=({}, ())
+)
+_tracer: Any = None
+_provider: Any = None
+
+
+def configure(exporter: Any = config.TRACE_EXPORTER) -> None:
+    """Export spans to an exporter given by spec string or exporter object"""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _tracer = _provider = None
+    if exporter is None:
+        return
+    try:
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import (
+            BatchSpanProcessor,
+            ConsoleSpanExporter,
+            SimpleSpanProcessor,
+        )
+    except ImportError:
+        logger.warning("opentelemetry-sdk is not installed; spans are not exported")
+        return
+
+    if exporter == "console":
+        processor = SimpleSpanProcessor(ConsoleSpanExporter())
+    elif exporter == "otlp":
+        # From opentelemetry-exporter-otlp, only needed for this exporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (  # type: ignore
+            OTLPSpanExporter,
+        )
+
+        processor = BatchSpanProcessor(OTLPSpanExporter())
+    elif isinstance(exporter, str) and exporter.startswith("jsonl:"):
+        # Duck-typed, so the module imports without opentelemetry-sdk
+        jsonl = JsonLinesSpanExporter(exporter[len("jsonl:") :])
+        processor = SimpleSpanProcessor(cast("SpanExporter", jsonl))
+    elif isinstance(exporter, str):
+        raise ValueError(f"Unknown trace exporter '{exporter}'")
+    else:
+        processor = SimpleSpanProcessor(exporter)
+    _provider = TracerProvider()
+    _provider.add_span_processor(processor)
+    _tracer = _provider.get_tracer("code_execution")
+
+
+@contextmanager
+def request_trace(
+    profile: bool, received_at: Optional[float] = None, **attributes: Any
+) -> Iterator[Optional[RequestTrace]]:
+    """Trace one request; yields its timing breakdown if a profile was asked for
+
+    received_at is the perf_counter() time the request arrived, if known; the
+    time since then is recorded as the queue phase.
+    """
+    trace = RequestTrace(received_at) if profile else None
+    token = _trace.set(trace)
+    scope_token = _scope.set((trace.phases if trace else {}, ()))
+    try:
+        if received_at is not None:
+            record("queue", received_at, time.perf_counter())
+        if _tracer is not None:
+            with _tracer.start_as_current_span("execute", attributes=attributes):
+                yield trace
+        else:
+            yield trace
+    finally:
+        _scope.reset(scope_token)
+        _trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Time the enclosed block as a phase of the current request"""
+    trace = _trace.get()
+    if trace is None and _tracer is None:
+        yield
+        return
+    target, path = _scope.get()
+    token = _scope.set((target, path + (name,)))
+    start = time.perf_counter()
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span(name, attributes=attributes):
+                yield
+        else:
+            yield
+    finally:
+        _scope.reset(token)
+        if trace is not None:
+            trace.add(name, time.perf_counter() - start)
+
+
+@contextmanager
+def test_span(index: int) -> Iterator[None]:
+    """Record the enclosed spans into a new per-test entry"""
+    trace = _trace.get()
+    if trace is None:
+        with span("test", index=index):
+            yield
+        return
+    test = trace.new_test()
+    token = _scope.set((test, ()))
+    start = time.perf_counter()
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span("test", attributes={"index": index}):
+                yield
+        else:
+            yield
+    finally:
+        test["total"] = time.perf_counter() - start
+        _scope.reset(token)
+
+
+def record(name: str, start: float, end: float) -> None:
+    """Record an interval between two perf_counter() times as a span"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, end - start)
+    if _tracer is not None:
+        # OpenTelemetry wants wall-clock nanoseconds
+        now_ns, now = time.time_ns(), time.perf_counter()
+        otel_span = _tracer.start_span(
+            name, start_time=now_ns - int((now - start) * 1e9)
+        )
+        otel_span.end(end_time=now_ns - int((now - end) * 1e9))
+
+
+def submit(executor: Executor, fn: Callable[..., Any], *args: Any) -> Future:
+    """Run fn on the executor in a copy of the caller's context
+
+    Executor threads don't inherit context variables, so without this the
+    spans of the job would be left out of the request's trace.
+    """
+    return executor.submit(copy_context().run, fn, *args)
@@ -1,5 +1,6 @@
-from typing import List
-from pydantic import BaseModel
+from dataclasses import dataclass
+from typing import Any, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field
 
 
 class StdinStdout(BaseModel):
@@ -7,10 +8,113 @@ class StdinStdout(BaseModel):
     stdout: str
 
 
+class FunctionCall(BaseModel):
+    """One call of a function-call test and its expected return value"""
+
+    args: List[Any] = Field(default_factory=list)
+    kwargs: Dict[str, Any] = Field(default_factory=dict)
+    expected: Any = None
+
+
+class AdaptiveTimeout(BaseModel):
+    """Derive each test's timeout from a reference solution's runtime on it"""
+
+    reference_code: str
+    # Defaults to the language of the request
+    reference_language: Optional[str] = None
+    multiplier: float = Field(default=3.0, gt=0)
+    min_seconds: float = Field(default=1.0, gt=0)
+
+
+class Reruns(BaseModel):
+    """Run failed and borderline tests again, to tell real failures from noise
+
+    The first run still decides the verdict; re-run tests report their
+    fastest and median times and whether the runs disagreed.
+    """
+
+    # Extra runs of each such test, run in parallel
+    count: int = Field(default=3, ge=1, le=10)
+    # Passing tests that used at least this fraction of their timeout are
+    # re-run too
+    borderline_fraction: float = Field(default=0.8, gt=0, le=1)
+
+
+class Interactor(BaseModel):
+    """Judge program for interactive problems, run alongside each test
+
+    The interactor's stdout is the submission's stdin and the other way round.
+    It is started as `interactor <input file> <answer file>` with the test's
+    stdin and stdout written to those files, and passes the test by exiting
+    with status 0; what it writes to stderr is returned as the test's stdout.
+    """
+
+    code: str
+    language: str
+    interpreter: Optional[str] = None
+    # Wall-clock limit of the interactor per test; defaults to the submission's
+    time_limit_seconds: Optional[float] = Field(default=None, gt=0)
+    # CPU time limits of the interactor and the submission; each defaults to
+    # that side's wall-clock limit
+    cpu_time_limit_seconds: Optional[float] = Field(default=None, gt=0)
+    program_cpu_time_limit_seconds: Optional[float] = Field(default=None, gt=0)
+
+
+class GeneratedTests(BaseModel):
+    """Tests produced on the server by a generator program, one per seed
+
+    The generator is run with the seed as its only argument and prints the
+    test's input. The expected output is the reference solution's output on
+    it, or empty without one (e.g. when only grouping outputs).
+    """
+
+    code: str
+    language: str
+    interpreter: Optional[str] = None
+    seeds: List[Union[int, str]]
+    reference_code: Optional[str] = None
+    # Defaults to the generator's language
+    reference_language: Optional[str] = None
+    # Per-run timeout of the generator and the reference solution
+    time_limit_seconds: float = Field(default=30, gt=0)
+
+
 class CodeExecutionRequest(BaseModel):
     code: str
-    stdin_stdout: List[StdinStdout]
+    stdin_stdout: List[StdinStdout] = Field(default_factory=list)
     language: str
+    # Function-call tests (Python only): call this function of the program,
+    # e.g. "add" or "Solution.twoSum", with each of function_calls and compare
+    # the return values instead of running it on stdin_stdout
+    entry_point: Optional[str] = None
+    function_calls: List[FunctionCall] = Field(default_factory=list)
+    # Tests generated on the server, run after stdin_stdout
+    generated_tests: Optional[GeneratedTests] = None
+    # Interpreter to run Python with (e.g. "pypy3", "python3.11"); see /metrics
+    # for the ones detected on this server. Defaults to python3.
+    interpreter: Optional[str] = None
+    # Per-test timeout; defaults to the language handler's default
+    time_limit_seconds: Optional[float] = Field(default=None, gt=0)
+    # Wall-clock budget for the whole request; tests past it are skipped
+    total_time_budget_seconds: Optional[float] = Field(default=None, gt=0)
+    adaptive_timeout: Optional[AdaptiveTimeout] = None
+    # Run each test interactively against this program instead of comparing
+    # stdout
+    interactor: Optional[Interactor] = None
+    # Run the program once up to its first stdin read and restore each test
+    # from there, so input-independent setup runs once (Python only; other
+    # languages and programs that can't be snapshotted run normally)
+    snapshot: bool = False
+    reruns: Optional[Reruns] = None
+    # Return a per-phase, per-test timing breakdown with the response
+    profile: bool = False
+    # How much test output to echo back: "full", "failures_only" (blank for
+    # passing tests), "truncated:N" (first N characters) or "none"
+    output_verbosity: str = Field(
+        default="full", pattern=r"^(full|failures_only|none|truncated:\d+)$"
+    )
+    # "default" returns an Output per test; "compact" returns packed vectors
+    response_format: Literal["default", "compact"] = "default"
 
 
 class Output(BaseModel):
@@ -19,9 +123,169 @@ class Output(BaseModel):
     stderr: str
     time_seconds: float
     timed_out: bool
+    skipped: bool = False
+    # Set when stdout/stderr were cut short or left out per output_verbosity
+    truncated: bool = False
+    # SHA-256 of the full stdout, set unless output_verbosity is "full"
+    stdout_sha256: Optional[str] = None
+    # Set for tests that were re-run (see Reruns): how many runs there were,
+    # their fastest and median times, and whether their verdicts disagreed
+    runs: Optional[int] = None
+    min_time_seconds: Optional[float] = None
+    median_time_seconds: Optional[float] = None
+    flaky: Optional[bool] = None
+
+
+@dataclass(slots=True)
+class RunResult:
+    """Result of one test as produced by a handler, before any Output is built"""
+
+    passed: bool
+    stdout: str
+    stderr: str
+    time_seconds: float
+    timed_out: bool
+    skipped: bool = False
+    truncated: bool = False
+    stdout_sha256: Optional[str] = None
+    runs: Optional[int] = None
+    min_time_seconds: Optional[float] = None
+    median_time_seconds: Optional[float] = None
+    flaky: Optional[bool] = None
+
+    def to_output(self) -> Output:
+        # The fields are already the right types, so skip validation
+        return Output.model_construct(
+            passed=self.passed,
+            stdout=self.stdout,
+            stderr=self.stderr,
+            time_seconds=self.time_seconds,
+            timed_out=self.timed_out,
+            skipped=self.skipped,
+            truncated=self.truncated,
+            stdout_sha256=self.stdout_sha256,
+            runs=self.runs,
+            min_time_seconds=self.min_time_seconds,
+            median_time_seconds=self.median_time_seconds,
+            flaky=self.flaky,
+        )
+
+
+class Profile(BaseModel):
+    """Where a request's time went, in seconds"""
+
+    total_seconds: float
+    # Request phases (queue, tempdir, compile, tests, cleanup); spans nested in
+    # a phase are named by their path, e.g. compile.spawn
+    phases: Dict[str, float]
+    # One entry per test: spawn, stdin_write, run, compare, total, ...
+    tests: List[Dict[str, float]]
 
 
 class CodeExecutionResponse(BaseModel):
     compile_output: Output
     exec_outputs: List[Output]
-    all_passed: bool
\ No newline at end of file
+    all_passed: bool
+    profile: Optional[Profile] = None
+
+
+class CompactExecutionResponse(BaseModel):
+    """Per-test results as packed vectors, for response_format="compact"
+
+    passed, timed_out and skipped are base64 bitsets (bit i of byte i // 8 is
+    test i, least significant bit first); time_seconds is a base64 array of
+    little-endian float32. code_execution.results.unpack_bits/unpack_floats
+    decode them. flaky, a bitset too, is only set when the request had reruns.
+    """
+
+    format: Literal["compact"] = "compact"
+    compile_output: Output
+    num_tests: int
+    passed: str
+    timed_out: str
+    skipped: str
+    time_seconds: str
+    all_passed: bool
+    flaky: Optional[str] = None
+    profile: Optional[Profile] = None
+
+
+ExecutionResponse = Union[CodeExecutionResponse, CompactExecutionResponse]
+
+
+class BatchExecutionRequest(BaseModel):
+    requests: List[CodeExecutionRequest]
+
+
+class BatchItemResponse(BaseModel):
+    # Exactly one of response or error is set
+    response: Optional[ExecutionResponse] = None
+    error: Optional[str] = None
+    status_code: int = 200
+
+
+class BatchExecutionResponse(BaseModel):
+    responses: List[BatchItemResponse]
+
+
+class Candidate(BaseModel):
+    code: str
+    language: str
+    interpreter: Optional[str] = None
+
+
+class MultiExecutionRequest(BaseModel):
+    """One test suite run against several candidate programs"""
+
+    candidates: List[Candidate]
+    stdin_stdout: List[StdinStdout] = Field(default_factory=list)
+    generated_tests: Optional[GeneratedTests] = None
+    # Per-test timeout; defaults to each candidate's language handler default
+    time_limit_seconds: Optional[float] = Field(default=None, gt=0)
+    # Skip a candidate's remaining tests once one of its tests fails
+    stop_on_first_failure: bool = False
+    # As in CodeExecutionRequest; defaults to "none" since the pass matrix is
+    # usually all that's wanted
+    output_verbosity: str = Field(
+        default="none", pattern=r"^(full|failures_only|none|truncated:\d+)$"
+    )
+    response_format: Literal["default", "compact"] = "default"
+    # Group candidates by the hash of their normalized stdout, per test and
+    # across all tests; stdout may be left empty when it isn't known
+    group_outputs: bool = False
+
+
+class OutputGroup(BaseModel):
+    """Candidates that printed the same normalized stdout on one test"""
+
+    output_sha256: str
+    candidates: List[int]
+
+
+class MultiExecutionResponse(BaseModel):
+    # pass_matrix[i][j] is whether candidate i passed test j
+    pass_matrix: List[List[bool]]
+    # Full result per candidate, in request order; candidates that could not
+    # be run (e.g. unsupported language) have an error instead
+    candidates: List[BatchItemResponse]
+    # With group_outputs: the groups of each test, largest first. Candidates
+    # that timed out, were skipped or didn't compile are in no group.
+    output_groups: Optional[List[List[OutputGroup]]] = None
+    # With group_outputs: candidates with the same output on every test,
+    # largest group first. Candidates that timed out or were skipped on any
+    # test are in no group.
+    behavior_groups: Optional[List[List[int]]] = None
+
+
+class JobSubmission(BaseModel):
+    job_id: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    # One of "queued", "running", "done" or "failed"
+    status: str
+    attempts: int
+    worker_id: Optional[str] = None
+    response: Optional[ExecutionResponse] = None
+    error: Optional[str] = None
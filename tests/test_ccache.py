@@ -0,0 +1,57 @@
+import os
+import shutil
+
+import pytest
+
+from code_execution.languages.cpp import CppHandler, ccache_stats, parse_ccache_stats
+
+PROGRAM = """
+#include <iostream>
+int main() {
+    std::cout << "ok" << std::endl;
+    return 0;
+}
+"""
+
+
+def test_parse_ccache_stats():
+    """Test the counters are read from ccache --print-stats output"""
+    output = "\n".join(
+        [
+            "stats_updated_timestamp\t1700000000",
+            "direct_cache_hit\t3",
+            "preprocessed_cache_hit\t1",
+            "cache_miss\t4",
+            "cache_size_kibibyte\t512",
+            "files_in_cache\t8",
+        ]
+    )
+    assert parse_ccache_stats(output) == {
+        "enabled": True,
+        "hits": 4,
+        "misses": 4,
+        "hit_rate": 0.5,
+        "cache_size_kibibyte": 512,
+    }
+    assert parse_ccache_stats("")["hit_rate"] == 0.0
+
+
+@pytest.mark.skipif(shutil.which("ccache") is None, reason="ccache is not installed")
+def test_ccache_hits_on_recompile(tmp_path):
+    """Test compiling the same program twice from different dirs hits ccache"""
+    ccache_dir = str(tmp_path / "ccache")
+    handler = CppHandler(use_ccache=True, ccache_dir=ccache_dir, binary_cache_dir=None)
+
+    def compile_in(name):
+        work_dir = tmp_path / name
+        work_dir.mkdir()
+        output = handler.compile(PROGRAM, os.path.join(work_dir, "program"))
+        assert output.passed, output.stderr
+
+    compile_in("first")
+    before = ccache_stats(ccache_dir)
+    assert before["misses"] >= 1
+    compile_in("second")
+    after = ccache_stats(ccache_dir)
+    assert after["hits"] == before["hits"] + 1
+    assert after["hit_rate"] > before["hit_rate"]
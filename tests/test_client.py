@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from code_execution.client import CodeExecutionClient, CodeExecutionError
+
+BASE_URL = "http://localhost:8080"
+
+
+def sum_request(a: int, b: int) -> dict:
+    return {
+        "code": "a, b = map(int, input().split())\nprint(a + b)",
+        "stdin_stdout": [{"stdin": f"{a} {b}", "stdout": str(a + b)}],
+        "language": "python",
+    }
+
+
+def test_execute_many():
+    """Test that batched concurrent requests come back in order"""
+
+    async def run():
+        async with CodeExecutionClient(BASE_URL, batch_size=4) as client:
+            return await client.execute_many([sum_request(i, i) for i in range(10)])
+
+    responses = asyncio.run(run())
+    assert len(responses) == 10
+    for i, response in enumerate(responses):
+        assert response.all_passed, response
+        assert response.exec_outputs[0].stdout.strip() == str(2 * i)
+
+
+def test_per_request_errors():
+    """Test that one bad request in a batch fails without affecting the others"""
+
+    async def run():
+        async with CodeExecutionClient(BASE_URL, batch_size=2) as client:
+            bad = dict(sum_request(1, 2), language="brainfuck")
+            return await asyncio.gather(
+                client.execute(sum_request(1, 2)),
+                client.execute(bad),
+                return_exceptions=True,
+            )
+
+    good, bad = asyncio.run(run())
+    assert good.all_passed
+    assert isinstance(bad, CodeExecutionError)
+    assert bad.status_code == 400
+
+
+def test_server_for_is_consistent():
+    """Test that the same code always hashes to the same server"""
+    client = CodeExecutionClient([f"http://server-{i}:8080" for i in range(8)])
+    programs = [dict(sum_request(1, 1), code=f"print({i})") for i in range(200)]
+    servers = {client.server_for(program) for program in programs}
+    assert len(servers) == 8
+    first = sum_request(1, 1)
+    repeat = dict(first, stdin_stdout=[{"stdin": "2 2", "stdout": "4"}])
+    assert client.server_for(first) == client.server_for(repeat)
+
+    with pytest.raises(Exception):
+        client.server_for({"code": "no language"})
+
+
+def test_batch_items_retried():
+    """Test that per-item 503s of a batch are resent with backoff"""
+    calls = []
+    compile_output = {
+        "passed": True,
+        "stdout": "",
+        "stderr": "",
+        "time_seconds": 0,
+        "timed_out": False,
+    }
+    ok = {"compile_output": compile_output, "exec_outputs": [], "all_passed": True}
+
+    async def post(url, payload):
+        calls.append(len(payload.get("requests", [payload])))
+        # The first call turns the second item away, as a draining server does
+        if len(calls) == 1:
+            return {
+                "responses": [
+                    {"response": ok},
+                    {"error": "Server is shutting down", "status_code": 503},
+                ]
+            }
+        return ok
+
+    async def run():
+        client = CodeExecutionClient(BASE_URL, batch_size=2, backoff_seconds=0)
+        client._post = post
+        return await asyncio.gather(
+            client.execute(sum_request(1, 2)), client.execute(sum_request(3, 4))
+        )
+
+    first, second = asyncio.run(run())
+    assert calls == [2, 1]
+    assert first.all_passed and second.all_passed
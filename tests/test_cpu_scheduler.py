@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from code_execution.cpu_scheduler import CpuScheduler, current_cpu
+from code_execution.process import spawn
+
+CPU = min(os.sched_getaffinity(0))
+
+HOLD_SLOT = """
+import sys, time
+from code_execution.cpu_scheduler import CpuScheduler, current_cpu
+with CpuScheduler([int(sys.argv[1])], sys.argv[2]).slot():
+    print("held", flush=True)
+    time.sleep(0.5)
+"""
+
+
+def test_slot_pins_programs(tmp_path):
+    """Test programs started inside a slot run on the slot's CPU only"""
+    scheduler = CpuScheduler([CPU], str(tmp_path))
+    affinity = os.sched_getaffinity(0)
+    with scheduler.slot() as cpu:
+        assert current_cpu() == cpu == CPU
+        process = spawn(
+            ["grep", "Cpus_allowed_list", "/proc/self/status"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        stdout, _ = process.communicate()
+        # The server's own thread keeps its affinity
+        assert os.sched_getaffinity(0) == affinity
+    assert stdout.decode().split()[-1] == str(CPU)
+    assert current_cpu() is None
+
+
+def test_one_test_per_cpu_across_threads(tmp_path):
+    """Test a second test waits for the CPU until the first releases it"""
+    scheduler = CpuScheduler([CPU], str(tmp_path))
+    acquired = threading.Event()
+
+    def second():
+        with scheduler.slot():
+            acquired.set()
+
+    with scheduler.slot():
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert not acquired.wait(0.2)
+        assert scheduler.stats()["busy"] == 1
+    assert acquired.wait(5)
+    thread.join()
+    assert scheduler.stats()["busy"] == 0
+
+
+def test_one_test_per_cpu_across_processes(tmp_path):
+    """Test slots are shared with other worker processes"""
+    env = {**os.environ, "PYTHONPATH": "src"}
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_SLOT, str(CPU), str(tmp_path)],
+        stdout=subprocess.PIPE,
+        env=env,
+    )
+    assert holder.stdout is not None
+    assert holder.stdout.readline() == b"held\n"
+    scheduler = CpuScheduler([CPU], str(tmp_path))
+    start = time.perf_counter()
+    with scheduler.slot():
+        waited = time.perf_counter() - start
+    holder.wait()
+    assert waited > 0.2
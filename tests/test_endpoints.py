@@ -0,0 +1,273 @@
+import os
+import threading
+
+import pytest
+import requests
+
+BASE_URL = "http://localhost:8080"
+# Must match the server's, which the admin endpoints need to be enabled
+ADMIN_TOKEN = os.environ.get("CODE_EXECUTION_ADMIN_TOKEN")
+
+CPP_ECHO = {
+    "code": """
+    #include <iostream>
+
+    int main() {
+        std::string line;
+        std::getline(std::cin, line);
+        std::cout << line << std::endl;
+        return 0;
+    }
+    """,
+    "stdin_stdout": [{"stdin": "echo", "stdout": "echo\n"}],
+    "language": "cpp",
+}
+
+
+def test_ready():
+    """Test that the server reports ready once toolchains are warmed up"""
+    response = requests.get(f"{BASE_URL}/ready")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ready"]
+    assert data["languages"]["cpp"] is None
+    assert data["languages"]["python"] is None
+
+
+def test_binary_cache_hit():
+    """Test that resubmitting the same C++ code reuses the compiled binary"""
+    requests.post(f"{BASE_URL}/execute", json=CPP_ECHO)
+    before = requests.get(f"{BASE_URL}/metrics").json()["counters"]
+    response = requests.post(f"{BASE_URL}/execute", json=CPP_ECHO)
+    assert response.status_code == 200
+    assert response.json()["all_passed"]
+    after = requests.get(f"{BASE_URL}/metrics").json()["counters"]
+    assert after["cpp_binary_cache_hits"] == before.get("cpp_binary_cache_hits", 0) + 1
+
+
+def test_sandbox_read_only_root():
+    """Test that sandboxed programs cannot write outside their private /tmp"""
+    if not requests.get(f"{BASE_URL}/metrics").json()["sandbox"]["enabled"]:
+        pytest.skip("sandbox is not available on this server")
+    payload = {
+        "code": """
+import os
+
+try:
+    open("/sandbox_probe", "w")
+    print("writable")
+except OSError:
+    print("read-only")
+open("/tmp/scratch", "w").write("ok")
+print(open("/tmp/scratch").read())
+        """,
+        "stdin_stdout": [{"stdin": "", "stdout": "read-only\nok"}],
+        "language": "python",
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    assert response.json()["all_passed"]
+
+
+def test_sandbox_denies_namespaces():
+    """Test that sandboxed programs can fork but not create namespaces"""
+    if not requests.get(f"{BASE_URL}/metrics").json()["sandbox"]["enabled"]:
+        pytest.skip("sandbox is not available on this server")
+    payload = {
+        "code": """
+#include <cerrno>
+#include <csignal>
+#include <cstdio>
+#include <sched.h>
+#include <sys/syscall.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+long try_clone(unsigned long flags) {
+    long pid = syscall(SYS_clone, flags | SIGCHLD, 0, 0, 0, 0);
+    if (pid == 0) _exit(0);
+    if (pid > 0) waitpid(pid, nullptr, 0);
+    return pid < 0 ? -errno : 0;
+}
+
+int main() {
+    printf("%d\\n", try_clone(CLONE_NEWUSER) == -EPERM);
+    printf("%d\\n", try_clone(CLONE_NEWNS | CLONE_NEWPID) == -EPERM);
+    // clone3, whose number headers older than glibc 2.34 lack
+    printf("%d\\n", syscall(435, nullptr, 0) < 0 && errno == ENOSYS);
+    printf("%d\\n", try_clone(0) == 0);
+}
+        """,
+        "stdin_stdout": [{"stdin": "", "stdout": "1\n1\n1\n1"}],
+        "language": "cpp",
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    assert response.json()["all_passed"]
+
+
+def test_forked_children_do_not_hold_request():
+    """Test that a child outliving the program is killed instead of timing out"""
+    payload = {
+        "code": """
+import os
+import time
+
+if os.fork() == 0:
+    time.sleep(1000)
+print("done")
+        """,
+        "stdin_stdout": [{"stdin": "", "stdout": "done"}],
+        "language": "python",
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload, timeout=20)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["all_passed"]
+    assert data["exec_outputs"][0]["time_seconds"] < 10
+
+
+def test_profile_and_server_timing():
+    """Test that profile=true adds a timing breakdown and timings are in headers"""
+    response = requests.post(
+        f"{BASE_URL}/execute",
+        json={
+            "code": "print(input())",
+            "stdin_stdout": [{"stdin": "x", "stdout": "x"}],
+            "language": "python",
+            "profile": True,
+        },
+    )
+    assert response.status_code == 200
+    profile = response.json()["profile"]
+    assert "queue" in profile["phases"] and "compile" in profile["phases"]
+    assert set(profile["tests"][0]) >= {"spawn", "stdin_write", "run", "compare"}
+    assert "serialize;dur=" in response.headers["Server-Timing"]
+
+
+@pytest.mark.skipif(ADMIN_TOKEN is not None, reason="admin endpoints enabled")
+def test_admin_profile_disabled():
+    """Test that the admin endpoints are off when no token is configured"""
+    response = requests.get(f"{BASE_URL}/admin/profile", params={"seconds": 1})
+    assert response.status_code == 404
+
+
+@pytest.mark.skipif(ADMIN_TOKEN is None, reason="CODE_EXECUTION_ADMIN_TOKEN unset")
+def test_admin_profile():
+    """Test that the admin profiler returns collapsed stacks of the server"""
+    stop = threading.Event()
+
+    def load():
+        while not stop.is_set():
+            requests.post(
+                f"{BASE_URL}/execute",
+                json={
+                    "code": "print(input())",
+                    "stdin_stdout": [{"stdin": "x", "stdout": "x"}] * 5,
+                    "language": "python",
+                },
+            )
+
+    thread = threading.Thread(target=load)
+    thread.start()
+    try:
+        response = requests.get(
+            f"{BASE_URL}/admin/profile",
+            params={"seconds": 1, "idle": "true"},
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"},
+        )
+    finally:
+        stop.set()
+        thread.join()
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    lines = response.text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert ";" in stack and int(count) > 0
+
+
+def test_compact_response():
+    """Test that response_format=compact returns packed per-test vectors"""
+    from code_execution.results import unpack_bits, unpack_floats
+
+    response = requests.post(
+        f"{BASE_URL}/execute",
+        json={
+            "code": "print(input())",
+            "stdin_stdout": [
+                {"stdin": "a", "stdout": "a"},
+                {"stdin": "b", "stdout": "c"},
+                {"stdin": "d", "stdout": "d"},
+            ],
+            "language": "python",
+            "response_format": "compact",
+        },
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["format"] == "compact" and "exec_outputs" not in data
+    assert not data["all_passed"]
+    assert unpack_bits(data["passed"], data["num_tests"]) == [True, False, True]
+    assert all(t > 0 for t in unpack_floats(data["time_seconds"]))
+
+
+def test_execute_multi():
+    """Test the pass matrix of several candidates run against one test suite"""
+    payload = {
+        "candidates": [
+            {"code": "print(int(input()) * 2)", "language": "python"},
+            {"code": "print(0)", "language": "python"},
+            {"code": "print(int(input()) + 2)", "language": "python"},
+            {"code": "print(1)", "language": "brainfuck"},
+            {"code": CPP_ECHO["code"], "language": "cpp"},
+        ],
+        "stdin_stdout": [{"stdin": str(i), "stdout": str(2 * i)} for i in range(2, 8)],
+        "stop_on_first_failure": True,
+    }
+    response = requests.post(f"{BASE_URL}/execute_multi", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pass_matrix"] == [
+        [True] * 6,
+        [False] * 6,
+        [True] + [False] * 5,
+        [False] * 6,
+        [False] * 6,
+    ]
+    doubled, zero, added, unsupported, echo = data["candidates"]
+    assert doubled["response"]["all_passed"]
+    # output_verbosity defaults to "none": hashes only
+    assert doubled["response"]["exec_outputs"][0]["stdout"] == ""
+    assert doubled["response"]["exec_outputs"][0]["stdout_sha256"]
+    # Tests queued after the first failure are skipped, not run
+    skipped = [output["skipped"] for output in zero["response"]["exec_outputs"]]
+    assert not skipped[0] and any(skipped)
+    assert not added["response"]["exec_outputs"][1]["skipped"]
+    assert unsupported["status_code"] == 400
+    assert len(echo["response"]["exec_outputs"]) == 6
+
+
+def test_execute_multi_output_groups():
+    """Test grouping candidates by normalized output on unlabeled inputs"""
+    payload = {
+        "candidates": [
+            {"code": "print(int(input()) * 2)", "language": "python"},
+            {"code": "print(int(input()) * 2, ' ')\nprint()", "language": "python"},
+            {"code": "n = int(input())\nprint(n * n)", "language": "python"},
+            {"code": "print(", "language": "python"},
+        ],
+        "stdin_stdout": [{"stdin": "2", "stdout": ""}, {"stdin": "3", "stdout": ""}],
+        "group_outputs": True,
+    }
+    response = requests.post(f"{BASE_URL}/execute_multi", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    # 2 * 2 == 2 ** 2 on the first input only
+    first, second = data["output_groups"]
+    assert [group["candidates"] for group in first] == [[0, 1, 2], [3]]
+    assert [group["candidates"] for group in second] == [[0, 1], [2], [3]]
+    assert data["behavior_groups"] == [[0, 1], [2], [3]]
+    # Raw stdout isn't sent back by default
+    assert data["candidates"][0]["response"]["exec_outputs"][0]["stdout"] == ""
@@ -0,0 +1,137 @@
+import requests
+
+from code_execution.function_calls import values_equal
+
+BASE_URL = "http://localhost:8080"
+
+PROGRAM = """
+import time
+
+
+def add(a, b=0):
+    print("adding")
+    if a < 0:
+        raise ValueError("negative")
+    if a == 99:
+        time.sleep(10)
+    return a + b
+
+
+class Solution:
+    def twoSum(self, nums, target):
+        seen = {}
+        for i, n in enumerate(nums):
+            if target - n in seen:
+                return (seen[target - n], i)
+            seen[n] = i
+"""
+
+
+def test_values_equal():
+    """Test structural comparison of return values"""
+    assert values_equal([1, [2.0000000001, {"a": None}]], [1, [2, {"a": None}]])
+    assert not values_equal([1, 2], [1, 2, 3])
+    assert not values_equal(True, 1)
+    assert not values_equal({"a": 1}, {"a": 1, "b": 2})
+    assert not values_equal(0.5, 0.51)
+    assert values_equal("x", "x")
+
+
+def test_function_calls():
+    """Test calls sharing one interpreter, with errors and timeouts per call"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "entry_point": "add",
+        "time_limit_seconds": 1,
+        "function_calls": [
+            {"args": [1, 2], "expected": 3},
+            {"args": [1], "kwargs": {"b": 5}, "expected": 6},
+            {"args": [99], "expected": 99},
+            {"args": [-1], "expected": -1},
+            {"args": [2, 2], "expected": 5},
+            {"args": [3, 3], "expected": 6},
+        ],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    assert [output["passed"] for output in outputs] == [
+        True,
+        True,
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert outputs[0]["stdout"] == "3"
+    assert outputs[0]["stderr"] == "adding\n"
+    # Calls after a timeout run in a fresh interpreter
+    assert outputs[2]["timed_out"]
+    assert "ValueError: negative" in outputs[3]["stderr"]
+    assert outputs[4]["stdout"] == "4"
+
+
+def test_function_calls_method_and_interpreter():
+    """Test a LeetCode-style method entry point under another interpreter"""
+    interpreters = requests.get(f"{BASE_URL}/metrics").json()["python_interpreters"]
+    for interpreter in interpreters:
+        payload = {
+            "code": PROGRAM,
+            "language": "python",
+            "interpreter": interpreter,
+            "entry_point": "Solution.twoSum",
+            "function_calls": [{"args": [[2, 7, 11, 15], 9], "expected": [0, 1]}],
+        }
+        response = requests.post(f"{BASE_URL}/execute", json=payload)
+        assert response.status_code == 200
+        assert response.json()["all_passed"], interpreter
+
+
+def test_function_calls_load_error():
+    """Test that every call fails when the program doesn't load"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "entry_point": "missing",
+        "function_calls": [{"args": [], "expected": None}] * 2,
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    assert not any(output["passed"] for output in outputs)
+    assert "KeyError: 'missing'" in outputs[1]["stderr"]
+
+
+def test_function_calls_unsupported_language():
+    """Test that function-call tests are rejected for other languages"""
+    payload = {
+        "code": "int main() {}",
+        "language": "cpp",
+        "entry_point": "main",
+        "function_calls": [{"args": [], "expected": 0}],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 400
+
+
+def test_function_calls_fresh_instance():
+    """Test that each call of a method gets a new instance of its class"""
+    code = """
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def next(self):
+        self.calls += 1
+        return self.calls
+"""
+    payload = {
+        "code": code,
+        "language": "python",
+        "entry_point": "Counter.next",
+        "function_calls": [{"args": [], "expected": 1}] * 3,
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    assert response.json()["all_passed"]
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+import requests
+
+from code_execution.generated_tests import GeneratedTestCache
+from code_execution.types import GeneratedTests
+
+BASE_URL = "http://localhost:8080"
+
+GENERATOR = """
+import random
+import sys
+
+random.seed(int(sys.argv[1]))
+n = random.randint(1, 5)
+print(n)
+print(*[random.randint(1, 100) for _ in range(n)])
+"""
+REFERENCE = "input()\nprint(sum(map(int, input().split())))"
+
+
+def generator(**overrides) -> dict:
+    spec = {
+        "code": GENERATOR,
+        "language": "python",
+        "seeds": [1, 2, 3],
+        "reference_code": REFERENCE,
+    }
+    return {**spec, **overrides}
+
+
+def test_cache_generates_once(tmp_path):
+    """Test that generated inputs and expected outputs are cached on disk"""
+    cache = GeneratedTestCache(str(tmp_path))
+    tests = cache.expand(GeneratedTests(**generator()))
+    assert len(tests) == 3
+    for test in tests:
+        numbers = test.stdin.split("\n")[1].split()
+        assert int(test.stdout) == sum(map(int, numbers))
+    files = sorted(os.listdir(tmp_path))
+    assert cache.store.stats()["entries"] == 6
+    assert cache.expand(GeneratedTests(**generator())) == tests
+    assert sorted(os.listdir(tmp_path)) == files
+
+
+def test_generator_failure(tmp_path):
+    """Test that a failing generator is reported with its seed"""
+    cache = GeneratedTestCache(str(tmp_path))
+    with pytest.raises(ValueError, match="seed 7"):
+        cache.expand(
+            GeneratedTests(code="import sys\nsys.exit(2)", language="python", seeds=[7])
+        )
+
+
+def test_execute_with_generated_tests():
+    """Test that generated tests run after stdin_stdout and are shared"""
+    payload = {
+        "code": "input()\nprint(sum(map(int, input().split())))",
+        "language": "python",
+        "stdin_stdout": [{"stdin": "2\n1 2", "stdout": "3"}],
+        "generated_tests": generator(seeds=list(range(100, 110))),
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    assert len(response.json()["exec_outputs"]) == 11
+    assert response.json()["all_passed"]
+
+    before = requests.get(f"{BASE_URL}/metrics").json()["counters"]
+    payload["code"] = "input()\nprint(max(map(int, input().split())))"
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert not response.json()["all_passed"]
+    after = requests.get(f"{BASE_URL}/metrics").json()["counters"]
+    assert (
+        after["generated_test_cache_hits"]
+        == before.get("generated_test_cache_hits", 0) + 10
+    )
+
+
+def test_execute_multi_with_generated_tests():
+    """Test grouping candidates on generated inputs without expected outputs"""
+    payload = {
+        "candidates": [
+            {
+                "code": "input()\nprint(sum(map(int, input().split())))",
+                "language": "python",
+            },
+            {
+                "code": "input()\nprint(max(map(int, input().split())))",
+                "language": "python",
+            },
+        ],
+        "generated_tests": generator(reference_code=None),
+        "group_outputs": True,
+    }
+    response = requests.post(f"{BASE_URL}/execute_multi", json=payload)
+    assert response.status_code == 200
+    assert len(response.json()["output_groups"]) == 3
+
+
+def test_generator_compile_error():
+    """Test that a generator that doesn't compile is a bad request"""
+    payload = {
+        "code": "print(1)",
+        "language": "python",
+        "generated_tests": generator(code="int main( {", language="cpp"),
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 400
+
+
+def test_execute_multi_generator_compile_error():
+    """Test that /execute_multi rejects a generator that doesn't compile"""
+    payload = {
+        "candidates": [{"code": "print(1)", "language": "python"}],
+        "generated_tests": generator(code="int main( {", language="cpp"),
+    }
+    response = requests.post(f"{BASE_URL}/execute_multi", json=payload)
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+import requests
+
+BASE_URL = "http://localhost:8080"
+
+# Guess the number in the input file, answering "<", ">" or "=" to each guess
+INTERACTOR = """
+import sys
+
+secret = int(open(sys.argv[1]).read())
+for guesses in range(1, 21):
+    guess = int(input())
+    if guess == secret:
+        print("=", flush=True)
+        print(f"ok, {guesses} guesses", file=sys.stderr)
+        sys.exit(0)
+    print("<" if guess < secret else ">", flush=True)
+print("too many guesses", file=sys.stderr)
+sys.exit(1)
+"""
+
+BINARY_SEARCH = """
+lo, hi = 1, 1000
+while True:
+    mid = (lo + hi) // 2
+    print(mid, flush=True)
+    reply = input()
+    if reply == "=":
+        break
+    if reply == "<":
+        lo = mid + 1
+    else:
+        hi = mid - 1
+"""
+
+
+def interactive_request(code: str, language: str = "python", **interactor) -> dict:
+    return {
+        "code": code,
+        "language": language,
+        "stdin_stdout": [
+            {"stdin": "37", "stdout": ""},
+            {"stdin": "1000", "stdout": ""},
+        ],
+        "time_limit_seconds": 5,
+        "interactor": {"code": INTERACTOR, "language": "python", **interactor},
+    }
+
+
+def test_interactive_accepted():
+    """Test that the interactor's exit status and message are the verdict"""
+    response = requests.post(
+        f"{BASE_URL}/execute", json=interactive_request(BINARY_SEARCH)
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["all_passed"]
+    assert data["exec_outputs"][0]["stdout"].startswith("ok, ")
+
+
+def test_interactive_cpp_submission():
+    """Test a compiled submission talking to a Python interactor"""
+    code = """
+    #include <iostream>
+
+    int main() {
+        int lo = 1, hi = 1000;
+        std::string reply;
+        while (true) {
+            int mid = (lo + hi) / 2;
+            std::cout << mid << std::endl;
+            std::cin >> reply;
+            if (reply == "=") return 0;
+            if (reply == "<") lo = mid + 1; else hi = mid - 1;
+        }
+    }
+    """
+    response = requests.post(
+        f"{BASE_URL}/execute", json=interactive_request(code, "cpp")
+    )
+    assert response.status_code == 200
+    assert response.json()["all_passed"]
+
+
+def test_interactive_wrong_answer():
+    """Test that a submission the interactor rejects fails"""
+    code = "while True:\n    print(1, flush=True)\n    input()"
+    response = requests.post(f"{BASE_URL}/execute", json=interactive_request(code))
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    assert not outputs[0]["passed"]
+    assert not outputs[0]["timed_out"]
+    assert outputs[0]["stdout"] == "too many guesses\n"
+
+
+def test_interactive_cpu_time_limit():
+    """Test that a busy submission is stopped by its CPU limit, not the wall limit"""
+    request = interactive_request(
+        "while True:\n    pass", program_cpu_time_limit_seconds=0.5
+    )
+    request["stdin_stdout"] = request["stdin_stdout"][:1]
+    response = requests.post(f"{BASE_URL}/execute", json=request)
+    assert response.status_code == 200
+    output = response.json()["exec_outputs"][0]
+    assert output["timed_out"]
+    assert output["time_seconds"] < 4.5
+
+
+def test_interactor_compile_error():
+    """Test that an interactor that doesn't compile is a bad request"""
+    request = interactive_request(BINARY_SEARCH)
+    request["interactor"] = {"code": "int main( {", "language": "cpp"}
+    response = requests.post(f"{BASE_URL}/execute", json=request)
+    assert response.status_code == 400
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from code_execution.job_queue import JobQueue, JobWorker
+from code_execution.types import CodeExecutionRequest
+
+ECHO = CodeExecutionRequest(
+    code="print(input())",
+    stdin_stdout=[{"stdin": "hello", "stdout": "hello"}],
+    language="python",
+)
+
+
+def test_worker_runs_job(tmp_path):
+    """Test that a worker pulls a job, executes it and pushes the result"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"))
+    job_id = job_queue.submit(ECHO)
+    assert job_queue.get(job_id).status == "queued"
+
+    stop = threading.Event()
+    worker = JobWorker(job_queue, "worker-a", poll_interval_seconds=0.01)
+    thread = threading.Thread(target=worker.run_forever, args=(stop,))
+    thread.start()
+    try:
+        status = job_queue.wait(job_id, timeout=30)
+    finally:
+        stop.set()
+        thread.join()
+    assert status.status == "done"
+    assert status.worker_id == "worker-a"
+    assert status.response.all_passed
+
+
+def test_expired_lease_is_retried(tmp_path):
+    """Test that a job held by a dead worker is retried by another worker"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.2)
+    job_id = job_queue.submit(ECHO)
+    assert job_queue.claim("dead-worker")[0] == job_id
+    assert job_queue.claim("worker-b") is None
+
+    time.sleep(0.3)
+    claimed = job_queue.claim("worker-b")
+    assert claimed is not None and claimed[0] == job_id
+    status = job_queue.get(job_id)
+    assert status.attempts == 2
+    assert status.worker_id == "worker-b"
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    """Test that a job is failed once it runs out of attempts"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"), max_attempts=1)
+    job_id = job_queue.submit(ECHO)
+    job_queue.claim("worker-a")
+    job_queue.fail(job_id, "worker-a", "boom")
+    status = job_queue.get(job_id)
+    assert status.status == "failed"
+    assert status.error == "boom"
+
+
+def test_bad_request_is_not_retried(tmp_path):
+    """Test that a request error fails the job on its first attempt"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"))
+    job_id = job_queue.submit(ECHO.model_copy(update={"language": "brainfuck"}))
+    assert JobWorker(job_queue, "worker-a").run_once()
+    status = job_queue.get(job_id)
+    assert status.status == "failed"
+    assert status.attempts == 1
+
+
+def test_affinity_routes_repeat_to_same_worker(tmp_path):
+    """Test that a repeat of the same code waits for the worker that ran it"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"), affinity_wait_seconds=60)
+    first = job_queue.submit(ECHO)
+    assert job_queue.claim("worker-a")[0] == first
+
+    repeat = job_queue.submit(ECHO)
+    other = job_queue.submit(ECHO.model_copy(update={"code": "print(input()) "}))
+    # worker-b may take unrelated work but not the repeat
+    assert job_queue.claim("worker-b")[0] == other
+    assert job_queue.claim("worker-b") is None
+    assert job_queue.claim("worker-a")[0] == repeat
@@ -0,0 +1,115 @@
+import pytest
+import requests
+
+from code_execution.languages.java import entry_class_name, main_class_name
+
+BASE_URL = "http://localhost:8080"
+
+SUM_PROGRAMS = {
+    "java": """
+import java.util.Scanner;
+
+public class Solution {
+    public static void main(String[] args) {
+        Scanner scanner = new Scanner(System.in);
+        long a = scanner.nextLong(), b = scanner.nextLong();
+        System.out.println(a + b);
+    }
+}
+""",
+    "go": """
+package main
+
+import "fmt"
+
+func main() {
+	var a, b int64
+	fmt.Scan(&a, &b)
+	fmt.Println(a + b)
+}
+""",
+    "rust": """
+use std::io::Read;
+
+fn main() {
+    let mut input = String::new();
+    std::io::stdin().read_to_string(&mut input).unwrap();
+    let sum: i64 = input.split_whitespace().map(|x| x.parse::<i64>().unwrap()).sum();
+    println!("{}", sum);
+}
+""",
+}
+
+
+def available_languages():
+    return {
+        language
+        for language, error in requests.get(f"{BASE_URL}/ready")
+        .json()["languages"]
+        .items()
+        if error is None
+    }
+
+
+@pytest.mark.parametrize("language", sorted(SUM_PROGRAMS))
+def test_sum_two_numbers(language):
+    """Test addition of two numbers in each compiled language"""
+    payload = {
+        "code": SUM_PROGRAMS[language],
+        "stdin_stdout": [
+            {"stdin": "5 7", "stdout": "12"},
+            {"stdin": "10 -3", "stdout": "7"},
+        ],
+        "language": language,
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    if language not in available_languages():
+        assert response.status_code == 503
+        pytest.skip(f"{language} toolchain is not installed")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["compile_output"]["passed"], data["compile_output"]["stderr"]
+    assert data["all_passed"]
+
+
+@pytest.mark.parametrize("language", sorted(SUM_PROGRAMS))
+def test_compile_error(language):
+    """Test that compiler errors come back in compile_output"""
+    if language not in available_languages():
+        pytest.skip(f"{language} toolchain is not installed")
+    payload = {
+        "code": "this does not compile",
+        "stdin_stdout": [{"stdin": "", "stdout": ""}],
+        "language": language,
+    }
+    data = requests.post(f"{BASE_URL}/execute", json=payload).json()
+    assert not data["compile_output"]["passed"]
+    assert data["compile_output"]["stderr"]
+    assert data["exec_outputs"] == []
+
+
+def test_java_main_class_name():
+    """Test that the Java source file is named after the right class"""
+    assert main_class_name("public class Solution { }") == "Solution"
+    assert (
+        main_class_name("class A {}\nclass B { static void main(String[] a) {} }")
+        == "B"
+    )
+    assert main_class_name("// no classes") == "Main"
+
+
+def test_java_entry_class_name():
+    """Test that the jar's Main-Class is the class that declares main()"""
+    code = """
+// class Fake { public static void main(String[] args) {} }
+public class Solution {
+    String braces() { return "}{ class X"; }
+}
+class Main {
+    static class Helper {}
+    public static void main(String[] args) {}
+}
+"""
+    assert main_class_name(code) == "Solution"
+    assert entry_class_name(code) == "Main"
+    assert entry_class_name("public class Solution { }") is None
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+import requests
+
+from code_execution.languages.cpp import CppHandler
+from code_execution.page_cache import PinnedFiles, shared_libraries
+from code_execution.types import StdinStdout
+
+BASE_URL = "http://localhost:8080"
+
+PROGRAM = """
+#include <bits/stdc++.h>
+int main() {
+    int n;
+    std::cin >> n;
+    std::cout << n * 2 << std::endl;
+}
+"""
+
+
+@pytest.mark.parametrize("link", ["dynamic", "static-libstdc++", "static"])
+def test_link_modes(link, tmp_path):
+    """Test each link mode builds a working program with the expected libraries"""
+    handler = CppHandler(binary_cache_dir=None, link=link)
+    executable = str(tmp_path / "program")
+    assert handler.compile(PROGRAM, executable).passed
+    assert handler.run_test(executable, StdinStdout(stdin="21", stdout="42")).passed
+    libraries = [os.path.basename(path) for path in shared_libraries(executable)]
+    if link == "static":
+        assert libraries == []
+    else:
+        assert any(name.startswith("libc.so") for name in libraries)
+        has_libstdcxx = any(name.startswith("libstdc++") for name in libraries)
+        assert has_libstdcxx == (link == "dynamic")
+
+
+def test_unknown_link_mode():
+    with pytest.raises(ValueError, match="prelink"):
+        CppHandler(binary_cache_dir=None, link="prelink")
+
+
+def test_pin(tmp_path):
+    """Test pinning a file once and skipping files that can't be pinned"""
+    path = tmp_path / "library.so"
+    path.write_bytes(b"\0" * 10000)
+    pinned = PinnedFiles()
+    if not pinned.pin(str(path)):
+        pytest.skip("mlock not permitted")
+    assert pinned.pin(str(path))
+    assert pinned.stats() == {"files": [str(path)], "bytes": 10000}
+    assert not pinned.pin(str(tmp_path / "missing.so"))
+
+
+def test_launch_metrics():
+    """Test the startup latency and per-test spawn times in /metrics"""
+    payload = {
+        "code": PROGRAM,
+        "language": "cpp",
+        "stdin_stdout": [{"stdin": "1", "stdout": "2"}],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    snapshot = requests.get(f"{BASE_URL}/metrics").json()
+    assert snapshot["cpp_launch"]["startup_seconds"] > 0
+    assert snapshot["cpp_launch"]["link"] in ("dynamic", "static-libstdc++", "static")
+    assert snapshot["timings"]["cpp_spawn"]["count"] >= 1
@@ -5,6 +5,7 @@ import json
 import asyncio
 import aiohttp
 from typing import List, Dict, Any
+from code_execution.client import CodeExecutionClient
 
 # Load the same CodeContests dataset
 dataset = datasets.load_dataset("deepmind/code_contests", trust_remote_code=True)
@@ -115,6 +116,32 @@ async def run_parallel():
     
     return elapsed, total_passed
 
+# Parallel execution with the pooling, batching client
+async def run_client():
+    print("\nRunning parallel tests with CodeExecutionClient")
+    print("-" * 60)
+
+    start_time = time.time()
+
+    async with CodeExecutionClient("http://localhost:8080") as client:
+        results = await asyncio.gather(
+            *(client.execute(test_data) for test_data in problems),
+            return_exceptions=True,
+        )
+
+    elapsed = time.time() - start_time
+    total_passed = 0
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"  Test {i+1}: Error - {str(result)}")
+        elif result.all_passed:
+            total_passed += 1
+
+    print(f"\nClient execution completed in {elapsed:.2f} seconds")
+    print(f"Tests passed: {total_passed}/{len(problems)}")
+
+    return elapsed, total_passed
+
 async def main():
     print("Comparing sequential vs parallel execution performance")
     print("=" * 80)
@@ -124,15 +151,24 @@ async def main():
     
     # Run parallel tests
     parallel_time, parallel_passed = await run_parallel()
+
+    # Run parallel tests through the client
+    client_time, client_passed = await run_client()
     
     # Print summary
     print("\nPerformance Comparison")
     print("=" * 80)
     print(f"Sequential execution: {seq_time:.2f} seconds, {seq_passed}/{len(problems)} tests passed")
     print(f"Parallel execution:   {parallel_time:.2f} seconds, {parallel_passed}/{len(problems)} tests passed")
+    print(
+        f"Client execution:     {client_time:.2f} seconds, "
+        f"{client_passed}/{len(problems)} tests passed"
+    )
     
     speedup = seq_time / parallel_time if parallel_time > 0 else float('inf')
     print(f"Speedup factor: {speedup:.2f}x")
+    client_speedup = seq_time / client_time if client_time > 0 else float('inf')
+    print(f"Client speedup factor: {client_speedup:.2f}x")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,25 @@
+import sys
+import time
+
+from code_execution.process import run_process
+
+# Reads a little of stdin, fills its stdout pipe, then echoes the rest, so the
+# server has to keep reading stdout while it is still feeding stdin
+ECHO = """
+import os
+import sys
+
+head = os.read(0, 8192)
+sys.stdout.buffer.write(b"x" * (1 << 20))
+sys.stdout.buffer.write(head + sys.stdin.buffer.read())
+"""
+
+
+def test_large_stdin_echo():
+    """Test that a program that writes before reading all of stdin can't stall"""
+    stdin = "0123456789abcdef\n" * (1 << 18)
+    start = time.monotonic()
+    result = run_process([sys.executable, "-c", ECHO], stdin, timeout=3)
+    assert time.monotonic() - start < 3
+    assert not result.timed_out
+    assert result.stdout == "x" * (1 << 20) + stdin
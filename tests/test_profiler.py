@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from code_execution.profiler import ProfilerBusyError, SamplingProfiler, profile
+
+
+def busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_collapsed_stacks():
+    """Test that a busy thread shows up in the collapsed stacks"""
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    thread.start()
+    try:
+        profiler = SamplingProfiler(interval_seconds=0.005)
+        profiler.run(0.3)
+    finally:
+        stop.set()
+        thread.join()
+    assert profiler.sample_count > 10
+    lines = profiler.collapsed().splitlines()
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    assert "busy_loop (test_profiler.py:" in stack.split(";")[-1]
+    assert int(count) > 0
+
+
+def test_idle_threads_are_skipped():
+    """Test that threads blocked on an event are left out unless asked for"""
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, name="idle")
+    thread.start()
+    try:
+        quiet = SamplingProfiler()
+        quiet.sample()
+        noisy = SamplingProfiler(include_idle=True)
+        noisy.sample()
+    finally:
+        stop.set()
+        thread.join()
+    assert not any(stack.startswith("idle;") for stack in quiet.samples)
+    assert any(stack.startswith("idle;") for stack in noisy.samples)
+
+
+def test_one_profile_at_a_time():
+    """Test that a second concurrent profile is rejected"""
+    thread = threading.Thread(target=profile, args=(0.5,))
+    thread.start()
+    try:
+        threading.Event().wait(0.1)
+        with pytest.raises(ProfilerBusyError):
+            profile(0.1)
+    finally:
+        thread.join()
@@ -200,3 +200,128 @@ print(json.dumps(result))
     assert len(data["exec_outputs"]) == 2
     for output in data["exec_outputs"]:
         assert output["passed"]
+
+def test_time_limit_python():
+    """Test that a per-test time limit overrides the default timeout"""
+    payload = {
+        "code": """
+while True:
+    pass  # Infinite loop
+        """,
+        "stdin_stdout": [
+            {"stdin": "", "stdout": ""},
+        ],
+        "language": "python",
+        "time_limit_seconds": 1,
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["exec_outputs"][0]["timed_out"]
+    assert data["exec_outputs"][0]["time_seconds"] < 5
+
+def test_time_budget_python():
+    """Test that tests past the total time budget are skipped"""
+    payload = {
+        "code": """
+while True:
+    pass  # Infinite loop
+        """,
+        "stdin_stdout": [{"stdin": "", "stdout": ""}] * 10,
+        "language": "python",
+        "time_limit_seconds": 1,
+        "total_time_budget_seconds": 2.5,
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["exec_outputs"]) == 10
+    assert data["exec_outputs"][0]["timed_out"]
+    assert data["exec_outputs"][-1]["skipped"]
+    assert sum(output["skipped"] for output in data["exec_outputs"]) >= 7
+
+def test_adaptive_timeout_python():
+    """Test that timeouts scale with a reference solution's runtime"""
+    payload = {
+        "code": """
+import time
+time.sleep(3)
+print(input())
+        """,
+        "stdin_stdout": [
+            {"stdin": "1", "stdout": "1"},
+        ],
+        "language": "python",
+        "adaptive_timeout": {
+            "reference_code": "print(input())",
+            "multiplier": 2,
+            "min_seconds": 0.5,
+        },
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["exec_outputs"][0]["timed_out"]
+    assert data["exec_outputs"][0]["time_seconds"] < 2.5
+
+def test_output_verbosity_python():
+    """Test that output_verbosity trims echoed output and adds its hash"""
+    import hashlib
+
+    stdout = "x" * 1000 + "\n"
+    payload = {
+        "code": "print('x' * 1000)\nprint('oops', file=__import__('sys').stderr)",
+        "stdin_stdout": [
+            {"stdin": "", "stdout": "x" * 1000},
+            {"stdin": "", "stdout": "y"},
+        ],
+        "language": "python",
+    }
+    expected_hash = hashlib.sha256(stdout.encode()).hexdigest()
+
+    data = requests.post(f"{BASE_URL}/execute", json=payload).json()
+    assert data["exec_outputs"][0]["stdout"] == stdout
+    assert data["exec_outputs"][0]["stdout_sha256"] is None
+
+    payload["output_verbosity"] = "failures_only"
+    passed, failed = requests.post(f"{BASE_URL}/execute", json=payload).json()[
+        "exec_outputs"
+    ]
+    assert passed["passed"] and passed["stdout"] == "" and passed["truncated"]
+    assert passed["stdout_sha256"] == expected_hash
+    assert not failed["passed"] and failed["stdout"] == stdout
+    assert failed["stderr"] == "oops\n"
+
+    payload["output_verbosity"] = "truncated:10"
+    outputs = requests.post(f"{BASE_URL}/execute", json=payload).json()["exec_outputs"]
+    assert all(output["stdout"] == "x" * 10 for output in outputs)
+    assert all(output["stdout_sha256"] == expected_hash for output in outputs)
+
+    payload["output_verbosity"] = "none"
+    outputs = requests.post(f"{BASE_URL}/execute", json=payload).json()["exec_outputs"]
+    assert all(output["stdout"] == output["stderr"] == "" for output in outputs)
+
+    payload["output_verbosity"] = "some"
+    assert requests.post(f"{BASE_URL}/execute", json=payload).status_code == 422
+
+def test_interpreter_selection_python():
+    """Test that each detected interpreter can be picked per request"""
+    interpreters = requests.get(f"{BASE_URL}/metrics").json()["python_interpreters"]
+    assert "python3" in interpreters
+    for name, version in interpreters.items():
+        payload = {
+            "code": "import platform\n"
+            "print(platform.python_implementation(), platform.python_version())",
+            "stdin_stdout": [{"stdin": "", "stdout": version}],
+            "language": "python",
+            "interpreter": name,
+        }
+        response = requests.post(f"{BASE_URL}/execute", json=payload)
+        assert response.status_code == 200
+        assert response.json()["all_passed"], name
+
+    payload["interpreter"] = "python2.7"
+    assert requests.post(f"{BASE_URL}/execute", json=payload).status_code == 400
+    payload["language"] = "cpp"
+    payload["interpreter"] = "python3"
+    assert requests.post(f"{BASE_URL}/execute", json=payload).status_code == 400
@@ -0,0 +1,107 @@
+import requests
+
+from code_execution.results import unpack_bits
+
+BASE_URL = "http://localhost:8080"
+
+PROGRAM = """
+import random
+import time
+
+n = int(input())
+if n == 1:
+    print("wrong")
+elif n == 2:
+    # Passes about half of the time
+    print(2 if random.SystemRandom().random() < 0.5 else "unlucky")
+elif n == 3:
+    time.sleep(0.8)
+    print(3)
+else:
+    print(n)
+"""
+
+TESTS = [
+    {"stdin": "0", "stdout": "0"},
+    {"stdin": "1", "stdout": "1"},
+    {"stdin": "2", "stdout": "2"},
+    {"stdin": "3", "stdout": "3"},
+]
+
+
+def test_reruns():
+    """Test failed and borderline tests are re-run, and flaky ones flagged"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "time_limit_seconds": 1,
+        "reruns": {"count": 10, "borderline_fraction": 0.7},
+        "stdin_stdout": [TESTS[0], TESTS[1], TESTS[3]],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    # Passed quickly: run once
+    assert outputs[0]["passed"] and outputs[0]["runs"] is None
+    # Consistently wrong
+    assert outputs[1]["runs"] == 11 and outputs[1]["flaky"] is False
+    # Borderline: close to the time limit, but consistently passing
+    assert outputs[2]["passed"] and outputs[2]["runs"] == 11
+    assert outputs[2]["flaky"] is False
+    assert 0.8 <= outputs[2]["min_time_seconds"] <= outputs[2]["median_time_seconds"]
+
+
+def test_reruns_within_budget():
+    """Test re-runs don't overrun the request's total time budget"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "time_limit_seconds": 1,
+        "total_time_budget_seconds": 1.5,
+        "reruns": {"count": 10, "borderline_fraction": 0.7},
+        "stdin_stdout": [TESTS[3]],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    output = response.json()["exec_outputs"][0]
+    assert output["passed"]
+    # One 0.8s re-run at most fits in what is left of the budget
+    assert output["runs"] <= 2
+    assert output["flaky"] is False
+
+
+def test_flaky():
+    """Test tests whose verdict changes between runs are flagged flaky"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "time_limit_seconds": 1,
+        # Every test is borderline, so each is re-run whatever its first verdict
+        "reruns": {"count": 10, "borderline_fraction": 0.001},
+        "stdin_stdout": TESTS[:3],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    assert [output["runs"] for output in outputs] == [11, 11, 11]
+    assert [output["flaky"] for output in outputs] == [False, False, True]
+
+
+def test_reruns_compact():
+    """Test compact responses carry the flaky bitset"""
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "time_limit_seconds": 1,
+        "reruns": {"count": 10, "borderline_fraction": 0.001},
+        "response_format": "compact",
+        "stdin_stdout": TESTS[:3],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert unpack_bits(data["flaky"], 3) == [False, False, True]
+
+    payload["reruns"] = None
+    data = requests.post(f"{BASE_URL}/execute", json=payload).json()
+    assert data["flaky"] is None
@@ -0,0 +1,38 @@
+from code_execution.results import ResultBuffer, unpack_bits, unpack_floats
+from code_execution.types import CompactExecutionResponse, Output, RunResult
+
+COMPILED = Output(passed=True, stdout="", stderr="", time_seconds=0, timed_out=False)
+
+
+def result(passed: bool, time_seconds: float, timed_out: bool = False) -> RunResult:
+    return RunResult(
+        passed=passed,
+        stdout="out",
+        stderr="",
+        time_seconds=time_seconds,
+        timed_out=timed_out,
+    )
+
+
+def test_compact_round_trip():
+    """Test that packed vectors decode back to the per-test results"""
+    buffer = ResultBuffer(10, keep_outputs=False)
+    for i in range(10):
+        buffer.set(i, result(i % 3 != 0, i * 0.5, timed_out=i == 9))
+    response = buffer.response(COMPILED, "compact")
+    assert isinstance(response, CompactExecutionResponse)
+    assert not response.all_passed
+    assert unpack_bits(response.passed, 10) == [i % 3 != 0 for i in range(10)]
+    assert unpack_bits(response.timed_out, 10) == [i == 9 for i in range(10)]
+    assert unpack_bits(response.skipped, 10) == [False] * 10
+    assert unpack_floats(response.time_seconds) == [i * 0.5 for i in range(10)]
+
+
+def test_default_response_keeps_outputs():
+    """Test that the default format still returns one Output per test"""
+    buffer = ResultBuffer(2)
+    buffer.set(0, result(True, 0.1))
+    buffer.set(1, result(True, 0.2))
+    response = buffer.response(COMPILED)
+    assert response.all_passed
+    assert [output.stdout for output in response.exec_outputs] == ["out", "out"]
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import time
+
+from code_execution.shared_cache import SharedCache
+
+BUILD_ONCE = """
+import sys, time
+from code_execution.shared_cache import SharedCache
+cache = SharedCache("test", sys.argv[1], 1 << 20)
+with cache.single_flight("key"):
+    if cache.read("key") is None:
+        with open(sys.argv[2], "a") as builds:
+            builds.write("built\\n")
+        time.sleep(0.5)
+        cache.write("key", b"value")
+print(cache.read("key").decode())
+"""
+
+
+def test_publish_and_fetch(tmp_path):
+    """Test entries are published whole and handed out as links"""
+    cache = SharedCache("test", str(tmp_path / "cache"), 1 << 20)
+    assert cache.read("key") is None
+    assert not cache.fetch("key", str(tmp_path / "missing"))
+
+    source = tmp_path / "program"
+    source.write_bytes(b"binary")
+    cache.publish("key", str(source))
+    assert cache.fetch("key", str(tmp_path / "copy"))
+    assert (tmp_path / "copy").read_bytes() == b"binary"
+    assert cache.read("key") == b"binary"
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+    assert cache.stats() == {"entries": 1, "bytes": 6, "max_bytes": 1 << 20}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """Test the least recently used entries go once the size bound is passed"""
+    cache = SharedCache("test", str(tmp_path), 250)
+    cache.write("a", b"a" * 100)
+    time.sleep(0.01)
+    cache.write("b", b"b" * 100)
+    time.sleep(0.01)
+    # Reading a makes b the least recently used
+    assert cache.read("a") is not None
+    time.sleep(0.01)
+    cache.write("c", b"c" * 100)
+    assert cache.read("b") is None
+    assert cache.read("a") is not None and cache.read("c") is not None
+    assert cache.stats()["bytes"] == 200
+
+
+def test_single_flight_across_processes(tmp_path):
+    """Test concurrent misses in several processes build the entry once"""
+    cache_dir = tmp_path / "cache"
+    builds = tmp_path / "builds"
+    env = {**os.environ, "PYTHONPATH": "src"}
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", BUILD_ONCE, str(cache_dir), str(builds)],
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        for _ in range(4)
+    ]
+    outputs = [process.communicate()[0] for process in processes]
+    assert outputs == [b"value\n"] * 4
+    assert builds.read_text() == "built\n"
+    # Lock files are removed by whoever held them last
+    assert os.listdir(cache_dir / "locks") == []
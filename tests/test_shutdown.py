@@ -0,0 +1,163 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from code_execution.job_queue import JobQueue
+from code_execution import process, shutdown
+from code_execution.process import ProcessReaper, spawn
+from code_execution.shutdown import Drain, ShuttingDownError
+from code_execution.types import CodeExecutionRequest
+
+PORT = 8091
+BASE_URL = f"http://localhost:{PORT}"
+
+
+def _sleeper(seconds):
+    return {
+        "code": f"import time\ntime.sleep({seconds})\nprint('ok')",
+        "language": "python",
+        "time_limit_seconds": 60,
+        "stdin_stdout": [{"stdin": "", "stdout": "ok"}],
+    }
+
+
+def test_admit_rejects_while_draining(tmp_path):
+    """Test requests are refused once draining, and running ones finish"""
+    drain = Drain(str(tmp_path), drain_seconds=5)
+    with drain.admit():
+        drain.begin()
+        assert drain.draining
+        with pytest.raises(ShuttingDownError):
+            with drain.admit():
+                pass
+    assert drain.wait(0) and drain.running == 0
+
+
+def test_sweep_removes_leftovers_of_dead_workers(tmp_path):
+    """Test unlocked workspaces and stale cache temp files are removed"""
+    workspaces = tmp_path / "workspaces"
+    drain = Drain(str(workspaces))
+    # Ours, locked for as long as this process lives
+    live = os.path.dirname(drain.workspace())
+    # A killed worker's, whatever its pid: nobody holds its lock
+    (workspaces / f"{os.getpid()}-dead" / "tmp1").mkdir(parents=True)
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    (cache / "key").write_text("kept")
+    stale = cache / "key.1234.5678.tmp"
+    stale.write_text("partial")
+    os.utime(stale, (time.time() - 3600, time.time() - 3600))
+    (cache / f"key.{os.getpid()}.1234.tmp").write_text("being written")
+
+    assert Drain(str(workspaces)).sweep([str(cache)]) == 2
+    assert os.listdir(workspaces) == [os.path.basename(live)]
+    assert sorted(os.listdir(cache)) == ["key", f"key.{os.getpid()}.1234.tmp"]
+
+
+def test_abort_keeps_finished_requests(tmp_path, monkeypatch):
+    """Test only requests that lost a program to the deadline fail"""
+    # A reaper of its own, since aborting closes it for good
+    reaper = ProcessReaper()
+    monkeypatch.setattr(process, "reaper", reaper)
+    monkeypatch.setattr(shutdown, "reaper", reaper)
+    drain = Drain(str(tmp_path), drain_seconds=0.2)
+    started = threading.Event()
+
+    def run(command):
+        program = spawn(command, None, None, None)
+        reaper.track(program.pid)
+        started.set()
+        program.wait()
+        reaper.release(program.pid)
+
+    failures = []
+
+    def slow_request():
+        try:
+            with drain.admit():
+                run(["sleep", "30"])
+        except ShuttingDownError as e:
+            failures.append(e)
+
+    slow = threading.Thread(target=slow_request)
+    slow.start()
+    started.wait()
+    with drain.admit():
+        drain.begin()
+        # Runs its program to completion, then outlives the deadline
+        run(["true"])
+        time.sleep(0.5)
+    slow.join(timeout=10)
+    assert len(failures) == 1 and drain.wait(0)
+
+
+def test_released_job_keeps_its_attempts(tmp_path):
+    """Test a job given back at shutdown is queued again at no attempt's cost"""
+    job_queue = JobQueue(str(tmp_path / "queue.db"), max_attempts=1)
+    job_id = job_queue.submit(CodeExecutionRequest(**_sleeper(0)))
+    job_queue.claim("worker-a")
+    job_queue.release(job_id, "worker-a")
+    status = job_queue.get(job_id)
+    assert status.status == "queued" and status.attempts == 0
+    assert job_queue.claim("worker-b")[0] == job_id
+
+
+def test_sigterm_drains_requests(tmp_path):
+    """Test SIGTERM lets short requests finish and cuts long ones short"""
+    env = {
+        **os.environ,
+        "PYTHONPATH": "src",
+        "CODE_EXECUTION_DRAIN_SECONDS": "3",
+        "CODE_EXECUTION_WORKSPACE_DIR": str(tmp_path),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f"{BASE_URL}/ready", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            assert time.monotonic() < deadline
+            time.sleep(0.2)
+
+        responses = {}
+
+        def post(name, seconds):
+            responses[name] = requests.post(
+                f"{BASE_URL}/execute", json=_sleeper(seconds)
+            )
+
+        threads = [
+            threading.Thread(target=post, args=("short", 1)),
+            threading.Thread(target=post, args=("long", 30)),
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        server.send_signal(signal.SIGTERM)
+        for thread in threads:
+            thread.join(timeout=20)
+        assert server.wait(timeout=10) is not None
+    finally:
+        server.kill()
+        server.wait()
+
+    assert responses["short"].status_code == 200
+    assert responses["short"].json()["all_passed"]
+    assert responses["long"].status_code == 503
+    assert responses["long"].headers["Retry-After"] == "1"
+    # The worker removed its workspaces on the way out
+    assert os.listdir(tmp_path) == []
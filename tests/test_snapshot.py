@@ -0,0 +1,105 @@
+import time
+
+import requests
+
+BASE_URL = "http://localhost:8080"
+
+# Slow setup before the first read; each test must see it done exactly once.
+# The setup has to fit in the request's time limit.
+PROGRAM = """
+import sys
+import time
+
+time.sleep(0.5)
+table = [i * i for i in range(1000)]
+print("ready")
+input = sys.stdin.readline
+n = int(input())
+if n < 0:
+    raise ValueError(n)
+if n == 99:
+    while True:
+        pass
+print(table[n])
+"""
+
+
+def _counter(name):
+    counters = requests.get(f"{BASE_URL}/metrics").json()["counters"]
+    return counters.get(name, 0)
+
+
+def test_snapshot():
+    """Test tests restored from one snapshot, with failures and timeouts per test"""
+    restores = _counter("snapshot_restores")
+    payload = {
+        "code": PROGRAM,
+        "language": "python",
+        "snapshot": True,
+        "time_limit_seconds": 1,
+        "stdin_stdout": [
+            {"stdin": "2\n", "stdout": "ready\n4\n"},
+            {"stdin": "3\n", "stdout": "ready\n9\n"},
+            {"stdin": "99\n", "stdout": ""},
+            {"stdin": "-1\n", "stdout": ""},
+            {"stdin": "4\n", "stdout": "ready\n15\n"},
+        ],
+    }
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    outputs = response.json()["exec_outputs"]
+    assert [output["passed"] for output in outputs] == [
+        True,
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert outputs[2]["timed_out"]
+    assert "ValueError: -1" in outputs[3]["stderr"]
+    assert outputs[4]["stdout"] == "ready\n16\n"
+    assert _counter("snapshot_restores") - restores == 5
+
+
+def test_snapshot_setup_time_limit():
+    """Test that the setup is cut off at the request's time limit"""
+    fallbacks = _counter("snapshot_fallbacks")
+    payload = {
+        "code": "while True:\n    pass",
+        "language": "python",
+        "snapshot": True,
+        "time_limit_seconds": 0.5,
+        "stdin_stdout": [{"stdin": "1\n", "stdout": "1"}],
+    }
+    started = time.monotonic()
+    response = requests.post(f"{BASE_URL}/execute", json=payload)
+    assert response.status_code == 200
+    assert response.json()["exec_outputs"][0]["timed_out"]
+    # The setup and the normal run it falls back to, not the default limit
+    assert time.monotonic() - started < 5
+    assert _counter("snapshot_fallbacks") - fallbacks == 1
+
+
+def test_snapshot_fallback():
+    """Test programs that can't be snapshotted run normally"""
+    fallbacks = _counter("snapshot_fallbacks")
+    programs = [
+        # Finishes without reading stdin
+        ("print(42)", "42"),
+        # Reads the file descriptor directly, bypassing sys.stdin
+        ("import os\nprint(os.read(0, 100).decode().strip())", "7"),
+    ]
+    for code, expected in programs:
+        payload = {
+            "code": code,
+            "language": "python",
+            "snapshot": True,
+            "stdin_stdout": [
+                {"stdin": "7\n", "stdout": expected},
+                {"stdin": "7\n", "stdout": expected},
+            ],
+        }
+        response = requests.post(f"{BASE_URL}/execute", json=payload)
+        assert response.status_code == 200
+        assert response.json()["all_passed"]
+    assert _counter("snapshot_fallbacks") - fallbacks == 4
@@ -0,0 +1,96 @@
+import json
+import time
+
+import pytest
+
+from code_execution import tracing
+from code_execution.execution import execute_request
+from code_execution.types import CodeExecutionRequest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+
+ECHO = CodeExecutionRequest(
+    code="print(input())",
+    stdin_stdout=[{"stdin": "a", "stdout": "a"}, {"stdin": "b", "stdout": "b"}],
+    language="python",
+    profile=True,
+)
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    tracing.configure(exporter)
+    yield exporter
+    tracing.configure(None)
+
+
+def test_profile_breakdown(exporter):
+    """Test that a profiled request reports its phases and per-test spans"""
+    response = execute_request(ECHO, received_at=time.perf_counter())
+    profile = response.profile
+    assert profile is not None
+    for phase in ("queue", "tempdir", "compile", "tests", "cleanup"):
+        assert phase in profile.phases
+    assert len(profile.tests) == 2
+    for test in profile.tests:
+        for phase in ("spawn", "stdin_write", "run", "compare", "total"):
+            assert test[phase] >= 0
+        assert test["run"] <= test["total"]
+    assert profile.total_seconds >= profile.phases["tests"]
+
+
+def test_spans_are_exported(exporter):
+    """Test that the same phases are exported as nested OpenTelemetry spans"""
+    execute_request(ECHO)
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert {"execute", "compile", "test", "spawn", "run", "compare"} <= set(spans)
+    assert spans["test"].parent.span_id == spans["tests"].context.span_id
+    assert spans["tests"].parent.span_id == spans["execute"].context.span_id
+    assert spans["execute"].attributes["language"] == "python"
+
+
+def test_rerun_spans_stay_in_trace(exporter):
+    """Test that spans of re-runs on the rerun pool keep the request's trace"""
+    failing = CodeExecutionRequest(
+        code=ECHO.code,
+        stdin_stdout=[{"stdin": "a", "stdout": "b"}],
+        language="python",
+        profile=True,
+        reruns={"count": 2},
+    )
+    response = execute_request(failing)
+    spans = exporter.get_finished_spans()
+    (execute,) = [span for span in spans if span.name == "execute"]
+    (reruns,) = [span for span in spans if span.name == "reruns"]
+    assert {span.context.trace_id for span in spans} == {execute.context.trace_id}
+    rerun_spawns = [
+        span
+        for span in spans
+        if span.name == "spawn" and span.parent.span_id == reruns.context.span_id
+    ]
+    assert len(rerun_spawns) == 2
+    assert response.profile.phases["tests.reruns.spawn"] > 0
+
+
+def test_profile_is_opt_in():
+    """Test that no profile is returned unless asked for"""
+    response = execute_request(ECHO.model_copy(update={"profile": False}))
+    assert response.profile is None
+
+
+def test_jsonl_exporter(tmp_path):
+    """Test that the local JSON lines exporter writes one span per line"""
+    path = tmp_path / "spans.jsonl"
+    tracing.configure(f"jsonl:{path}")
+    try:
+        execute_request(ECHO)
+    finally:
+        tracing.configure(None)
+    names = [json.loads(line)["name"] for line in path.read_text().splitlines()]
+    assert names.count("test") == 2
+    assert names[-1] == "execute"